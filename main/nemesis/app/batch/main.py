@@ -0,0 +1,345 @@
+""" Headless batch runner.
+
+Runs every combination of a set of models and input sources, scheduling the
+runs on a bounded pool of processes. The progress and log output of each run
+are streamed to the console as the runs proceed, and a JSON summary of the
+timings and exit codes is written when all the runs are finished.
+"""
+from __future__ import absolute_import, print_function
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque, namedtuple
+from traceback import format_exception_only
+try:
+    from concurrent import futures # version 3
+except ImportError:
+    import futures # version 2
+try:
+    import queue # version 3
+except ImportError:
+    import Queue as queue # version 2
+
+from nemesis.data.file_data_source import FileDataSource
+from nemesis.data.sql_data_source import SQLDataSource
+from nemesis.model import Model
+from nemesis.runner import Runner, RunCancelled, RunError
+from nemesis.r.worker import RWorkerPool
+
+
+# A single run: a model file scored against an input source.
+BatchJob = namedtuple('BatchJob', [
+    'name', 'model_path', 'input_spec', 'output_path', 'engine',
+])
+
+
+def make_jobs(model_paths, input_specs, output_dir, engine='r'):
+    """ Create a job for each combination of model and input source.
+
+    Each run writes its results to an SQLite database in `output_dir`, named
+    after the model and the input.
+    """
+    jobs = []
+    names = set()
+    for model_path in model_paths:
+        model_name = _stem(model_path)
+        for input_spec in input_specs:
+            path, table = split_input_spec(input_spec)
+            input_name = _stem(path)
+            if table:
+                input_name += '.' + table
+            name = base_name = '%s__%s' % (model_name, input_name)
+            suffix = 1
+            while name in names:
+                suffix += 1
+                name = '%s-%i' % (base_name, suffix)
+            names.add(name)
+            output_path = os.path.join(output_dir, name + '.sqlite')
+            jobs.append(BatchJob(name, model_path, input_spec, output_path,
+                                 engine))
+    return jobs
+
+
+def split_input_spec(spec):
+    """ Split an input specification of the form PATH[#TABLE].
+    """
+    path, _, table = spec.partition('#')
+    return path, table
+
+
+def create_input_source(spec):
+    """ Create a data source from an input specification.
+
+    SQLite databases (``.db``, ``.sqlite`` or ``.sqlite3``) are given as
+    ``PATH#TABLE``. Any other path is loaded as a file.
+    """
+    path, table = split_input_spec(spec)
+    ext = os.path.splitext(path)[1].lower()
+    if ext in SQLITE_EXTENSIONS:
+        if not table:
+            raise ValueError('No table given for SQLite input %r '
+                             '(use PATH#TABLE)' % path)
+        source = SQLDataSource(dialect='sqlite', database=path, table=table)
+    else:
+        source = FileDataSource(path=path)
+    if not source.can_load:
+        raise ValueError('Cannot load input %r' % spec)
+    return source
+
+
+def run_job(job, events=None, tail_lines=20, reuse_r=True):
+    """ Run a single batch job to completion.
+
+    Progress and new lines of the run log are put on the `events` queue, if
+    given, as tuples (job name, event, payload). Returns a summary of the run
+    as a dictionary.
+    """
+    def emit(event, payload=None):
+        if events is not None:
+            events.put((job.name, event, payload))
+
+    summary = dict(
+        name = job.name,
+        model = job.model_path,
+        input = job.input_spec,
+        output = job.output_path,
+        engine = job.engine,
+        pid = os.getpid(),
+        status = 'error',
+        exit_code = None,
+        message = '',
+    )
+    errors = []
+    tail = deque(maxlen=tail_lines)
+    started = time.time()
+    emit('start')
+    try:
+        with open(job.model_path, 'r') as f:
+            model = Model.load(f)
+        model.validate()
+        if os.path.exists(job.output_path):
+            os.remove(job.output_path)
+        runner = Runner(
+            model = model,
+            engine = job.engine,
+            input_source = create_input_source(job.input_spec),
+            output_source = SQLDataSource(dialect='sqlite',
+                                          database=job.output_path),
+            error_handler = lambda msg, detail: errors.append(msg),
+        )
+        if job.engine == 'r' and reuse_r:
+            runner.worker_pool = _process_worker_pool()
+
+        # Stream complete lines of the log as they are written.
+        partial = ['']
+        def output_changed(text):
+            lines = (partial[0] + text).split('\n')
+            partial[0] = lines.pop()
+            lines = [ line.rstrip('\r') for line in lines ]
+            if lines:
+                tail.extend(lines)
+                emit('log', lines)
+        runner.output_handler = output_changed
+
+        future = runner.run()
+        runner.wait()
+        output_changed('\n' if partial[0] else '')
+
+        summary['exit_code'] = runner.returncode
+        try:
+            future.result()
+        except RunCancelled:
+            summary['status'] = 'cancelled'
+        except RunError:
+            summary['status'] = 'failed'
+        else:
+            summary['status'] = 'ok'
+        summary['message'] = '\n'.join(errors)
+
+    except Exception as exc:
+        summary['message'] = ''.join(
+            format_exception_only(type(exc), exc)).strip()
+
+    finished = time.time()
+    summary.update(
+        started = started,
+        finished = finished,
+        elapsed = finished - started,
+        log_tail = list(tail),
+    )
+    emit('finish', summary)
+    return summary
+
+
+def run_batch(jobs, max_workers=None, events=None, **kwargs):
+    """ Run batch jobs on a pool of processes.
+
+    Returns a list of job summaries, in the order of the jobs. Additional
+    keyword arguments are passed to `run_job`.
+    """
+    if max_workers is None:
+        max_workers = multiprocessing.cpu_count()
+    max_workers = max(1, min(max_workers, len(jobs)))
+    summaries = [None] * len(jobs)
+    with futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = dict(
+            (executor.submit(run_job, job, events, **kwargs), i)
+            for i, job in enumerate(jobs)
+        )
+        for future in futures.as_completed(pending):
+            i = pending[future]
+            try:
+                summaries[i] = future.result()
+            except Exception as exc:
+                # The worker process itself failed.
+                job = jobs[i]
+                summaries[i] = dict(
+                    name = job.name, model = job.model_path,
+                    input = job.input_spec, output = job.output_path,
+                    engine = job.engine, status = 'error', exit_code = None,
+                    message = ''.join(format_exception_only(type(exc), exc)),
+                )
+                if events is not None:
+                    events.put((job.name, 'finish', summaries[i]))
+    return summaries
+
+
+def write_summary(path, summaries, started, finished):
+    """ Write a JSON summary of a batch of runs.
+
+    Returns the summary as a dictionary.
+    """
+    summary = dict(
+        started = started,
+        finished = finished,
+        elapsed = finished - started,
+        jobs = len(summaries),
+        failed = sum(1 for s in summaries if s['status'] != 'ok'),
+        runs = summaries,
+    )
+    text = json.dumps(summary, indent=2, sort_keys=True, ensure_ascii=False)
+    if isinstance(text, bytes):
+        # Python 2 returns a byte string when none of the values is unicode.
+        text = text.decode('utf-8')
+    with io.open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return summary
+
+
+def main():
+    # Parse command-line arguments.
+    parser = argparse.ArgumentParser(
+        description='Run Nemesis models in batch',
+    )
+    parser.add_argument('--model', metavar='MODEL', dest='model_paths',
+                        nargs='+', required=True, help='model files to run')
+    parser.add_argument('--input', metavar='INPUT', dest='input_specs',
+                        nargs='+', required=True,
+                        help='input data files, or SQLite databases as '
+                             'PATH#TABLE')
+    parser.add_argument('--output-dir', metavar='DIR', default='.',
+                        help='directory for the result databases')
+    parser.add_argument('--summary', metavar='PATH', dest='summary_path',
+                        help='JSON summary file to write (default: '
+                             'summary.json in the output directory)')
+    parser.add_argument('-j', '--jobs', metavar='N', type=int,
+                        help='maximum number of concurrent runs (default: '
+                             'number of CPUs)')
+    parser.add_argument('--engine', choices=['r', 'python'], default='r',
+                        help='engine that executes the models')
+    parser.add_argument('--fresh-r', action='store_false', dest='reuse_r',
+                        help='start a new R process for every run, instead '
+                             'of reusing one R process per pool process')
+    parser.add_argument('--tail', metavar='N', type=int, default=20,
+                        dest='tail_lines',
+                        help='number of log lines kept in the summary')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='do not stream the run logs')
+    args = parser.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        parser.error('the number of jobs must be positive')
+    # At this point, we have valid arguments, so proceed with the runs.
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+    summary_path = args.summary_path or \
+        os.path.join(args.output_dir, 'summary.json')
+
+    jobs = make_jobs(args.model_paths, args.input_specs, args.output_dir,
+                     engine=args.engine)
+    manager = multiprocessing.Manager()
+    events = manager.Queue()
+    started = time.time()
+    with futures.ThreadPoolExecutor(max_workers=1) as executor:
+        batch = executor.submit(
+            run_batch, jobs, max_workers=args.jobs, events=events,
+            tail_lines=args.tail_lines, reuse_r=args.reuse_r)
+        _print_events(events, len(jobs), batch, quiet=args.quiet)
+        summaries = batch.result()
+    finished = time.time()
+    manager.shutdown()
+
+    summary = write_summary(summary_path, summaries, started, finished)
+    num_failed = summary['failed']
+    print('%i of %i runs succeeded in %.1fs; summary written to %s' % (
+        len(jobs) - num_failed, len(jobs), finished - started, summary_path))
+    sys.exit(1 if num_failed else 0)
+
+
+# Private functions
+
+_worker_pool = None
+
+def _process_worker_pool():
+    # Each pool process keeps one R worker, so that consecutive runs on the
+    # same process do not pay for R startup. The worker exits when its stdin
+    # is closed, i.e., when the pool process exits.
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = RWorkerPool(size=1)
+    return _worker_pool
+
+def _print_events(events, num_jobs, batch, quiet=False):
+    # Stop early if the batch itself fails, since its remaining runs will
+    # never report.
+    num_finished = 0
+    while num_finished < num_jobs:
+        try:
+            name, event, payload = events.get(timeout=EVENT_POLL_INTERVAL)
+        except queue.Empty:
+            if batch.done():
+                return
+            continue
+        if event == 'start':
+            print('[%s] started' % name)
+        elif event == 'log' and not quiet:
+            for line in payload:
+                print('[%s] %s' % (name, line))
+        elif event == 'finish':
+            num_finished += 1
+            print('[%s] %s (exit code %s, %.1fs) [%i/%i]' % (
+                name, payload['status'], payload['exit_code'],
+                payload.get('elapsed', 0), num_finished, num_jobs))
+            if payload['status'] != 'ok' and payload['message']:
+                print('[%s] %s' % (name, payload['message']))
+        sys.stdout.flush()
+
+def _stem(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+# Globals and constants
+
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+# Seconds between checks that the batch is still running, while waiting for
+# run events.
+EVENT_POLL_INTERVAL = 0.5
+
+
+if __name__ == '__main__':
+    main()
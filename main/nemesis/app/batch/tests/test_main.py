@@ -0,0 +1,117 @@
+from __future__ import absolute_import
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from concurrent import futures # version 3
+except ImportError:
+    import futures # version 2
+try:
+    import queue # version 3
+except ImportError:
+    import Queue as queue # version 2
+
+from .. import main
+from ..main import make_jobs, split_input_spec, write_summary
+
+
+class TestBatchJobs(unittest.TestCase):
+
+    def test_split_input_spec(self):
+        """ Is a table split off the input path?
+        """
+        self.assertEqual(split_input_spec('data.csv'), ('data.csv', ''))
+        self.assertEqual(split_input_spec('data.db#claims'),
+                         ('data.db', 'claims'))
+        self.assertEqual(split_input_spec('data.db#a#b'), ('data.db', 'a#b'))
+
+    def test_make_jobs(self):
+        """ Is there a job for each combination of model and input?
+        """
+        jobs = make_jobs(['m/first.json', 'm/second.json'],
+                         ['d/data.csv', 'd/data.db#claims'], 'out',
+                         engine='python')
+        self.assertEqual([ job.name for job in jobs ], [
+            'first__data', 'first__data.claims',
+            'second__data', 'second__data.claims',
+        ])
+        job = jobs[1]
+        self.assertEqual(job.model_path, 'm/first.json')
+        self.assertEqual(job.input_spec, 'd/data.db#claims')
+        self.assertEqual(job.output_path,
+                         os.path.join('out', 'first__data.claims.sqlite'))
+        self.assertEqual(job.engine, 'python')
+
+    def test_make_jobs_unique(self):
+        """ Are jobs with clashing names given distinct outputs?
+        """
+        jobs = make_jobs(['a/model.json', 'b/model.json'], ['data.csv'],
+                         'out')
+        self.assertEqual([ job.name for job in jobs ],
+                         ['model__data', 'model__data-2'])
+        self.assertEqual(len(set(job.output_path for job in jobs)), 2)
+        self.assertEqual(jobs[0].engine, 'r')
+
+
+class TestBatchSummary(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='nemesis_test_')
+        self.path = os.path.join(self.dir, 'summary.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_write_summary(self):
+        """ Are the runs and failure count written as JSON?
+        """
+        runs = [
+            dict(name='a', status='ok', exit_code=0, message=''),
+            dict(name='b', status='failed', exit_code=1,
+                 message=u'Variable \xe9 not found'),
+            dict(name='c', status='error', exit_code=None, message='boom'),
+        ]
+        summary = write_summary(self.path, runs, 10.0, 12.5)
+        with io.open(self.path, encoding='utf-8') as f:
+            written = json.load(f)
+        self.assertEqual(written, summary)
+        self.assertEqual(written['jobs'], 3)
+        self.assertEqual(written['failed'], 2)
+        self.assertEqual(written['elapsed'], 2.5)
+        self.assertEqual(written['runs'][1]['message'],
+                         u'Variable \xe9 not found')
+
+    def test_write_summary_bytes(self):
+        """ Is a summary without unicode values written?
+        """
+        write_summary(self.path, [dict(name='a', status='ok')], 0.0, 1.0)
+        with io.open(self.path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['failed'], 0)
+
+
+class TestPrintEvents(unittest.TestCase):
+
+    def setUp(self):
+        self.interval = main.EVENT_POLL_INTERVAL
+        main.EVENT_POLL_INTERVAL = 0.01
+
+    def tearDown(self):
+        main.EVENT_POLL_INTERVAL = self.interval
+
+    def test_batch_failed(self):
+        """ Does printing stop when the batch fails before all runs finish?
+        """
+        events = queue.Queue()
+        events.put(('a', 'log', ['> x <- 1']))
+        batch = futures.Future()
+        batch.set_exception(RuntimeError('pool broken'))
+        main._print_events(events, 2, batch, quiet=True)
+        self.assertTrue(events.empty())
+
+
+if __name__ == '__main__':
+    unittest.main()
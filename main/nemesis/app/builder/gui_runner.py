@@ -43,19 +43,30 @@ class GUIRunner(HasTraits):
         dialog.observe('rejected', lambda change: runner.cancel())
         dialog.show()
         event_loop = QtCore.QEventLoop()
-        timer = QtCore.QTimer()
+        update_pending = [False]
 
-        def start_run():
-            runner.run()
-            timer.setInterval(50)
-            timer.timeout.connect(check_loop)
-            timer.start()
+        def output_changed(text):
+            # Called from the runner's output thread. Coalesce the updates.
+            if not update_pending[0]:
+                update_pending[0] = True
+                deferred_call(update_output)
 
-        def check_loop():
+        def update_output():
+            update_pending[0] = False
             dialog.output = runner.output()
-            if not runner.running:
-                timer.stop()
+
+        def start_run():
+            runner.output_handler = output_changed
+            try:
+                future = runner.run()
+            except:
                 event_loop.quit()
+                raise
+            future.add_done_callback(lambda f: deferred_call(finish_run))
+
+        def finish_run():
+            update_output()
+            event_loop.quit()
 
         timed_call(50, start_run)
         event_loop.exec_()
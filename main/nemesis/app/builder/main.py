@@ -5,7 +5,9 @@ import argparse
 from enaml.qt.qt_application import QtApplication
 from nemesis.data.file_data_source import FileDataSource
 from nemesis.stdlib import init_stdlib
+from nemesis.app.common import init_file_cache
 from nemesis.app.common.error_handling import init_error_handlers
+from nemesis.app.common.preferences import BUILDER
 from nemesis.app.builder.main_window_controller import MainWindowController
 
 with traits_enaml.imports():
@@ -27,6 +29,7 @@ def main():
     # Create the application object.
     app = QtApplication()
     init_error_handlers(debug=args.debug)
+    init_file_cache(BUILDER)
     if args.data_path:
         input_source = FileDataSource(path=args.data_path)
     else:
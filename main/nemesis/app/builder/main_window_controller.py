@@ -3,16 +3,23 @@ from __future__ import absolute_import
 import pickle
 import os
 import tempfile
+try:
+    from concurrent import futures # version 3
+except ImportError:
+    import futures # version 2
 
+from enaml.application import deferred_call
 from enaml.layout.api import AreaLayout, HSplitLayout, VSplitLayout
 from enaml.widgets.api import FileDialogEx, Window
 from pyface.api import OK
-from traits.api import Bool, List, Instance, Property, on_trait_change
+from traits.api import Any, Bool, Int, List, Instance, Property, \
+    on_trait_change
 import traits_enaml
 
 from nemesis.data.data_source import DataSource
 from nemesis.data.sql_data_source import SQLDataSource
 from nemesis.model import Model, ModelError
+from nemesis.r.worker import RWorkerPool
 from nemesis.runner import Runner
 import enaml
 with enaml.imports():
@@ -37,6 +44,9 @@ class MainWindowController(ApplicationWindowController):
     model = Instance(Model)
     model_controller = Instance(ModelEditorController)
     file_filters = ['Nemesis Anomaly Model (*.nam)']
+    # The persistent R processes used to run the model. Keeping R warm saves
+    # several seconds of startup time per run.
+    worker_pool = Instance(RWorkerPool)
     # Whether the application is in debug mode.
     debug_mode = Bool(False)
     # The layout for the main window.
@@ -46,6 +56,10 @@ class MainWindowController(ApplicationWindowController):
     dock_items = Property(List('enaml.widgets.dock_item.DockItem'), depends_on='layout')
     # The state file for the application
     state_filename = 'state_builder.json'
+    # The executor for profiling the input data in the background, and the
+    # number of the latest profile. Earlier profiles are out of date.
+    _profile_executor = Any()
+    _profile_generation = Int(0)
 
     # --- Application actions ---
     def run_model(self):
@@ -78,9 +92,15 @@ class MainWindowController(ApplicationWindowController):
             output_source = self.temp_output_source
 
         # Attempt to run the model.
+        if self.worker_pool is None:
+            self.worker_pool = RWorkerPool()
+        # Runs are incremental, so that only the metrics edited since the
+        # last run are computed again.
         runner = Runner(model=self.model,
                         input_source=self.input_source,
-                        output_source=output_source)
+                        output_source=output_source,
+                        worker_pool=self.worker_pool,
+                        incremental=True)
         gui_runner = GUIRunner(parent=self.window, runner=runner)
         gui_runner.run()
 
@@ -186,6 +206,12 @@ class MainWindowController(ApplicationWindowController):
         self.model.save(f)
 
     def destroy(self):
+        # Stop profiling the input data.
+        self._profile_generation += 1
+        if self._profile_executor is not None:
+            self._profile_executor.shutdown(wait=False)
+            self._profile_executor = None
+
         if self.temp_output_source:
             os.remove(self.temp_output_source.database)
             self.temp_output_source = None
@@ -208,6 +234,33 @@ class MainWindowController(ApplicationWindowController):
         #     self.full_layout = pickle.loads(full_layout)
 
     # --- Private interface ---
+    def _profile_input(self, ds):
+        # Replace the variables of the input source, typed from the first
+        # rows, with variables profiled from all of the rows, once they are
+        # computed. A profile still in progress for a previous input source
+        # stops at its next chunk.
+        self._profile_generation += 1
+        generation = self._profile_generation
+        cancelled = lambda: generation != self._profile_generation
+        if self._profile_executor is None:
+            self._profile_executor = futures.ThreadPoolExecutor(max_workers=1)
+        future = self._profile_executor.submit(ds.profile,
+                                               cancelled=cancelled)
+
+        def done(future):
+            if future.cancelled() or future.exception() is not None or \
+                    future.result() is None or cancelled():
+                return
+            deferred_call(self._set_profiled_variables, ds, generation,
+                          future.result())
+
+        future.add_done_callback(done)
+
+    def _set_profiled_variables(self, ds, generation, variables):
+        if ds is self.input_source and \
+                generation == self._profile_generation:
+            ds.variables = variables
+
     def _get_layout(self):
         if self.input_data is not None:
             return self.full_layout
@@ -257,6 +310,7 @@ class MainWindowController(ApplicationWindowController):
             #@try:
             ds.load_metadata()
             data = ds.load()
+            self._profile_input(ds)
             # except Exception as exc:
             #     warning(parent=self.window,
             #             title='Load error',
@@ -0,0 +1,17 @@
+def init_file_cache(kind):
+    """ Configure the cache of converted data files according to the
+    preferences of the given kind.
+    """
+    import os
+
+    from nemesis.app.common.etsconfig import ETSConfig
+    from nemesis.app.common.preferences import Preferences
+    from nemesis.data.file_cache import FileCache, set_default_file_cache
+
+    prefs = Preferences.instance(kind)
+    if prefs.get('cache_files'):
+        path = os.path.join(ETSConfig.application_data, 'file_cache')
+        max_size = prefs.get('file_cache_size') * 1024 ** 3
+        set_default_file_cache(FileCache(path, max_size))
+    else:
+        set_default_file_cache(None)
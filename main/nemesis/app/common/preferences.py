@@ -14,11 +14,17 @@ INSPECTOR = 'inspector'
 
 # Preferences defaults
 DEFAULTS = {
-    BUILDER: {},
+    BUILDER: {
+        'cache_files': True,
+        'file_cache_size': 20,  # GB
+    },
     INSPECTOR: {
         'sample_data_threshold': 100000,
         'sample_pop': True,
         'sample_pop_size': 10**4,
+        'cache_results': True,
+        'cache_files': True,
+        'file_cache_size': 20,  # GB
     }
 }
 
@@ -9,8 +9,11 @@ from nemesis.app.inspector import init_plot_config, init_plot_editors
 from nemesis.data.sql_data_source import SQLDataSource
 from nemesis.run_results import RunResults
 
+from nemesis.app.common import init_file_cache
 from nemesis.app.common.error_handling import init_error_handlers
-from nemesis.app.inspector.main_window_controller import MainWindowController
+from nemesis.app.common.preferences import INSPECTOR
+from nemesis.app.inspector.main_window_controller import \
+    MainWindowController, results_cache_dir
 with traits_enaml.imports():
     from nemesis.app.inspector.main_window import Main
 
@@ -44,6 +47,7 @@ def main():
     # Create the application object.
     app = QtApplication()
     init_error_handlers(debug = args.debug)
+    init_file_cache(INSPECTOR)
 
     
     # Obtain the session and input and output sources.
@@ -64,7 +68,8 @@ def main():
             output_source = None
 
         results = RunResults(input_source=input_source,
-                             output_source=output_source)
+                             output_source=output_source,
+                             cache_dir=results_cache_dir())
         main_window = create_inspector(results=results)
 
     # Show the main window.
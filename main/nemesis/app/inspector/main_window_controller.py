@@ -14,6 +14,7 @@ from traits.api import Bool, Instance, List, Property, Str, Unicode,\
     on_trait_change, cached_property
 import traits_enaml
 
+from nemesis.app.common.etsconfig import ETSConfig
 from nemesis.app.common.preferences import Preferences, INSPECTOR
 from nemesis.data.variable import Variable
 from nemesis.data.ui.sql_table_model import SQLTableModel
@@ -39,6 +40,15 @@ PLOT_TYPES = {
 }
 
 
+def results_cache_dir():
+    """ The directory in which the tables of run results are cached, or an
+    empty string if caching is disabled in the preferences.
+    """
+    if not Preferences.instance(INSPECTOR).get('cache_results'):
+        return ''
+    return os.path.join(ETSConfig.application_data, 'results_cache')
+
+
 class MainWindowController(ApplicationWindowController):
     """ The controller for the Results Inspector main window.
     """
@@ -99,6 +109,10 @@ class MainWindowController(ApplicationWindowController):
     # The dock area attached to the main window.
     dock_area = Property(depends_on='window')
     base_layout = Instance('enaml.layout.dock_layout.LayoutNode')
+
+    # The last table model created for the result table, which is closed
+    # when it is replaced.
+    _open_results_model = Instance(SQLTableModel)
     
     # --- Application actions ---
 
@@ -143,6 +157,7 @@ class MainWindowController(ApplicationWindowController):
         """ Confirm whether the application can be exited.
         """
         if self.confirm_file_close():
+            self._close_results_model()
             event.accept()
         else:
             event.ignore()
@@ -310,7 +325,9 @@ class MainWindowController(ApplicationWindowController):
     def restore_session(self, state):
         results = state.get('results')
         if results is not None:
-            self.results = pickle.loads(str(results))
+            results = pickle.loads(str(results))
+            results.cache_dir = results_cache_dir()
+            self.results = results
 
         dashboard_mode = state.get('dashboard_mode')
         if dashboard_mode is not None:
@@ -354,7 +371,8 @@ class MainWindowController(ApplicationWindowController):
         if wizard.return_code == OK:
             try:
                 self.results = RunResults(input_source=wizard.input_source,
-                                          output_source=wizard.output_source)
+                                          output_source=wizard.output_source,
+                                          cache_dir=results_cache_dir())
                 self.session_file = ''
             except Exception as exc:
                 warning(parent=self.window,
@@ -434,10 +452,12 @@ class MainWindowController(ApplicationWindowController):
             return None
 
         columns = [results.group_name] + [v.name for v in self.result_variables]
-        return SQLTableModel(results.output_source.create_engine(),
-                             self.result_table,
-                             results.group_name,
-                             columns)
+        model = SQLTableModel(results.output_source.get_engine(),
+                              self.result_table,
+                              results.group_name,
+                              columns)
+        self._open_results_model = model
+        return model
 
     def _get_groups_are_entities(self):
         if not self.results.entity_name or not self.results.group_name:
@@ -445,6 +465,14 @@ class MainWindowController(ApplicationWindowController):
         return self.results.entity_name == self.results.group_name
     
     # Trait change handlers
+
+    @on_trait_change('result_table, results')
+    def _close_results_model(self):
+        # The table model is recreated for the new table, so the background
+        # threads and queries of the old one are no longer needed.
+        if self._open_results_model is not None:
+            self._open_results_model.close()
+            self._open_results_model = None
     
     def _results_changed(self):
         if not self.traits_inited():
@@ -468,7 +496,7 @@ class MainWindowController(ApplicationWindowController):
         if len(self.selected_groups) != 0:
             group_where = sqlalchemy.sql.column(results.group_name)\
                 .in_(map(str, self.selected_groups))
-            engine = self.results.output_source.create_engine()
+            engine = self.results.output_source.get_engine()
 
             if self.groups_are_entities:
                 entity_df = results.load_data('input', index_col=None,
@@ -488,7 +516,9 @@ class MainWindowController(ApplicationWindowController):
             pref = Preferences.instance(INSPECTOR)
             threshold = pref.get('sample_data_threshold')
 
-            if records > threshold and self._check_sample_threshold(threshold):
+            sampled = (records > threshold and
+                       self._check_sample_threshold(threshold))
+            if sampled:
                 df = results.sample_data('input', threshold, where=where)
             else:
                 df = results.load_data('input', where=where)
@@ -497,6 +527,8 @@ class MainWindowController(ApplicationWindowController):
                     '{entities} total entities'.format(
                         groups = len(self.selected_groups),
                         entities = records)
+            if sampled:
+                text += u' ({} sampled)'.format(len(df))
         else:
             df = results.load_data('input', limit = 0)
             text = u'No groups selected'
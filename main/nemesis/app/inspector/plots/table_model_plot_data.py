@@ -1,5 +1,5 @@
 from chaco.api import AbstractPlotData
-from traits.api import Instance
+from traits.api import Dict, Instance, Int
 
 from nemesis.data.ui.base_table_model import BaseTableModel
 
@@ -16,6 +16,13 @@ class TableModelPlotData(AbstractPlotData):
     writable = False
     selectable = False
 
+    # Private traits.
+
+    # The arrays of the columns that have been requested, and the data
+    # version of the model that they are for.
+    _columns = Dict
+    _version = Int(-1)
+
     def list_data(self):
         """ Returns a list of valid names to use for get_data().
 
@@ -35,14 +42,21 @@ class TableModelPlotData(AbstractPlotData):
         """
         if self.model is None or name not in self.model.get_columns():
             return []
-        else:
+
+        if self._version != self.model.data_version:
+            self._columns = {}
+            self._version = self.model.data_version
+
+        if name not in self._columns:
             j = self.list_data().index(name)
-            return [self.model.get_value(i, j)
-                    for i in range(self.model.rowCount())]
+            self._columns[name] = self.model.get_column(j)
+        return self._columns[name]
 
     # Private interface
     
     def _model_changed(self, old, new):
+        self._columns = {}
+        self._version = -1
         event = {}
         if old is not None:
             event['removed'] = old.get_columns()
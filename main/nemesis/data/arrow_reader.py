@@ -0,0 +1,228 @@
+""" Reading of columnar binary files (Parquet and Feather) with pyarrow.
+
+The files are memory-mapped and only the requested columns are read, so that
+loading a few columns of a wide file touches only the pages of those columns.
+Rows are read by row group (Parquet) or record batch (Feather), so that a
+limited number of rows is read without reading the whole file.
+
+Rows can be filtered by a list of conditions ``(column, op, value)``, all of
+which must hold, where `op` is one of '=', '==', '!=', '<', '<=', '>', '>=',
+'in' and 'not in', as in `pyarrow.parquet`. For Parquet files, the row groups
+whose column statistics exclude a match are skipped without being read.
+
+pyarrow is an optional dependency, imported when a file is read.
+"""
+from __future__ import absolute_import
+
+import operator
+
+import numpy as np
+import pandas as pd
+
+
+def read_parquet_file(path, columns=None, limit=None, filters=None):
+    """ Read a Parquet file.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file.
+
+    columns : sequence of str, optional
+        The columns to read. By default, all columns are read.
+
+    limit : int, optional
+        The maximum number of rows to read.
+
+    filters : list of tuples, optional
+        Conditions on the rows to read (see above).
+
+    Returns
+    -------
+    A pandas DataFrame.
+    """
+    return _read_chunks(iter_parquet_file(path, columns, filters), limit,
+                        lambda: _empty_parquet_frame(path, columns))
+
+
+def iter_parquet_file(path, columns=None, filters=None):
+    """ Read a Parquet file by row group.
+
+    Returns an iterator of data frames. The parameters are as for
+    ``read_parquet_file``.
+    """
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    metadata = parquet_file.metadata
+    for i in range(metadata.num_row_groups):
+        if filters and not _row_group_may_match(metadata.row_group(i),
+                                                filters):
+            continue
+        table = parquet_file.read_row_group(
+            i, columns=_read_columns(columns, filters))
+        yield _filter_frame(_to_frame(table, columns), columns, filters)
+
+
+def read_feather_file(path, columns=None, limit=None, filters=None):
+    """ Read a Feather file. The parameters are as for ``read_parquet_file``.
+    """
+    return _read_chunks(iter_feather_file(path, columns, filters), limit,
+                        lambda: _empty_feather_frame(path, columns))
+
+
+def iter_feather_file(path, columns=None, filters=None):
+    """ Read a Feather file by record batch.
+
+    Returns an iterator of data frames. Files in the original Feather format
+    (version 1), which has no record batches, are read in one chunk.
+    """
+    import pyarrow as pa
+    from pyarrow import feather
+
+    try:
+        reader = pa.ipc.open_file(pa.memory_map(path, 'r'))
+    except pa.ArrowInvalid:
+        df = feather.read_feather(path,
+                                  columns=_read_columns(columns, filters))
+        yield _filter_frame(df, columns, filters)
+        return
+    names = reader.schema.names
+    indices = [ names.index(name)
+                for name in _read_columns(columns, filters) or names ]
+    for i in range(reader.num_record_batches):
+        batch = reader.get_batch(i)
+        table = pa.Table.from_arrays([ batch.column(j) for j in indices ],
+                                     [ names[j] for j in indices ])
+        yield _filter_frame(_to_frame(table, columns), columns, filters)
+
+
+# Private functions
+
+def _read_chunks(chunks, limit, empty):
+    # Concatenate chunks until there are `limit` rows.
+    frames = []
+    rows = 0
+    for df in chunks:
+        frames.append(df)
+        rows += len(df)
+        if limit is not None and rows >= limit:
+            break
+    if not frames:
+        return empty()
+    df = pd.concat(frames, ignore_index=True)
+    if limit is not None:
+        df = df[:limit]
+    return df
+
+def _to_frame(table, columns):
+    # Convert a table to a data frame. Unless columns are requested, the
+    # index columns stored by pandas are dropped, as the CSV readers do not
+    # read an index either.
+    df = table.to_pandas()
+    if columns is None:
+        index_columns = [ name for name in df.columns
+                          if unicode(name).startswith('__index_level_') ]
+        df = df.drop(index_columns, axis=1)
+    return df.reset_index(drop=True)
+
+def _empty_parquet_frame(path, columns):
+    import pyarrow.parquet as pq
+    schema = pq.ParquetFile(path).schema.to_arrow_schema()
+    df = _to_frame(schema.empty_table(), None)
+    return df if columns is None else df[list(columns)]
+
+def _empty_feather_frame(path, columns):
+    import pyarrow as pa
+    from pyarrow import feather
+    try:
+        schema = pa.ipc.open_file(pa.memory_map(path, 'r')).schema
+    except pa.ArrowInvalid:
+        df = feather.read_feather(path, columns=_read_columns(columns, None))
+        return df[:0]
+    df = _to_frame(schema.empty_table(), None)
+    return df if columns is None else df[list(columns)]
+
+def _read_columns(columns, filters):
+    # The columns to read, including those that are filtered on, or None for
+    # all the columns.
+    if columns is None:
+        return None
+    columns = list(columns)
+    for name, _, _ in filters or []:
+        if name not in columns:
+            columns.append(name)
+    return columns
+
+def _row_group_may_match(row_group, filters):
+    # Whether any row of a row group may satisfy the filters, according to
+    # the minimum and maximum of its columns.
+    stats = {}
+    for j in range(row_group.num_columns):
+        column = row_group.column(j)
+        if column.is_stats_set and column.statistics.has_min_max:
+            stats[column.path_in_schema] = (column.statistics.min,
+                                            column.statistics.max)
+    for name, op, value in filters:
+        if name not in stats:
+            continue
+        low, high = stats[name]
+        try:
+            if not _range_may_match(low, high, op, value):
+                return False
+        except TypeError:
+            # Statistics of a type that is not comparable with the value.
+            pass
+    return True
+
+def _range_may_match(low, high, op, value):
+    if op in ('=', '=='):
+        return low <= value <= high
+    elif op == '!=':
+        return not (low == high == value)
+    elif op == '<':
+        return low < value
+    elif op == '<=':
+        return low <= value
+    elif op == '>':
+        return high > value
+    elif op == '>=':
+        return high >= value
+    elif op == 'in':
+        return any(low <= item <= high for item in value)
+    elif op == 'not in':
+        return not (low == high and low in value)
+    raise ValueError('Unknown filter operator %r' % op)
+
+def _filter_frame(df, columns, filters):
+    # Select the rows of a data frame that satisfy the filters, and the
+    # requested columns.
+    if not filters:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    for name, op, value in filters:
+        column = df[name]
+        if op == 'in':
+            mask &= column.isin(value).values
+        elif op == 'not in':
+            mask &= ~column.isin(value).values & column.notnull().values
+        elif op in _COMPARISONS:
+            mask &= _COMPARISONS[op](column, value).values & \
+                column.notnull().values
+        else:
+            raise ValueError('Unknown filter operator %r' % op)
+    df = df[mask].reset_index(drop=True)
+    return df if columns is None else df[list(columns)]
+
+
+# Globals and constants
+
+_COMPARISONS = {
+    '=': operator.eq,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
@@ -0,0 +1,289 @@
+""" A local store of tables, saved column by column as NumPy arrays.
+
+A stored table is a directory with one binary file per column and a
+``table.json`` file describing the columns. The files are memory-mapped when
+read, so opening a table is instantaneous, and only the pages of the columns
+(and rows) that are actually used are read from disk.
+
+Columns of a numeric, boolean or datetime type are stored as raw arrays.
+Other columns, such as strings, are stored as integer codes into a pickled
+array of their distinct values, with the code -1 for missing values.
+"""
+from __future__ import absolute_import
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnStore(object):
+    """ A directory of tables stored as memory-mapped columns.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def has_table(self, name):
+        """ Whether a table is stored.
+        """
+        return os.path.exists(os.path.join(self._table_path(name), META_FILE))
+
+    def open_table(self, name):
+        """ Open a stored table, or return None if it is not stored.
+        """
+        path = self._table_path(name)
+        try:
+            with open(os.path.join(path, META_FILE), 'r') as f:
+                meta = json.load(f)
+        except IOError:
+            return None
+        return StoredTable(path, meta)
+
+    def write_table(self, name, frames):
+        """ Store a table from an iterable of data frames, such as the chunks
+        of a SQL table, replacing any stored table of the same name.
+
+        The chunks are written as they come, so that the table is never held
+        in memory. The index of the data frames is not stored. Returns the
+        stored table.
+        """
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        # Write to a temporary directory, so that a partially written table is
+        # never read.
+        tmp_path = tempfile.mkdtemp(prefix='.tmp-', dir=self.path)
+        try:
+            meta = _write_columns(tmp_path, name, frames)
+            path = self._table_path(name)
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            os.rename(tmp_path, path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        return StoredTable(path, meta)
+
+    def remove_table(self, name):
+        """ Remove a stored table, if it exists.
+        """
+        shutil.rmtree(self._table_path(name), ignore_errors=True)
+
+    # Private interface
+
+    def _table_path(self, name):
+        # Table names are not necessarily valid file names.
+        return os.path.join(self.path,
+                            hashlib.sha1(name.encode('utf-8')).hexdigest())
+
+
+class StoredTable(object):
+    """ A table in a `ColumnStore`.
+
+    The columns are read as needed. A stored table can be used where a
+    `DataFrameQuery` expects a data frame, so that the rows can be filtered
+    before they are read.
+    """
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.name = meta['name']
+        self.columns = [ column['name'] for column in meta['columns'] ]
+        self._meta = dict((column['name'], (i, column))
+                          for i, column in enumerate(meta['columns']))
+        self._rows = meta['rows']
+
+    def __len__(self):
+        return self._rows
+
+    def __getitem__(self, name):
+        return pd.Series(self.read_column(name), name=name, copy=False)
+
+    def read_column(self, name, rows=None):
+        """ Read a column, or some of its rows, as an array. Raises a KeyError
+        if there is no such column.
+
+        The rows are given as a slice or an array of row numbers. Columns
+        stored as raw arrays are read-only views of the memory-mapped files,
+        and are not copied unless rows are given as an array.
+        """
+        i, column = self._meta[name]
+        path = os.path.join(self.path, str(i))
+        if column['kind'] == 'array':
+            values = _map_array(path + '.bin', column['dtype'], self._rows)
+            return values if rows is None else values[rows]
+        codes = _map_array(path + '.bin', CODE_DTYPE, self._rows)
+        if rows is not None:
+            codes = codes[rows]
+        with open(path + '.values', 'rb') as f:
+            values = pickle.load(f)
+        # Take from the distinct values with a None for missing values.
+        values = np.append(np.asarray(values, dtype=object), None)
+        return values.take(codes)
+
+    def to_frame(self, columns=None, rows=None):
+        """ Read the table, or some of its columns and rows, as a data frame.
+
+        The rows are given as a slice or an array of row numbers. Raises a
+        KeyError if any of the columns do not exist.
+        """
+        if columns is None:
+            columns = self.columns
+        data = {}
+        for name in columns:
+            data[name] = self.read_column(name, rows)
+        return pd.DataFrame(data, columns=list(columns), copy=False)
+
+    def iter_frames(self, columns=None, chunk_rows=None):
+        """ Read the table, or some of its columns, in chunks of consecutive
+        rows. Returns an iterator of data frames.
+        """
+        chunk_rows = chunk_rows or CHUNK_ROWS
+        for start in range(0, self._rows, chunk_rows):
+            yield self.to_frame(columns, slice(start, start + chunk_rows))
+
+
+# Private functions
+
+def _write_columns(path, name, frames):
+    # Write the columns of the data frames to a directory, returning the
+    # table description.
+    writers = None
+    rows = 0
+    for frame in frames:
+        if writers is None:
+            writers = [ _ColumnWriter(os.path.join(path, str(i)), column)
+                        for i, column in enumerate(frame.columns) ]
+        for writer, column in zip(writers, frame.columns):
+            writer.append(frame[column].values)
+        rows += len(frame)
+    meta = dict(name = name, rows = rows,
+                columns = [ writer.close() for writer in writers or [] ])
+    with open(os.path.join(path, META_FILE), 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+def _map_array(path, dtype, rows):
+    # Memory map an array. An empty file cannot be mapped.
+    if rows == 0:
+        return np.empty(0, dtype=dtype)
+    # A plain array view is friendlier to pandas than a memmap.
+    return np.asarray(np.memmap(path, dtype=np.dtype(str(dtype)), mode='r',
+                                shape=(rows,)))
+
+
+class _ColumnWriter(object):
+    """ Writes the chunks of a column to a file.
+
+    The kind of column is decided by the first chunk that is not all
+    missing. Numeric types are promoted as needed, e.g. when an integer
+    column has missing values in a later chunk.
+    """
+
+    def __init__(self, path, name):
+        self.path = path
+        self.name = name
+        self.kind = None
+        self.dtype = None
+        self.file = open(path + '.bin', 'wb')
+        self.leading_nulls = 0
+        self.codes = {}
+
+    def append(self, values):
+        if len(values) == 0:
+            return
+        if values.dtype.kind == 'O' or not isinstance(values.dtype, np.dtype):
+            null = pd.isnull(values)
+            if self.kind == 'array' and null.all():
+                self._write_array(_null_array(self.dtype, len(values)))
+                return
+            elif self.kind is None and null.all():
+                self.leading_nulls += len(values)
+                return
+            elif self.kind is None:
+                self._start('codes')
+            elif self.kind == 'array':
+                raise TypeError('Column %s has values of different types' %
+                                self.name)
+            self._write_codes(np.asarray(values, dtype=object))
+        elif self.kind == 'codes':
+            self._write_codes(values.astype(object))
+        else:
+            if self.kind is None:
+                self._start('array', values.dtype)
+            self._write_array(values)
+
+    def close(self):
+        if self.kind is None:
+            self._start('codes')
+        self.file.close()
+        column = dict(name = self.name, kind = self.kind)
+        if self.kind == 'array':
+            column['dtype'] = self.dtype.str
+        else:
+            values = [ None ] * len(self.codes)
+            for value, code in self.codes.items():
+                values[code] = value
+            with open(self.path + '.values', 'wb') as f:
+                pickle.dump(values, f, protocol=2)
+        return column
+
+    def _start(self, kind, dtype=None):
+        self.kind = kind
+        if kind == 'array':
+            self.dtype = dtype
+            if self.leading_nulls:
+                self._write_array(_null_array(dtype, self.leading_nulls))
+        elif self.leading_nulls:
+            self._write(np.full(self.leading_nulls, -1, dtype=CODE_DTYPE))
+
+    def _write_array(self, values):
+        dtype = np.promote_types(self.dtype, values.dtype)
+        if dtype != self.dtype:
+            # Rewrite the previous chunks with the promoted type.
+            self.file.close()
+            data = np.fromfile(self.path + '.bin', dtype=self.dtype)
+            self.file = open(self.path + '.bin', 'wb')
+            self.dtype = dtype
+            self._write(data.astype(dtype))
+        self._write(values.astype(self.dtype, copy=False))
+
+    def _write_codes(self, values):
+        # Map the codes of the chunk's distinct values to the codes of the
+        # distinct values of the whole column.
+        chunk_codes, uniques = pd.factorize(values)
+        mapping = np.empty(len(uniques) + 1, dtype=CODE_DTYPE)
+        for i, value in enumerate(uniques):
+            mapping[i] = self.codes.setdefault(value, len(self.codes))
+        mapping[-1] = -1
+        self._write(mapping[chunk_codes])
+
+    def _write(self, array):
+        self.file.write(np.ascontiguousarray(array).tobytes())
+
+
+def _null_array(dtype, n):
+    # An array of missing values, of the given type if it has missing values
+    # (NaN or NaT), or else of floating point type.
+    if dtype.kind in 'mM':
+        return np.full(n, np.datetime64('NaT'), dtype=dtype)
+    if dtype.kind != 'f':
+        dtype = np.promote_types(dtype, np.float64)
+    return np.full(n, np.nan, dtype=dtype)
+
+
+# Globals and constants
+
+# The name of the file describing a stored table.
+META_FILE = 'table.json'
+
+# The type of the codes of columns stored as distinct values.
+CODE_DTYPE = np.dtype('<i4')
+
+# The default number of rows in the chunks of a table read in chunks.
+CHUNK_ROWS = 500000
@@ -0,0 +1,221 @@
+""" Reading of large delimited text files, in chunks.
+
+A file is split into byte ranges of whole lines, which are parsed separately,
+in parallel worker processes for large files. The rows can be read all at
+once, or chunk by chunk to bound the memory used. Only the requested columns
+are converted.
+
+The types of the columns are sniffed from blocks of lines at the head, middle
+and tail of the file, rather than from the first rows only, so that a column
+with a few strings among numbers is typed as strings from the start. When a
+column is still typed differently in different chunks, it is read again as
+strings, as pandas would read it from the whole file.
+
+Splitting by byte range assumes that line breaks separate rows. If a line of
+the sampled blocks has an unbalanced quote, i.e. a quoted field contains a
+line break, the file is instead parsed sequentially by pandas.
+"""
+from __future__ import absolute_import
+
+import io
+import multiprocessing
+import os
+from collections import deque
+try:
+    from concurrent import futures # version 3
+except ImportError:
+    import futures # version 2
+
+import pandas as pd
+
+
+def read_csv_file(path, sep=',', columns=None, limit=None, workers=None):
+    """ Read a delimited text file.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file. The first line is the header.
+
+    sep : str, optional
+        The field separator.
+
+    columns : sequence of str, optional
+        The columns to read. By default, all columns are read. The columns
+        are in the order of the file.
+
+    limit : int, optional
+        The maximum number of rows to read, from the start of the file.
+
+    workers : int, optional
+        The number of worker processes for parsing. By default, there is one
+        per CPU for large files.
+
+    Returns
+    -------
+    A pandas DataFrame.
+    """
+    layout = _Layout(path, sep)
+    if limit is not None:
+        return layout.read_head(columns, limit)
+    chunks = list(layout.iter_chunks(columns, workers))
+    if not chunks:
+        return layout.read_head(columns, 0)
+    df = pd.concat(chunks, ignore_index=True)
+
+    # Read again, as strings, the columns that are numbers in some chunks and
+    # strings in others.
+    mixed = [ name for name in df.columns if df[name].dtype.kind == 'O' and
+              any(chunk[name].dtype.kind in 'iuf' for chunk in chunks) ]
+    if mixed:
+        text = pd.concat(layout.iter_chunks(mixed, workers, as_text=True),
+                         ignore_index=True)
+        for name in mixed:
+            df[name] = text[name]
+    return df
+
+
+def iter_csv_file(path, sep=',', columns=None, workers=None):
+    """ Read a delimited text file in chunks.
+
+    Returns an iterator of data frames, with consecutive ranges of rows and
+    the same columns. The parameters are as for ``read_csv_file``. Unlike
+    ``read_csv_file``, a column whose type was mis-sniffed may have different
+    types in different chunks.
+    """
+    return _Layout(path, sep).iter_chunks(columns, workers)
+
+
+class _Layout(object):
+    """ The header, size and sniffed column types of a delimited file.
+    """
+
+    def __init__(self, path, sep):
+        self.path = path
+        self.sep = sep
+        self.size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            header = f.readline()
+            self.data_start = f.tell()
+            sample = b''.join(self._sample_blocks(f))
+        self.names = list(pd.read_csv(io.BytesIO(header), sep=sep).columns)
+        self.quoted = any(line.count(b'"') % 2
+                          for line in (header + sample).splitlines())
+        if sample:
+            dtypes = pd.read_csv(io.BytesIO(header + sample), sep=sep).dtypes
+            self.dtypes = dict(zip(self.names, dtypes))
+        else:
+            self.dtypes = {}
+
+    def read_head(self, columns, limit):
+        # Read the first rows, with the sniffed types.
+        try:
+            return pd.read_csv(self.path, sep=self.sep, usecols=columns,
+                               nrows=limit, dtype=self.forced_dtypes(columns))
+        except ValueError:
+            # A float column with strings in the head.
+            return pd.read_csv(self.path, sep=self.sep, usecols=columns,
+                               nrows=limit,
+                               dtype=self.forced_dtypes(columns, kinds='O'))
+
+    def iter_chunks(self, columns, workers=None, as_text=False):
+        # Parse the file in chunks, in order. Only the string columns have
+        # forced types, so that parsing does not fail on unexpected values.
+        if as_text:
+            dtype = dict((name, object) for name in columns)
+        else:
+            dtype = self.forced_dtypes(columns, kinds='O')
+        if self.quoted:
+            reader = pd.read_csv(self.path, sep=self.sep, usecols=columns,
+                                 dtype=dtype, chunksize=CSV_CHUNK_ROWS)
+            for chunk in reader:
+                yield chunk
+            return
+
+        args = (self.path, self.sep, self.names, columns, dtype)
+        if workers is None:
+            workers = (multiprocessing.cpu_count()
+                       if self.size >= CSV_PARALLEL_BYTES else 1)
+        if workers <= 1:
+            for start, end in self.byte_ranges():
+                yield _parse_range(start, end, *args)
+            return
+
+        # Keep a bounded number of chunks in flight, so that the chunks are
+        # parsed in parallel while the consumer keeps up.
+        with futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for start, end in self.byte_ranges():
+                pending.append(executor.submit(_parse_range, start, end,
+                                               *args))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def byte_ranges(self):
+        # Split the data into byte ranges of about `CSV_CHUNK_BYTES`, ending
+        # at line breaks.
+        start = self.data_start
+        with open(self.path, 'rb') as f:
+            while start < self.size:
+                end = start + CSV_CHUNK_BYTES
+                if end < self.size:
+                    f.seek(end)
+                    f.readline()
+                    end = f.tell()
+                yield start, min(end, self.size)
+                start = end
+
+    def forced_dtypes(self, columns, kinds='fO'):
+        # The sniffed types of the columns of the given kinds.
+        dtype = {}
+        for name in columns if columns is not None else self.names:
+            sniffed = self.dtypes.get(name)
+            if sniffed is not None and sniffed.kind in kinds:
+                dtype[name] = sniffed
+        return dtype
+
+    def _sample_blocks(self, f):
+        # Blocks of whole lines at the head, middle and tail of the data.
+        data_size = self.size - self.data_start
+        if data_size <= 3 * SNIFF_BLOCK_BYTES:
+            yield f.read()
+            return
+        for offset in (0, (data_size - SNIFF_BLOCK_BYTES) // 2,
+                       data_size - SNIFF_BLOCK_BYTES):
+            f.seek(self.data_start + offset)
+            if offset > 0:
+                f.readline()
+            block = f.read(SNIFF_BLOCK_BYTES)
+            if f.tell() < self.size:
+                block = block[:block.rfind(b'\n') + 1]
+            elif not block.endswith(b'\n'):
+                block += b'\n'
+            yield block
+
+
+# Private functions
+
+def _parse_range(start, end, path, sep, names, columns, dtype):
+    # Parse a byte range of lines. This runs in a worker process.
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return pd.read_csv(io.BytesIO(data), sep=sep, header=None, names=names,
+                       usecols=columns, dtype=dtype)
+
+
+# Globals and constants
+
+# The approximate size of the chunks of a file that are parsed separately.
+CSV_CHUNK_BYTES = 64 * 1024 ** 2
+
+# The number of rows in each chunk of a file with quoted fields.
+CSV_CHUNK_ROWS = 500000
+
+# The size of a file above which it is parsed in parallel by default.
+CSV_PARALLEL_BYTES = 256 * 1024 ** 2
+
+# The size of each block of lines sampled to sniff the column types.
+SNIFF_BLOCK_BYTES = 1024 ** 2
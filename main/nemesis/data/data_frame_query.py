@@ -1,13 +1,48 @@
+""" Evaluation of SQL WHERE clauses on pandas data frames.
+
+A filter typed into a data table is a SQL WHERE clause, so that the same
+filters work for tables in memory and in a database. For data frames, the
+clause is parsed and evaluated directly on the columns, as vectorized boolean
+masks. The supported subset of SQL is:
+
+- literals: numbers, 'strings', NULL, TRUE and FALSE,
+- column names, optionally quoted as "name", [name] or `name`. As in SQLite,
+  a double-quoted name that is not a column is a string,
+- arithmetic: unary -, +, -, * and /,
+- comparisons: =, ==, !=, <>, <, <=, >, >=,
+- predicates: IS [NOT] NULL, [NOT] IN (...), [NOT] LIKE and
+  [NOT] BETWEEN ... AND ...,
+- logic: AND, OR, NOT and parentheses.
+
+NULLs (missing values) follow SQL's three-valued logic: a comparison with a
+NULL is neither true nor false, and only the rows for which the clause is
+true are selected. As in SQLite, LIKE is case-insensitive.
+"""
 from __future__ import absolute_import
 
-from pandasql import sqldf
+import operator
+import re
+
+import numpy as np
+import pandas as pd
+
+
+class QueryError(ValueError):
+    """ An invalid query, or one that cannot be evaluated on a data frame.
+    """
+    pass
 
 
 class DataFrameQuery(object):
     """ An SQL query that can be evaluated on a DataFrame.
     """
     def __init__(self, query):
-        self.query = self._format_query(query)
+        """ Parse the WHERE clause of a query.
+
+        Raises a QueryError if the clause is invalid.
+        """
+        self.query = query
+        self._evaluate = compile_where(query) if query else None
 
     @classmethod
     def execute(cls, df, expr):
@@ -15,16 +50,480 @@ class DataFrameQuery(object):
 
     def execute_in_context(self, df):
         """ Execute the query in the context of a data frame.
+
+        Returns the selected rows, with their original index. Raises a
+        QueryError if the query cannot be evaluated, e.g. because it refers
+        to a column that does not exist.
         """
+        if self._evaluate is None:
+            return df
+        return df[self.mask(df)]
+
+    def mask(self, df):
+        """ Evaluate the query as a boolean array, true for the selected rows.
+        """
+        n = len(df)
+        if self._evaluate is None:
+            return np.ones(n, dtype=bool)
+        values, null = self._evaluate(_Context(df))
         try:
-            return sqldf(self.query, {'df': df})
-        except Exception as exc:
-            return None
+            mask = np.asarray(values, dtype=bool) & ~np.asarray(null)
+        except (TypeError, ValueError):
+            raise QueryError('The filter is not a condition')
+        if mask.ndim == 0:
+            mask = np.repeat(mask, n)
+        return mask
+
+
+def compile_where(text):
+    """ Compile a WHERE clause into a function of a data frame context.
+
+    The compiled clauses are cached. Raises a QueryError if the clause is
+    invalid.
+    """
+    evaluate = _compiled_cache.get(text)
+    if evaluate is None:
+        if len(_compiled_cache) >= MAX_COMPILED_QUERIES:
+            _compiled_cache.clear()
+        evaluate = _compiled_cache[text] = _Parser(text).parse()
+    return evaluate
+
+
+class _Context(object):
+    """ The columns of a data frame, as arrays of values and of NULLs.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.n = len(df)
+        self._columns = {}
+        self._names = dict((unicode(name).lower(), name)
+                           for name in df.columns)
+
+    def has_column(self, name):
+        return name in self.df.columns or name.lower() in self._names
+
+    def column(self, name):
+        if name not in self._columns:
+            if name not in self.df.columns:
+                if name.lower() not in self._names:
+                    raise QueryError('No such column: %s' % name)
+                name = self._names[name.lower()]
+            values = self.df[name].values
+            self._columns[name] = (values, np.asarray(pd.isnull(values)))
+        return self._columns[name]
+
+
+class _Parser(object):
+    """ A recursive descent parser compiling a WHERE clause into a function.
+
+    Every compiled expression is a function of a `_Context` returning a tuple
+    (values, null), where `values` is an array or a scalar and `null` is a
+    boolean array or scalar that is true where the values are NULL.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def parse(self):
+        expr = self.parse_or()
+        if self.peek() is not None:
+            self.error()
+        return expr
+
+    # Grammar, from the lowest precedence to the highest.
+
+    def parse_or(self):
+        expr = self.parse_and()
+        while self.accept_keyword('OR'):
+            expr = _logical(expr, self.parse_and(), _or)
+        return expr
+
+    def parse_and(self):
+        expr = self.parse_not()
+        while self.accept_keyword('AND'):
+            expr = _logical(expr, self.parse_not(), _and)
+        return expr
+
+    def parse_not(self):
+        if self.accept_keyword('NOT'):
+            return _negate(self.parse_not())
+        return self.parse_predicate()
+
+    def parse_predicate(self):
+        expr = self.parse_additive()
+        op = self.accept_op(*_COMPARISONS)
+        if op is not None:
+            return _compare(expr, self.parse_additive(), _COMPARISONS[op])
+
+        if self.accept_keyword('IS'):
+            negated = self.accept_keyword('NOT')
+            self.expect_keyword('NULL')
+            expr = _is_null(expr)
+            return _negate(expr) if negated else expr
+
+        negated = self.accept_keyword('NOT')
+        if self.accept_keyword('IN'):
+            expr = _in(expr, self.parse_list())
+        elif self.accept_keyword('LIKE'):
+            expr = _like(expr, self.parse_additive())
+        elif self.accept_keyword('BETWEEN'):
+            low = self.parse_additive()
+            self.expect_keyword('AND')
+            high = self.parse_additive()
+            expr = _logical(_compare(expr, low, operator.ge),
+                            _compare(expr, high, operator.le), _and)
+        elif negated:
+            self.error()
+        else:
+            return expr
+        return _negate(expr) if negated else expr
+
+    def parse_list(self):
+        self.expect_op('(')
+        items = [ self.parse_literal() ]
+        while self.accept_op(','):
+            items.append(self.parse_literal())
+        self.expect_op(')')
+        return items
+
+    def parse_additive(self):
+        expr = self.parse_multiplicative()
+        while True:
+            op = self.accept_op('+', '-')
+            if op is None:
+                return expr
+            expr = _arithmetic(expr, self.parse_multiplicative(),
+                               _ARITHMETIC[op])
+
+    def parse_multiplicative(self):
+        expr = self.parse_unary()
+        while True:
+            op = self.accept_op('*', '/')
+            if op is None:
+                return expr
+            expr = _arithmetic(expr, self.parse_unary(), _ARITHMETIC[op])
+
+    def parse_unary(self):
+        op = self.accept_op('-', '+')
+        if op == '-':
+            return _arithmetic(_constant(0), self.parse_unary(),
+                               operator.sub)
+        elif op == '+':
+            return self.parse_unary()
+        return self.parse_primary()
+
+    def parse_primary(self):
+        token = self.peek()
+        if token is None:
+            self.error()
+        kind, value = token
+        if kind == 'op' and value == '(':
+            self.pos += 1
+            expr = self.parse_or()
+            self.expect_op(')')
+            return expr
+        elif kind == 'name':
+            self.pos += 1
+            return _column(value)
+        elif kind == 'quoted':
+            self.pos += 1
+            return _column_or_string(value)
+        return _constant(self.parse_literal())
+
+    def parse_literal(self):
+        # A literal value, for IN lists and constants.
+        token = self.peek()
+        sign = 1
+        if token == ('op', '-'):
+            sign = -1
+            self.pos += 1
+            token = self.peek()
+        if token is not None:
+            kind, value = token
+            if kind == 'number':
+                self.pos += 1
+                return sign * value
+            elif sign == 1 and kind in ('string', 'quoted'):
+                self.pos += 1
+                return value
+            elif sign == 1 and kind == 'keyword' and value in _CONSTANTS:
+                self.pos += 1
+                return _CONSTANTS[value]
+        self.error()
+
+    # Token helpers.
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos][:2]
+        return None
+
+    def accept_keyword(self, keyword):
+        if self.peek() == ('keyword', keyword):
+            self.pos += 1
+            return True
+        return False
+
+    def expect_keyword(self, keyword):
+        if not self.accept_keyword(keyword):
+            self.error()
+
+    def accept_op(self, *ops):
+        token = self.peek()
+        if token is not None and token[0] == 'op' and token[1] in ops:
+            self.pos += 1
+            return token[1]
+        return None
+
+    def expect_op(self, op):
+        if self.accept_op(op) is None:
+            self.error()
+
+    def error(self):
+        if self.pos < len(self.tokens):
+            start = self.tokens[self.pos][2]
+            raise QueryError('Syntax error near "%s"' % self.text[start:])
+        raise QueryError('Incomplete filter')
+
+
+# Private functions: tokenizing
+
+def _tokenize(text):
+    # Split a clause into tokens (kind, value, position).
+    tokens = []
+    pos = 0
+    while True:
+        match = _TOKEN_RE.match(text, pos)
+        if match is None:
+            raise QueryError('Syntax error near "%s"' % text[pos:])
+        pos = match.end()
+        kind = match.lastgroup
+        if kind == 'end':
+            return tokens
+        token = match.group(kind)
+        start = match.start(kind)
+        if kind == 'number':
+            value = float(token) if re.search(r'[.eE]', token) else int(token)
+        elif kind == 'string':
+            value = token[1:-1].replace("''", "'")
+        elif kind == 'quoted':
+            value = token[1:-1].replace('""', '"')
+        elif kind == 'bracketed':
+            kind, value = 'name', token[1:-1]
+        elif kind == 'word':
+            kind, value = 'name', token
+            if token.upper() in _KEYWORDS:
+                kind, value = 'keyword', token.upper()
+        else:
+            value = token
+        tokens.append((kind, value, start))
+
+
+# Private functions: evaluation
+#
+# Each function builds a compiled expression from compiled subexpressions
+# (see `_Parser`).
+
+def _constant(value):
+    null = np.bool_(value is None)
+    return lambda ctx: (value, null)
+
+def _column(name):
+    return lambda ctx: ctx.column(name)
+
+def _column_or_string(name):
+    def evaluate(ctx):
+        if ctx.has_column(name):
+            return ctx.column(name)
+        return (name, np.False_)
+    return evaluate
+
+def _negate(expr):
+    def evaluate(ctx):
+        values, null = expr(ctx)
+        return (~_as_bool(values), null)
+    return evaluate
+
+def _logical(left, right, op):
+    def evaluate(ctx):
+        lvalues, lnull = left(ctx)
+        rvalues, rnull = right(ctx)
+        return op(_as_bool(lvalues), lnull, _as_bool(rvalues), rnull)
+    return evaluate
+
+def _and(lvalues, lnull, rvalues, rnull):
+    # False if either side is false, otherwise NULL if either side is NULL.
+    false = (~lvalues & ~lnull) | (~rvalues & ~rnull)
+    return (lvalues & rvalues, ~false & (lnull | rnull))
+
+def _or(lvalues, lnull, rvalues, rnull):
+    # True if either side is true, otherwise NULL if either side is NULL.
+    true = (lvalues & ~lnull) | (rvalues & ~rnull)
+    return (true, ~true & (lnull | rnull))
+
+def _compare(left, right, op):
+    def evaluate(ctx):
+        lvalues, lnull = left(ctx)
+        rvalues, rnull = right(ctx)
+        lvalues, rvalues = (_numeric_affinity(lvalues, rvalues),
+                            _numeric_affinity(rvalues, lvalues))
+        null = lnull | rnull
+        return (_apply(op, lvalues, rvalues, null), null)
+    return evaluate
+
+def _arithmetic(left, right, op):
+    def evaluate(ctx):
+        lvalues, lnull = left(ctx)
+        rvalues, rnull = right(ctx)
+        lvalues, rvalues = _as_number(lvalues), _as_number(rvalues)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = op(lvalues, rvalues)
+        null = lnull | rnull
+        if op is operator.truediv:
+            # Division by zero is NULL in SQL.
+            null = null | (rvalues == 0)
+        return (values, null)
+    return evaluate
+
+def _is_null(expr):
+    def evaluate(ctx):
+        _, null = expr(ctx)
+        return (null, np.False_)
+    return evaluate
+
+def _in(expr, items):
+    has_null = any(item is None for item in items)
+    items = [ item for item in items if item is not None ]
+    def evaluate(ctx):
+        values, null = expr(ctx)
+        if np.ndim(values) == 0:
+            found = np.bool_(values in items)
+        else:
+            found = np.asarray(pd.Series(values).isin(
+                [ _numeric_affinity(item, values) for item in items ]))
+        # Not found in a list with a NULL is NULL.
+        if has_null:
+            null = null | ~found
+        return (found, null)
+    return evaluate
+
+def _like(expr, pattern):
+    def evaluate(ctx):
+        values, null = expr(ctx)
+        pattern_value, pattern_null = pattern(ctx)
+        if np.ndim(pattern_value) != 0:
+            raise QueryError('The pattern of LIKE must be a constant')
+        null = null | pattern_null
+        if pattern_null:
+            return (np.False_, null)
+        regex = _like_regex(pattern_value)
+        if np.ndim(values) == 0:
+            return (regex.match(unicode(values)) is not None, null)
+        # Match each distinct value once. NULLs have the code -1.
+        codes, uniques = pd.factorize(values)
+        found = np.array([ regex.match(unicode(value)) is not None
+                           for value in uniques ] + [ False ], dtype=bool)
+        return (found[codes], null)
+    return evaluate
+
+def _like_regex(pattern):
+    regex = _like_cache.get(pattern)
+    if regex is None:
+        parts = [ '.*' if c == '%' else '.' if c == '_' else re.escape(c)
+                  for c in unicode(pattern) ]
+        regex = _like_cache[pattern] = \
+            re.compile(u''.join(parts) + r'\Z', re.IGNORECASE | re.DOTALL)
+    return regex
+
+def _apply(op, lvalues, rvalues, null):
+    # Apply a comparison to the values that are not NULL, since NULLs (None)
+    # cannot be compared with other values.
+    try:
+        if np.ndim(null) == 0:
+            if null:
+                return np.False_
+            return np.bool_(op(lvalues, rvalues))
+        result = np.zeros(len(null), dtype=bool)
+        valid = ~null
+        lvalues = lvalues[valid] if np.ndim(lvalues) else lvalues
+        rvalues = rvalues[valid] if np.ndim(rvalues) else rvalues
+        result[valid] = op(lvalues, rvalues)
+        return result
+    except TypeError:
+        raise QueryError('Cannot compare values of different types')
+
+def _numeric_affinity(value, other):
+    # As in SQLite, a string compared with a numeric column is compared as a
+    # number, if it looks like one.
+    if isinstance(value, basestring) and np.ndim(other) != 0 and \
+            np.asarray(other).dtype.kind in 'iuf':
+        try:
+            return int(value)
+        except ValueError:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    return value
+
+def _as_bool(values):
+    if np.ndim(values) == 0:
+        return np.bool_(values)
+    return np.asarray(values, dtype=bool)
+
+def _as_number(values):
+    if isinstance(values, basestring):
+        raise QueryError('Non-numeric argument to arithmetic operator')
+    values = np.asarray(values)
+    if values.dtype.kind == 'O':
+        try:
+            return values.astype(float)
+        except (TypeError, ValueError):
+            raise QueryError('Non-numeric argument to arithmetic operator')
+    return values
+
+
+# Globals and constants
+
+# The maximum number of compiled clauses that are cached.
+MAX_COMPILED_QUERIES = 1000
+
+_compiled_cache = {}
+
+_like_cache = {}
+
+_TOKEN_RE = re.compile(r'''\s*(?:
+    (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?) |
+    (?P<string>'(?:[^']|'')*') |
+    (?P<quoted>"(?:[^"]|"")*") |
+    (?P<bracketed>\[[^\]]*\]|`[^`]*`) |
+    (?P<word>[^\W\d]\w*) |
+    (?P<op><=|>=|<>|!=|==|[=<>(),+\-*/]) |
+    (?P<end>$)
+)''', re.VERBOSE | re.UNICODE)
+
+_KEYWORDS = frozenset([ 'AND', 'BETWEEN', 'FALSE', 'IN', 'IS', 'LIKE', 'NOT',
+                        'NULL', 'OR', 'TRUE' ])
 
-    def _format_query(self, query):
-        parts = ['SELECT * FROM df']
+_CONSTANTS = { 'NULL': None, 'TRUE': 1, 'FALSE': 0 }
 
-        if query:
-            parts.append('WHERE {}'.format(query))
+_COMPARISONS = {
+    '=': operator.eq,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<>': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
 
-        return ' '.join(parts) + ';'
+_ARITHMETIC = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+}
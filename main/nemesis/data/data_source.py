@@ -26,13 +26,26 @@ class DataSource(HasTraits):
         """
         raise NotImplementedError
 
-    def load(self, variables = None):
+    def run_ast(self):
+        """ Generate R code (as an AST) for loading the data in a model run.
+
+        By default, this is the same as `ast`. A data source may first
+        prepare the data for R, e.g. by converting it to a format that is
+        faster to read, and load the prepared data instead. The code is only
+        valid for the run it is generated for, so it must never be saved.
+        """
+        return self.ast()
+
+    def load(self, variables = None, all_rows = False):
         """ Loads data from the data source.
         
         Parameters
         ----------
         variables : sequence of str
             Variables (columns) to load. If omitted, all variables are loaded.
+
+        all_rows : bool, optional
+            Whether to load all rows, regardless of `limit_rows`.
         
         Returns
         -------
@@ -40,9 +53,49 @@ class DataSource(HasTraits):
         """
         raise NotImplementedError
     
+    def iter_load(self, variables=None):
+        """ Loads all rows of data from the data source in chunks, so that
+        the whole data need not be held in memory.
+
+        Returns an iterator of pandas data frames. By default, the data is
+        loaded in one chunk.
+        """
+        return iter([ self.load(variables, all_rows=True) ])
+
     def load_metadata(self):
         """ Loads metadata from the data source.
         
         Populates the `variables` attribute.
         """
         raise NotImplementedError
+
+    def profile(self, variables=None, cancelled=None):
+        """ Computes the summary statistics of all rows of the data source,
+        in a single pass over the chunks of `iter_load`.
+
+        Returns a list of Variables with statistics (see
+        `nemesis.data.profile`). Unlike `load_metadata`, it does not populate
+        the `variables` attribute, so that it can run in the background. If a
+        callable `cancelled` is given, it is checked before the data is read
+        and between chunks, and None is returned as soon as it returns true.
+        """
+        from nemesis.data.profile import profile_chunks
+        if cancelled is not None and cancelled():
+            return None
+        profile = profile_chunks(self.iter_load(variables), cancelled)
+        return profile.variables() if profile is not None else None
+
+    def fingerprint(self, full=False):
+        """ Returns a fingerprint (a string) identifying the contents of the
+        data, or None if the data cannot be identified.
+
+        Data sources with the same fingerprint are assumed to contain the
+        same data. It is used to decide whether the results of a previous
+        model run can be reused (see `nemesis.fingerprint`).
+
+        Parameters
+        ----------
+        full : bool, optional
+            Whether to hash all of the data, rather than a sample of it.
+        """
+        return None
@@ -0,0 +1,116 @@
+""" Streaming reading of Excel workbooks.
+
+An xlsx worksheet is read row by row with openpyxl in read-only mode, so that
+reading the first rows of a large sheet does not parse the rest of it, and
+only the values of the requested columns are kept. The first row is the
+header.
+
+Workbooks in the legacy xls format are read in one piece by pandas.
+"""
+from __future__ import absolute_import
+
+import os
+
+import pandas as pd
+
+
+def read_excel_file(path, sheet=None, columns=None, limit=None):
+    """ Read a worksheet of an Excel workbook.
+
+    Parameters
+    ----------
+    path : str
+        The path of the workbook.
+
+    sheet : str, optional
+        The name of the worksheet. By default, the first worksheet is read.
+
+    columns : sequence of str, optional
+        The columns to read. By default, all columns are read. The columns
+        are in the order of the sheet.
+
+    limit : int, optional
+        The maximum number of rows to read.
+
+    Returns
+    -------
+    A pandas DataFrame.
+    """
+    frames = list(iter_excel_file(path, sheet, columns, limit=limit))
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+
+def iter_excel_file(path, sheet=None, columns=None, limit=None,
+                    chunk_rows=None):
+    """ Read a worksheet of an Excel workbook in chunks.
+
+    Returns an iterator of data frames, with consecutive ranges of rows and
+    the same columns. There is at least one, possibly empty, data frame. The
+    parameters are as for ``read_excel_file``.
+    """
+    if os.path.splitext(path)[1].lower() == '.xls':
+        yield pd.read_excel(path, sheet_name=sheet or 0, usecols=columns,
+                            nrows=limit)
+        return
+
+    import openpyxl
+
+    chunk_rows = chunk_rows or EXCEL_CHUNK_ROWS
+    if limit is not None:
+        chunk_rows = min(chunk_rows, max(limit, 1))
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, ())
+        names = [ value if value is not None else 'Unnamed: %i' % i
+                  for i, value in enumerate(header) ]
+        indices = _column_indices(names, columns)
+        names = [ names[i] for i in indices ]
+
+        chunk = []
+        count = 0
+        for row in rows:
+            if limit is not None and count >= limit:
+                break
+            # Skip blank rows, as pandas does for text files.
+            if all(value is None for value in row):
+                continue
+            chunk.append([ row[i] if i < len(row) else None
+                           for i in indices ])
+            count += 1
+            if len(chunk) >= chunk_rows:
+                yield _to_frame(chunk, names)
+                chunk = []
+        if chunk or count == 0:
+            yield _to_frame(chunk, names)
+    finally:
+        workbook.close()
+
+
+# Private functions
+
+def _column_indices(names, columns):
+    # The indices of the requested columns, in the order of the sheet.
+    if columns is None:
+        return list(range(len(names)))
+    missing = set(columns).difference(names)
+    if missing:
+        raise ValueError('Columns not found in the sheet: %s' %
+                         ', '.join(sorted(map(unicode, missing))))
+    columns = set(columns)
+    return [ i for i, name in enumerate(names) if name in columns ]
+
+def _to_frame(rows, names):
+    # Let pandas infer the column types, as it does for a whole sheet.
+    if not rows:
+        return pd.DataFrame(columns=names)
+    return pd.DataFrame.from_records(rows, columns=names)
+
+
+# Globals and constants
+
+# The number of rows in each chunk of a worksheet read in chunks.
+EXCEL_CHUNK_ROWS = 100000
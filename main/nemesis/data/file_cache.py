@@ -0,0 +1,230 @@
+""" A cache of flat files converted to columnar tables.
+
+Parsing a large delimited file is slow, and the same file is typically loaded
+many times, e.g. when building a model. The first time that a file is loaded
+in full, it is converted to a table of memory-mapped columns (see
+`nemesis.data.column_store`). Later loads read only the requested columns and
+rows of the table, without parsing the file.
+
+A converted table is identified by the absolute path, size and modification
+time of the file and by the options of the file reader, so that a table is
+never used for a file that has changed. Tables are removed in least recently
+used order when the cache exceeds its maximum size.
+
+Files that are slow to read in R too, such as Excel workbooks, can be
+converted in the background as soon as they are selected. The converted table
+is then also exported as a CSV file, which the R engine reads instead of the
+original file in model runs (see `DataSource.run_ast`).
+"""
+from __future__ import absolute_import
+
+import logging
+import os
+import shutil
+import threading
+from itertools import chain
+try:
+    from concurrent import futures # version 3
+except ImportError:
+    import futures # version 2
+
+from nemesis.data.column_store import ColumnStore
+from nemesis.fingerprint import fingerprint
+
+
+logger = logging.getLogger('nemesis')
+
+
+class FileCache(object):
+    """ A directory of flat files converted to columnar tables.
+    """
+
+    def __init__(self, path, max_size=None):
+        self.path = path
+        # The maximum size of the cache, in bytes.
+        self.max_size = max_size if max_size is not None else \
+            DEFAULT_CACHE_SIZE
+        self._store = ColumnStore(path)
+        # The background conversions in progress, by table key.
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def open_table(self, path, reader):
+        """ Open the table converted from a file by a `FileReader`, or return
+        None if the file has not been converted since it last changed.
+        """
+        key = _cache_key(path, reader)
+        table = self._store.open_table(key) if key is not None else None
+        if table is not None:
+            # Mark the table as used.
+            os.utime(table.path, None)
+        return table
+
+    def convert(self, path, reader, export=False):
+        """ Convert a file to a table with a `FileReader`, unless it is
+        already converted, and optionally export the table as a CSV file for
+        R. Returns the table, or None if it
+        could not be written.
+
+        If the file is being converted in the background, the background
+        conversion is waited for instead. The tables converted from earlier
+        versions of the file are left to be removed as least recently used.
+        """
+        key = _cache_key(path, reader)
+        if key is None:
+            return None
+        with self._lock:
+            future = self._pending.get(key)
+        if future is not None:
+            future.result()
+        return self._convert(key, path, reader, export)
+
+    def convert_async(self, path, reader, export=False):
+        """ Convert a file, as by ``convert``, in a background thread, unless
+        it is already converted (and exported). Returns a future of the table.
+        """
+        key = _cache_key(path, reader)
+        table = self.open_table(path, reader)
+        if key is None or table is not None and \
+                (not export or self.export_path(path, reader) is not None):
+            future = futures.Future()
+            future.set_result(table)
+            return future
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = _get_executor().submit(self._convert, key, path,
+                                                reader, export)
+                self._pending[key] = future
+                future.add_done_callback(
+                    lambda future: self._conversion_done(key))
+        return future
+
+    def export_path(self, path, reader):
+        """ The path of the CSV file exported from the table converted from a
+        file, or None if there is none.
+        """
+        table = self.open_table(path, reader)
+        if table is None:
+            return None
+        export_path = os.path.join(table.path, EXPORT_FILE)
+        return export_path if os.path.exists(export_path) else None
+
+    def prune(self, keep=None):
+        """ Remove the least recently used tables until the cache is no larger
+        than its maximum size. The table at the path `keep`, if given, is not
+        removed.
+        """
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return
+        # Skip the temporary directories of tables being written.
+        paths = [ os.path.join(self.path, name) for name in names
+                  if not name.startswith('.') ]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        size = 0
+        for path in paths:
+            table_size = _directory_size(path)
+            if size + table_size > self.max_size and path != keep:
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                size += table_size
+
+    # Private interface
+
+    def _convert(self, key, path, reader, export):
+        # Convert a file, unless it is already converted, and export it.
+        table = self._store.open_table(key)
+        try:
+            if table is None:
+                table = self._write_table(key, path, reader)
+            if export:
+                self._export(table)
+        except EnvironmentError:
+            logger.warning('Could not cache file %s', path, exc_info=True)
+            return None
+        self.prune(keep=table.path)
+        return table
+
+    def _write_table(self, key, path, reader):
+        # An empty chunk first, so that the columns of an empty file are known.
+        empty = reader.read_data(path, limit=0)
+        try:
+            return self._store.write_table(
+                key, chain([ empty ], reader.iter_data(path)))
+        except TypeError:
+            # A column with different types in different chunks. Read the
+            # whole file, so that the reader settles the type.
+            return self._store.write_table(key, [ reader.read_data(path) ])
+
+    def _export(self, table):
+        # Write the table as a CSV file in its directory, unless it exists.
+        export_path = os.path.join(table.path, EXPORT_FILE)
+        if os.path.exists(export_path):
+            return
+        tmp_path = export_path + '.tmp'
+        table.to_frame(rows=slice(0, 0)).to_csv(tmp_path, index=False,
+                                                encoding='utf-8')
+        for df in table.iter_frames():
+            df.to_csv(tmp_path, mode='a', header=False, index=False,
+                      encoding='utf-8')
+        os.rename(tmp_path, export_path)
+
+    def _conversion_done(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+
+def get_default_file_cache():
+    """ The cache used by file data sources by default, or None if files are
+    not cached.
+    """
+    return _default_file_cache
+
+
+def set_default_file_cache(cache):
+    """ Set the cache used by file data sources by default, or None to not
+    cache files.
+    """
+    global _default_file_cache
+    _default_file_cache = cache
+
+
+# Private functions
+
+def _cache_key(path, reader):
+    # The key of the table converted from a file, or None if the file does not
+    # exist.
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return fingerprint(os.path.abspath(path), '%i' % stat.st_size,
+                       repr(stat.st_mtime), reader.cache_key())
+
+def _get_executor():
+    # The executor of the background conversions, one at a time.
+    global _executor
+    if _executor is None:
+        _executor = futures.ThreadPoolExecutor(max_workers=1)
+    return _executor
+
+def _directory_size(path):
+    size = 0
+    for name in os.listdir(path):
+        size += os.path.getsize(os.path.join(path, name))
+    return size
+
+
+# Globals and constants
+
+# The default maximum size of a file cache, in bytes.
+DEFAULT_CACHE_SIZE = 20 * 1024 ** 3
+
+# The name of the CSV file exported from a table, in its directory.
+EXPORT_FILE = 'export.csv'
+
+_default_file_cache = None
+
+_executor = None
@@ -3,10 +3,16 @@ from __future__ import absolute_import
 import os.path
 
 from nemesis.r import ast
-from traits.api import HasTraits, File, Instance, List, Str
+from traits.api import HasTraits, Bool, File, Instance, List, Str
 
+from nemesis.data.arrow_reader import iter_feather_file, iter_parquet_file, \
+    read_feather_file, read_parquet_file
+from nemesis.data.csv_reader import iter_csv_file, read_csv_file
 from nemesis.data.data_source import DataSource
+from nemesis.data.excel_reader import iter_excel_file, read_excel_file
+from nemesis.data.file_cache import FileCache, get_default_file_cache
 from nemesis.data.variable import Variable
+from nemesis.fingerprint import file_fingerprint
 
 
 class FileDataSource(DataSource):
@@ -16,12 +22,20 @@ class FileDataSource(DataSource):
     # The path to the data file.
     path = File()
 
+    # The worksheet to load from a spreadsheet, by name. By default, the first
+    # worksheet is loaded.
+    sheet = Str
+
     # The supported file types, listed by extension.
     file_types = List(Str)
 
     # A wildcard for use in file dialogs.
     wildcard = List(Str)
 
+    # The cache of files converted to columnar tables, if any. By default, the
+    # cache set by `nemesis.data.file_cache.set_default_file_cache`.
+    file_cache = Instance(FileCache, transient=True)
+
     # Private interface
 
     _file_reader = Instance('nemesis.data.file_data_source.FileReader')
@@ -31,19 +45,63 @@ class FileDataSource(DataSource):
     def ast(self):
         return self._file_reader.ast(self.path)
 
-    def load(self, variables=None):
+    def run_ast(self):
+        # Point R at the CSV file exported from the converted file, waiting
+        # for the background conversion if needed. The export is in the
+        # cache, which may be pruned after the run.
+        if self._file_reader.background_convert and \
+                self.file_cache is not None:
+            table = self.file_cache.convert(self.path, self._file_reader,
+                                            export=True)
+            if table is not None:
+                export_path = self.file_cache.export_path(self.path,
+                                                          self._file_reader)
+                if export_path is not None:
+                    return ast.Constant(export_path)
+        return self.ast()
+
+    def load(self, variables=None, all_rows=False):
+        limit = self.num_rows if self.limit_rows and not all_rows else None
+        # Convert the file when it is loaded in full, but do not hold up a
+        # preview of the first rows.
+        table = self._open_cached(convert=limit is None)
+        if table is not None:
+            return table.to_frame(_file_order(table, variables),
+                                  None if limit is None else slice(0, limit))
         return self._file_reader.read_data(
-            self.path,
-            columns=variables,
-            limit=self.num_rows if self.limit_rows else None)
+            self.path, columns=variables, limit=limit)
+
+    def iter_load(self, variables=None):
+        table = self._open_cached(convert=True)
+        if table is not None:
+            return table.iter_frames(_file_order(table, variables))
+        return self._file_reader.iter_data(self.path, columns=variables)
 
     def load_metadata(self):
-        df = self._file_reader.read_data(self.path, limit=10)
+        table = self._open_cached()
+        if table is not None:
+            df = table.to_frame(rows=slice(0, 10))
+        else:
+            df = self._file_reader.read_data(self.path, limit=10)
         self.variables = Variable.from_data_frame(df)
         return self.variables
 
+    def fingerprint(self, full=False):
+        return file_fingerprint(self.path, full=full)
+
     # Private interface
 
+    def _open_cached(self, convert=False):
+        # Open the table converted from the file, converting the file first if
+        # requested. Returns None if the file is not cached.
+        cache = self.file_cache
+        if cache is None or not self._file_reader.cacheable:
+            return None
+        table = cache.open_table(self.path, self._file_reader)
+        if table is None and convert:
+            table = cache.convert(self.path, self._file_reader)
+        return table
+
     def _find_file_reader(self, path):
         ext = os.path.splitext(path)[1]
         for reader in file_readers:
@@ -69,12 +127,30 @@ class FileDataSource(DataSource):
                                            make_glob(reader.file_types)))
         return wildcard
 
+    def _file_cache_default(self):
+        return get_default_file_cache()
+
     # Trait change handlers
 
-    def _path_changed(self, path):
-        reader = self._find_file_reader(path)
-        self.can_load = os.path.isfile(path) and reader is not None
+    def _path_changed(self):
+        self._update_file_reader()
+
+    def _sheet_changed(self):
+        self._update_file_reader()
+
+    def _file_cache_changed(self):
+        self._update_file_reader()
+
+    def _update_file_reader(self):
+        reader = self._find_file_reader(self.path)
+        if isinstance(reader, ExcelFileReader) and self.sheet:
+            # The readers in `file_readers` are shared.
+            reader = ExcelFileReader(sheet=self.sheet)
+        self.can_load = os.path.isfile(self.path) and reader is not None
         self._file_reader = reader
+        if self.can_load and reader.background_convert and \
+                self.file_cache is not None:
+            self.file_cache.convert_async(self.path, reader, export=True)
 
 
 class FileReader(HasTraits):
@@ -85,6 +161,15 @@ class FileReader(HasTraits):
     # e.g., ['.xls', '.xlsx'].
     file_types = List(Str)
 
+    # Whether the files are worth converting to columnar tables, i.e., they
+    # are slow to parse (see `nemesis.data.file_cache`).
+    cacheable = Bool(False)
+
+    # Whether files are converted as soon as they are selected, in the
+    # background, and read from the converted files by R as well. This is for
+    # files that are slow to read in R.
+    background_convert = Bool(False)
+
     def ast(self, path):
         """ Read data from the file, returning a data.frame.
         """
@@ -95,54 +180,140 @@ class FileReader(HasTraits):
         """
         raise NotImplementedError
 
+    def iter_data(self, path, columns=None):
+        """ Read all the data from the file in chunks, returning an iterator
+        of pandas.DataFrames.
+
+        By default, the data is read in one chunk.
+        """
+        return iter([ self.read_data(path, columns=columns) ])
+
+    def cache_key(self):
+        """ A string identifying the reader and the options that affect the
+        data that it reads, for caching converted files.
+        """
+        return self.__class__.__name__
 
-class CsvFileReader(FileReader):
-    name = 'Comma-separated'
-    file_types = ['.csv']
+
+class DelimitedFileReader(FileReader):
+    """ A reader for delimited text files, which reads large files in chunks
+    (see `nemesis.data.csv_reader`).
+    """
+    # The field separator.
+    separator = Str(',')
+
+    cacheable = True
 
     def ast(self, path):
         return ast.Constant(path)
 
     def read_data(self, path, columns=None, limit=None):
-        from pandas import read_csv
-        return read_csv(path, usecols=columns, nrows=limit)
+        return read_csv_file(path, sep=self.separator, columns=columns,
+                             limit=limit)
+
+    def iter_data(self, path, columns=None):
+        return iter_csv_file(path, sep=self.separator, columns=columns)
+
+    def cache_key(self):
+        return '%s(%r)' % (self.__class__.__name__, str(self.separator))
+
 
+class CsvFileReader(DelimitedFileReader):
+    name = 'Comma-separated'
+    file_types = ['.csv']
 
-class TsvFileReader(FileReader):
+
+class TsvFileReader(DelimitedFileReader):
     name = 'Tab-separated'
     file_types = ['.tsv', '.tab']
+    separator = '\t'
+
+
+class ParquetFileReader(FileReader):
+    name = 'Parquet'
+    file_types = ['.parquet']
 
     def ast(self, path):
-        return ast.Constant(path)
+        return ast.Call(ast.Name('read_parquet'),
+                        ast.Constant(path),
+                        libraries=['arrow'])
+
+    def read_data(self, path, columns=None, limit=None, filters=None):
+        return read_parquet_file(path, columns=columns, limit=limit,
+                                 filters=filters)
+
+    def iter_data(self, path, columns=None):
+        return iter_parquet_file(path, columns=columns)
 
-    def read_data(self, path, columns=None, limit=None):
-        from pandas import read_table
-        return read_table(path, usecols=columns, nrows=limit)
+
+class FeatherFileReader(FileReader):
+    name = 'Feather'
+    file_types = ['.feather']
+
+    def ast(self, path):
+        return ast.Call(ast.Name('read_feather'),
+                        ast.Constant(path),
+                        libraries=['arrow'])
+
+    def read_data(self, path, columns=None, limit=None, filters=None):
+        return read_feather_file(path, columns=columns, limit=limit,
+                                 filters=filters)
+
+    def iter_data(self, path, columns=None):
+        return iter_feather_file(path, columns=columns)
 
 
 class ExcelFileReader(FileReader):
+    """ A reader for Excel workbooks, which reads xlsx worksheets row by row
+    (see `nemesis.data.excel_reader`).
+    """
     name = 'Excel spreadsheet'
     file_types = ['.xls', '.xlsx']
 
+    # The name of the worksheet to read. By default, the first worksheet.
+    sheet = Str
+
+    cacheable = True
+    background_convert = True
+
     def ast(self, path):
+        if self.sheet:
+            sheet = (ast.Name('sheetName'), ast.Constant(self.sheet))
+        else:
+            sheet = ast.Constant(1)  # Sheet index
         return ast.Call(ast.Name('read.xlsx'),
                         ast.Constant(path),
-                        ast.Constant(1),  # Sheet index
+                        sheet,
                         libraries=['xlsx'])
 
     def read_data(self, path, columns=None, limit=None):
-        # XXX: read_excel does not support limiting the rows or the columns.
-        from pandas import read_excel
-        df = read_excel(path)
-        if columns is not None:
-            df = df[columns]
-        if limit is not None:
-            df = df[:limit]
-        return df
+        return read_excel_file(path, sheet=self.sheet or None,
+                               columns=columns, limit=limit)
+
+    def iter_data(self, path, columns=None):
+        return iter_excel_file(path, sheet=self.sheet or None,
+                               columns=columns)
+
+    def cache_key(self):
+        return '%s(%r)' % (self.__class__.__name__, self.sheet)
+
+
+# Private functions
+
+def _file_order(table, columns):
+    # The requested columns of a converted table, in the order of the file as
+    # they are read from the file itself. Missing columns are kept, so that
+    # reading them fails.
+    if columns is None:
+        return None
+    return ([ name for name in table.columns if name in columns ] +
+            [ name for name in columns if name not in table.columns ])
 
 
 file_readers = [
     CsvFileReader(),
-    # TsvFileReader(),
-    # ExcelFileReader(),
+    TsvFileReader(),
+    ParquetFileReader(),
+    FeatherFileReader(),
+    ExcelFileReader(),
 ]
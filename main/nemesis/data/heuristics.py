@@ -1,4 +1,5 @@
 import numpy as np
+import pandas as pd
 
 
 def is_discrete(x):
@@ -31,6 +32,17 @@ def is_discrete(x):
         return False
     
     # At this point, we have an array of integers. Invoke the logisitic 
-    # regression decision rule.
-    unique = np.unique(x)
-    return len(unique) <= 12
\ No newline at end of file
+    # regression decision rule. Counting the distinct values of a prefix
+    # first usually settles a continuous column without hashing all of it.
+    if len(pd.unique(x[:DISCRETE_PREFIX])) > MAX_DISCRETE_VALUES:
+        return False
+    return len(pd.unique(x)) <= MAX_DISCRETE_VALUES
+
+
+# Globals and constants
+
+# The maximum number of distinct values of a discrete integer data set.
+MAX_DISCRETE_VALUES = 12
+
+# The number of values checked first by `is_discrete`.
+DISCRETE_PREFIX = 10000
\ No newline at end of file
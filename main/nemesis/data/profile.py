@@ -0,0 +1,272 @@
+""" Profiling of data sets in a single pass over chunks.
+
+A profile holds the summary statistics of every column of a data set: the
+type, the number of non-missing values, the number of distinct values and,
+for numerical columns, the mean, standard deviation, minimum and maximum, or
+for other columns, the most frequent value. The statistics are updated chunk
+by chunk, so that a data set of any size is profiled without being held in
+memory (see `DataSource.iter_load`).
+
+The numerical columns of a chunk are processed together, as one array. The
+mean and variance are merged across chunks with the pairwise update of Chan
+et al., which is numerically stable.
+
+The number of distinct values is estimated with a HyperLogLog sketch, with an
+error of about 1.6%, except for non-numerical columns with few distinct
+values, whose values are counted exactly. The most frequent value of a column
+with many distinct values is approximate.
+"""
+from __future__ import absolute_import
+
+import numpy as np
+import pandas as pd
+
+from nemesis.data.heuristics import MAX_DISCRETE_VALUES
+from nemesis.data.variable import Variable
+
+
+def profile_chunks(chunks, cancelled=None):
+    """ Profile a data set given as an iterable of data frames with the same
+    columns, e.g. from ``DataSource.iter_load``. Returns a `DataProfile`.
+
+    If a callable `cancelled` is given, it is called before each chunk, and
+    the profiling stops if it returns true. None is returned then.
+    """
+    profile = None
+    try:
+        for df in chunks:
+            if cancelled is not None and cancelled():
+                return None
+            if profile is None:
+                profile = DataProfile(df.columns)
+            profile.update(df)
+    finally:
+        # Release the file or database cursor of a generator stopped early.
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+    return profile if profile is not None else DataProfile([])
+
+
+class DataProfile(object):
+    """ The summary statistics of the columns of a data set.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        # The number of rows seen.
+        self.rows = 0
+
+        n = len(self.columns)
+        self._dtypes = [ None ] * n
+        self._typed = np.zeros(n, dtype=bool)
+        self._counts = np.zeros(n, dtype=np.int64)
+        self._means = np.zeros(n)
+        self._m2 = np.zeros(n)
+        self._mins = np.full(n, np.nan)
+        self._maxs = np.full(n, np.nan)
+        self._integral = np.ones(n, dtype=bool)
+        self._registers = np.zeros((n, HLL_REGISTERS), dtype=np.uint8)
+        # The value counts of the non-numerical columns, and whether they are
+        # complete. The counts of chunks are merged a few at a time.
+        self._values = [ None ] * n
+        self._chunk_values = [ [] for _ in range(n) ]
+        self._exact = np.ones(n, dtype=bool)
+
+    def update(self, df):
+        """ Add the rows of a data frame to the profile.
+        """
+        self.rows += len(df)
+        nonnull = df.notnull().values.sum(axis=0)
+        numerical = []
+        for i, dtype in enumerate(df.dtypes):
+            # Missing values of an object column give no type.
+            self._update_dtype(i, dtype,
+                               nonnull[i] > 0 or _kind(dtype) != 'O')
+            if _kind(dtype) in 'iuf':
+                numerical.append(i)
+            elif nonnull[i] > 0:
+                self._update_values(i, df.iloc[:, i].values)
+        if numerical and len(df):
+            values = df.iloc[:, numerical].values.astype(np.float64)
+            self._update_numerical(np.array(numerical), values)
+
+    def dtype(self, name):
+        """ The type of a column, as a NumPy dtype.
+        """
+        return self._dtypes[self.columns.index(name)]
+
+    def statistics(self, name):
+        """ The summary statistics of a column, as a dictionary with the keys
+        of ``pandas.Series.describe``, without the quantiles.
+        """
+        i = self.columns.index(name)
+        count = int(self._counts[i])
+        stats = dict(count = count, unique = self._unique(i))
+        if self._is_numerical(i):
+            stats.update(
+                mean = self._means[i] if count else np.nan,
+                std = np.sqrt(self._m2[i] / (count - 1)) if count > 1
+                      else np.nan,
+                min = self._mins[i],
+                max = self._maxs[i])
+        elif self._merge_values(i) is not None and len(self._values[i]):
+            values = self._values[i]
+            top = values.idxmax()
+            stats.update(top = top, freq = int(values[top]))
+        return stats
+
+    def is_discrete(self, name):
+        """ Whether a column is discrete or continuous, according to the rule
+        of ``nemesis.data.heuristics.is_discrete``. Missing values are
+        ignored.
+        """
+        i = self.columns.index(name)
+        if not self._is_numerical(i):
+            return True
+        elif not self._integral[i]:
+            return False
+        return self._unique(i) <= MAX_DISCRETE_VALUES
+
+    def variables(self, **traits):
+        """ The variables of the data set, with their statistics. The
+        additional traits are as for ``Variable.from_dtype``.
+        """
+        variables = []
+        for name, dtype in zip(self.columns, self._dtypes):
+            var = Variable.from_dtype(name, dtype, **traits)
+            var.statistics = self.statistics(name)
+            var.statistics['discrete'] = self.is_discrete(name)
+            variables.append(var)
+        return variables
+
+    # Private interface
+
+    def _is_numerical(self, i):
+        return _kind(self._dtypes[i]) in 'iuf'
+
+    def _update_dtype(self, i, dtype, typed):
+        # Promote the type of a column to fit a chunk. The type of a chunk
+        # with only missing values is only used if there is no other.
+        old = self._dtypes[i]
+        if old is None or typed and not self._typed[i]:
+            self._dtypes[i] = dtype
+        elif typed and old != dtype:
+            if _kind(old) in 'iuf' and _kind(dtype) in 'iuf':
+                self._dtypes[i] = np.promote_types(old, dtype)
+            else:
+                self._dtypes[i] = np.dtype(object)
+        self._typed[i] |= typed
+
+    def _update_numerical(self, columns, values):
+        # Update the statistics of numerical columns from a 2D array of their
+        # values, with a column per column.
+        valid = ~np.isnan(values)
+        counts = valid.sum(axis=0)
+        seen = self._counts[columns]
+        total = seen + counts
+        present = counts > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(valid, values, 0).sum(axis=0) / counts
+            m2 = (np.where(valid, values - means, 0) ** 2).sum(axis=0)
+            delta = means - self._means[columns]
+            weight = np.true_divide(counts, total)
+            self._means[columns] = np.where(
+                present, self._means[columns] + delta * weight,
+                self._means[columns])
+            self._m2[columns] += np.where(
+                present, m2 + delta ** 2 * (seen * weight), 0)
+        self._counts[columns] = total
+        self._mins[columns] = np.fmin(self._mins[columns],
+                                      np.fmin.reduce(values, axis=0))
+        self._maxs[columns] = np.fmax(self._maxs[columns],
+                                      np.fmax.reduce(values, axis=0))
+        self._integral[columns] &= (~valid | (values == np.floor(values))) \
+            .all(axis=0)
+
+        # Sketch the values column by column, in Fortran order.
+        mask = valid.ravel(order='F')
+        hashes = pd.util.hash_array(values.ravel(order='F')[mask])
+        rows = np.repeat(columns, len(values))[mask]
+        self._add_hashes(rows, hashes)
+
+    def _update_values(self, i, values):
+        # Update the statistics of a non-numerical column.
+        counts = pd.Series(values).value_counts()
+        self._counts[i] += counts.sum()
+        self._chunk_values[i].append(counts)
+        if len(self._chunk_values[i]) >= MERGE_CHUNKS:
+            self._merge_values(i)
+        hashes = pd.util.hash_array(np.asarray(counts.index, dtype=object))
+        self._add_hashes(np.full(len(hashes), i, dtype=np.intp), hashes)
+
+    def _merge_values(self, i):
+        # Merge the value counts of the chunks of a column. Returns the
+        # merged counts, or None if there are none.
+        chunk_values = self._chunk_values[i]
+        if chunk_values:
+            if self._values[i] is not None:
+                chunk_values.insert(0, self._values[i])
+            values = pd.concat(chunk_values).groupby(level=0,
+                                                     sort=False).sum()
+            if len(values) > 2 * MAX_TRACKED_VALUES:
+                # Keep only the most frequent values.
+                values = values.nlargest(MAX_TRACKED_VALUES)
+                self._exact[i] = False
+            self._values[i] = values
+            self._chunk_values[i] = []
+        return self._values[i]
+
+    def _add_hashes(self, rows, hashes):
+        # Add 64-bit hashes of values to the sketches of the given rows of
+        # registers (i.e., columns). The first bits of a hash select a
+        # register, which records the maximum number of leading zeros, plus
+        # one, in the remaining bits.
+        if not len(hashes):
+            return
+        bits = np.uint64(HLL_BITS)
+        registers = (hashes >> np.uint64(64 - HLL_BITS)).astype(np.intp)
+        rest = (hashes << bits).astype(np.float64)
+        # The exponent of a float is the bit length of the integer, give or
+        # take a rounding error that is immaterial here.
+        zeros = 64 - np.frexp(rest)[1]
+        ranks = np.clip(zeros + 1, 1, 64 - HLL_BITS + 1).astype(np.uint8)
+        np.maximum.at(self._registers, (rows, registers), ranks)
+
+    def _unique(self, i):
+        # The number of distinct values of a column, exact if its values are
+        # counted.
+        if not self._is_numerical(i) and self._exact[i] and \
+                self._merge_values(i) is not None:
+            return len(self._values[i])
+        registers = self._registers[i]
+        m = float(HLL_REGISTERS)
+        estimate = (0.7213 / (1 + 1.079 / m)) * m * m / \
+            np.sum(2.0 ** -registers.astype(np.float64))
+        empty = np.count_nonzero(registers == 0)
+        if estimate <= 2.5 * m and empty:
+            # Linear counting, which is more accurate for small counts.
+            estimate = m * np.log(m / empty)
+        return int(round(estimate))
+
+
+# Private functions
+
+def _kind(dtype):
+    return getattr(dtype, 'kind', 'O')
+
+
+# Globals and constants
+
+# The number of bits of a hash that select a HyperLogLog register.
+HLL_BITS = 12
+
+# The number of HyperLogLog registers per column.
+HLL_REGISTERS = 2 ** HLL_BITS
+
+# The number of distinct values of a non-numerical column that are counted
+# exactly.
+MAX_TRACKED_VALUES = 10000
+
+# The number of chunks whose value counts are merged together.
+MERGE_CHUNKS = 8
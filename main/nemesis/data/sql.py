@@ -2,14 +2,22 @@
 """
 from __future__ import absolute_import
 
+import logging
+import string
+
 import numpy as np
 import pandas
 import sqlalchemy
 
+logger = logging.getLogger(__name__)
+
+# The default number of rows in each chunk of a chunked read.
+DEFAULT_CHUNKSIZE = 10000
+
 
 def read_sql_table(engine, table_name, index_col=None, columns=None,
                    select_from=None, limit=None, order_by=None, where=None,
-                   coerce_types=None, raise_on_missing=True):
+                   coerce_types=None, raise_on_missing=True, offset=None):
     """ Load a table from a SQL database.
     
     Parameters
@@ -33,109 +41,111 @@ def read_sql_table(engine, table_name, index_col=None, columns=None,
     limit : int, optional
         Limit the number of rows selected.
     
-    order_by : str or SQLAlchemy clause, optional
-        An ORDER BY clause to sort the selected rows.
+    order_by : str, sequence of str or SQLAlchemy clause, optional
+        An ORDER BY clause to sort the selected rows, or the names of the
+        columns to sort by.
     
     where : str or SQLAlchemy clause, optional
         A WHERE clause used to filter the selected rows.
     
     coerce_types : dict(str : dtype or Python type), optional
         Override pandas type inference for specific columns.
+
+    offset : int, optional
+        Skip this number of rows. Some databases, e.g. MSSQL, require an
+        ORDER BY clause with an offset.
     
     Returns
     -------
     A pandas DataFrame.
     """
-    # Pandas does not expose many of these options, so we pull out some of
-    # Pandas' internals.
-    #
-    # An alternative approach would be to use `pandas.read_sql_query` with an
-    # appropriate (dialect-specific) query. However, this approach would not 
-    # utilize Pandas' logic for column type inference (performed by 
-    # `_harmonize_columns()` below), and would hence produce inferior results.
-    
-    from sqlalchemy.schema import MetaData
-    from pandas.io.sql import SQLDatabase, SQLTable
+    sql_select = _table_select(engine, table_name, index_col, columns,
+                               select_from, raise_on_missing)
+    if sql_select is None:
+        return None
+    sql_select = _refine_select(sql_select, limit, order_by, where, offset)
+    return next(_read_frames(engine, sql_select, index_col, coerce_types))
 
-    # From pandas.io.sql.read_sql_table
-    # and  pandas.io.sql.SQLDatabase.read_table:
-    meta = MetaData(engine)
-    try:
-        meta.reflect(only=[table_name])
-    except sqlalchemy.exc.InvalidRequestError:
-        if raise_on_missing:
-            raise ValueError("Table %s not found" % table_name)
-        else:
-            return None
 
-    pd_db = SQLDatabase(engine, meta=meta)
-    pd_tbl = SQLTable(table_name, pd_db, index=None)
-    
-    # Adapted from pandas.io.SQLTable.read:
-    if columns is not None and len(columns) > 0:
-        if index_col is not None and index_col not in columns:
-            columns = [index_col] + columns
-        
-        cols = [pd_tbl.table.c[n] for n in columns]
-    else:
-        cols = pd_tbl.table.c
+def iter_sql_table(engine, table_name, chunksize, index_col=None,
+                   columns=None, select_from=None, limit=None, order_by=None,
+                   where=None, coerce_types=None, raise_on_missing=True,
+                   offset=None):
+    """ Load a table from a SQL database in chunks.
 
-    if pd_tbl.index is not None:
-        [cols.insert(0, pd_tbl.table.c[idx]) for idx in pd_tbl.index[::-1]]
+    The rows are fetched through a server-side cursor, where the database
+    supports it, so that only one chunk is held in memory at a time.
 
-    # Strip the table name from each of the column names to allow for more
-    # general FROM clauses.
-    sql_select = sqlalchemy.select([
-        sqlalchemy.column(str(c).replace('{}.'.format(table_name), '', 1))
-        for c in cols
-    ])
+    Parameters
+    ----------
+    chunksize : int
+        The maximum number of rows in each chunk.
 
-    if select_from is not None:
-        sql_select = sql_select.select_from(select_from)
-    else:
-        sql_select = sql_select.select_from(
-            sqlalchemy.table(table_name)
-        )
+    The other parameters are the same as for ``read_sql_table``.
 
-    if where is not None:
-        if isinstance(where, basestring):
-            where = sqlalchemy.text(where)
-        sql_select = sql_select.where(where)
-    if limit is not None:
-        sql_select = sql_select.limit(limit)
-    if order_by is not None:
-        if isinstance(order_by, basestring):
-            order_by = sqlalchemy.sql.column(order_by)
-        sql_select = sql_select.order_by(order_by)
-    
-    result = pd_db.execute(sql_select)
-    data = result.fetchall()
-    column_names = result.keys()
+    Returns
+    -------
+    An iterator of pandas DataFrames, or None if the table is missing and
+    `raise_on_missing` is false.
+    """
+    sql_select = _table_select(engine, table_name, index_col, columns,
+                               select_from, raise_on_missing)
+    if sql_select is None:
+        return None
+    sql_select = _refine_select(sql_select, limit, order_by, where, offset)
+    return _read_frames(engine, sql_select, index_col, coerce_types,
+                        chunksize=chunksize)
 
-    pd_tbl.frame = pandas.DataFrame.from_records(data, index=index_col,
-                                             columns=column_names)
 
-    # This line has caused issues with incorrect type inference -- add it
-    # back with caution.
-    # pd_tbl._harmonize_columns()
-    
-    # Added by me: coerce types
-    if coerce_types:
-        frame = pd_tbl.frame
-        for col, dtype in coerce_types.iteritems():
-            frame[col] = frame[col].astype(dtype, copy=False)
-    
-    return pd_tbl.frame
+def read_sql_query(engine, query, index_col=None, columns=None, limit=None,
+                   order_by=None, where=None, coerce_types=None, offset=None,
+                   **kw):
+    """ Load the result of a SQL query.
 
+    The query is used as a subquery, so that the columns, WHERE clause,
+    ORDER BY clause and row limit are applied by the database, rather than
+    after the whole result has been fetched. A query that the database does
+    not accept as a subquery, e.g. one with an ORDER BY clause on MSSQL, is
+    run as is instead, with the columns and row limit applied to the result.
+    The WHERE clause, ORDER BY clause and offset cannot be applied then.
+
+    Parameters
+    ----------
+    engine : SQLAlchemy engine
+        The SQL database to query.
+
+    query : str
+        The SELECT statement to load from.
+
+    The other parameters are the same as for ``read_sql_table``. Additional
+    keyword arguments are ignored.
+
+    Returns
+    -------
+    A pandas DataFrame.
+    """
+    return next(_read_query_frames(engine, query, index_col, columns, limit,
+                                   order_by, where, coerce_types, offset))
+
+
+def iter_sql_query(engine, query, chunksize, index_col=None, columns=None,
+                   limit=None, order_by=None, where=None, coerce_types=None,
+                   offset=None, **kw):
+    """ Load the result of a SQL query in chunks.
+
+    This is the counterpart of ``iter_sql_table`` for queries (see also
+    ``read_sql_query``).
+
+    Returns
+    -------
+    An iterator of pandas DataFrames.
+    """
+    return _read_query_frames(engine, query, index_col, columns, limit,
+                              order_by, where, coerce_types, offset,
+                              chunksize=chunksize)
 
-def query_limit(data,index_col=None, columns=None,
-                   select_from=None, limit=None, order_by=None, where=None,
-                   coerce_types=None, raise_on_missing=True):
-    if limit is not None:
-        data = data[0:int(limit)]
-    return data
 
-def sample_sql_table(engine, table_name, n, where=None, **kw):
+def sample_sql_table(engine, table_name, n, where=None, method=None, **kw):
     """ Sample rows randomly from a SQL table.
     
     Parameters
@@ -150,13 +160,18 @@ def sample_sql_table(engine, table_name, n, where=None, **kw):
 
     where : str or SQLAlchemy clause, optional
         A WHERE clause used to sample a subset of rows.
+
+    method : str, optional
+        The sampling strategy (see `SAMPLE_METHODS`). By default, it is chosen
+        according to the SQL dialect of the engine.
     
     **kw : dict
         Additional arguments to pass to ``read_sql_table``.
 
     Returns
     -------
-    A pandas DataFrame.
+    A pandas DataFrame. The number of rows is logged, since a TABLESAMPLE
+    may return fewer than `n` rows.
     """
     # Naive, dialect-agnostic queries for random sampling are very slow
     # (linear or log-linear in total number of rows).
@@ -165,27 +180,342 @@ def sample_sql_table(engine, table_name, n, where=None, **kw):
     #   http://stackoverflow.com/questions/2279706
     #   https://www.periscope.io/blog/how-to-sample-rows-in-sql-273x-faster.html
     #   http://www.titov.net/2005/09/21/do-not-use-order-by-rand-or-how-to-get-random-rows-from-table/
-    table = sqlalchemy.table(table_name)
+    if method is None:
+        method = SAMPLE_METHODS.get(engine.dialect.name, 'reservoir')
 
-    count_select = sqlalchemy.select([sqlalchemy.func.count()])
+    df = None
+    if method != 'reservoir':
+        count = _count_rows(engine, table_name, where)
+        if n >= count:
+            method = 'whole table'
+            df = read_sql_table(engine, table_name, where=where, **kw)
+        elif n > count * SAMPLE_MAX_FRACTION:
+            # Scanning the table is cheaper than looking up most of it.
+            method = 'reservoir'
+        elif method == 'tablesample':
+            df = _tablesample(engine, table_name, n, count, where, **kw)
+        elif method == 'rowid':
+            try:
+                df = _rowid_sample(engine, table_name, n, count, where, **kw)
+            except sqlalchemy.exc.DBAPIError:
+                # Views and WITHOUT ROWID tables have no row IDs.
+                df = None
+            if df is None:
+                method = 'reservoir'
+        else:
+            raise ValueError("Unknown sampling method %r" % method)
+    if method == 'reservoir':
+        frames = iter_sql_table(engine, table_name, DEFAULT_CHUNKSIZE,
+                                where=where, **kw)
+        df = _reservoir_sample(frames, n)
+        if df is None:
+            df = read_sql_table(engine, table_name, where=where, limit=0, **kw)
+
+    logger.info('Sampled %i rows (of %i requested) from %s using %s',
+                len(df), n, table_name, method)
+    return df
+
+
+def sample_sql_query(engine, query, n, **kw):
+    """ Sample rows randomly from the result of a SQL query.
+
+    The rows are sampled while streaming the result, since there is no table
+    to sample from. Keyword arguments are as for ``read_sql_query``.
+    """
+    df = _reservoir_sample(iter_sql_query(engine, query, DEFAULT_CHUNKSIZE,
+                                          **kw), n)
+    if df is None:
+        df = read_sql_query(engine, query, limit=0, **kw)
+    logger.info('Sampled %i rows (of %i requested) from query using '
+                'reservoir', len(df), n)
+    return df
+
+
+def strip_sql_query(query):
+    """ Remove the trailing semicolons and whitespace of a SQL query, so that
+    it can be used as a subquery.
+    """
+    return query.rstrip(SQL_QUERY_TRAILER)
+
+
+# Private functions
+
+def _table_select(engine, table_name, index_col, columns, select_from,
+                  raise_on_missing):
+    # Create a SELECT statement for the columns of a table, or return None if
+    # the table is missing and `raise_on_missing` is false.
+    from sqlalchemy.schema import MetaData
+
+    meta = MetaData(engine)
+    try:
+        meta.reflect(only=[table_name])
+    except sqlalchemy.exc.InvalidRequestError:
+        if raise_on_missing:
+            raise ValueError("Table %s not found" % table_name)
+        else:
+            return None
+    table = meta.tables[table_name]
+
+    columns = _with_index(columns, index_col)
+    if columns:
+        # Raise a KeyError for unknown columns.
+        [ table.c[name] for name in columns ]
+    else:
+        columns = [ c.name for c in table.c ]
+
+    # Use unqualified column names, to allow for more general FROM clauses.
+    if select_from is None:
+        select_from = sqlalchemy.table(table_name)
+    return sqlalchemy.select([ sqlalchemy.column(name) for name in columns ])\
+        .select_from(select_from)
+
+def _query_select(query, index_col, columns):
+    # Create a SELECT statement for the columns of a query.
+    subquery = sqlalchemy.text(strip_sql_query(query)).columns()\
+        .alias('query')
+    columns = _with_index(columns, index_col)
+    if columns:
+        cols = [ sqlalchemy.column(name) for name in columns ]
+    else:
+        cols = [ sqlalchemy.text('*') ]
+    return sqlalchemy.select(cols).select_from(subquery)
+
+def _with_index(columns, index_col):
+    # The columns to select, including the index column, or None for all.
+    if columns is None or len(columns) == 0:
+        return None
+    columns = list(columns)
+    if index_col is not None and index_col not in columns:
+        columns = [index_col] + columns
+    return columns
+
+def _refine_select(sql_select, limit, order_by, where, offset=None):
     if where is not None:
-        count_select = count_select.where(where)
+        sql_select = sql_select.where(_where_clause(where))
+    if limit is not None:
+        sql_select = sql_select.limit(limit)
+    if offset is not None:
+        sql_select = sql_select.offset(offset)
+    if order_by is not None:
+        if isinstance(order_by, (basestring, sqlalchemy.sql.ClauseElement)):
+            order_by = [ order_by ]
+        sql_select = sql_select.order_by(*[
+            sqlalchemy.sql.column(clause) if isinstance(clause, basestring)
+            else clause for clause in order_by ])
+    return sql_select
 
-    count = engine.execute(count_select.select_from(table)).fetchone()[0]
+def _where_clause(where):
+    if isinstance(where, basestring):
+        where = sqlalchemy.text(where)
+    return where
+
+def _count_rows(engine, table_name, where):
+    count_select = sqlalchemy.select([sqlalchemy.func.count()])
+    if where is not None:
+        count_select = count_select.where(_where_clause(where))
+    count_select = count_select.select_from(sqlalchemy.table(table_name))
+    return engine.execute(count_select).fetchone()[0]
 
-    order_by = None
-    sample_where = None
-    select_from = None
+def _tablesample(engine, table_name, n, count, where, **kw):
+    # Sample with TABLESAMPLE, which reads only a random subset of the pages
+    # of the table (MSSQL and DB2). The number of rows sampled is random, so
+    # we sample more than needed and discard the excess. If there are too few
+    # rows, we try again with a larger sample.
+    #
+    # The percentage is of the whole table, but the WHERE clause is applied
+    # after sampling, so it is computed from the number of selected rows.
+    percent = 100.0 * n / count * SAMPLE_OVERSAMPLING
+    while True:
+        percent = min(percent, 100.0)
+        sampling = sqlalchemy.func.system(
+            sqlalchemy.literal_column('%f PERCENT' % percent)
+            if engine.dialect.name == 'mssql' else
+            sqlalchemy.literal_column('%f' % percent))
+        select_from = sqlalchemy.tablesample(sqlalchemy.table(table_name),
+                                             sampling, name=table_name)
+        df = read_sql_table(engine, table_name, select_from=select_from,
+                            where=where, **kw)
+        if len(df) >= n or percent >= 100.0:
+            break
+        percent *= 2
+    return _subsample(df, n)
 
-    if n < count:
-        order_by = sqlalchemy.sql.func.random()
-        k = count / float(n)
-        sample_where = sqlalchemy.sql.func.random() % k == 0
+def _rowid_sample(engine, table_name, n, count, where, **kw):
+    # Sample by drawing random row IDs from the range of row IDs (SQLite).
+    # Row IDs are mostly contiguous, but rows may have been deleted or not be
+    # selected by the WHERE clause, so we draw more IDs than needed, in
+    # proportion to the density of the selected rows in the range. Returns
+    # None if the selected rows are too sparse for this to pay off, e.g. with
+    # a selective WHERE clause or an INTEGER PRIMARY KEY with gaps.
+    rowid = sqlalchemy.column('rowid')
+    range_select = sqlalchemy.select([ sqlalchemy.func.min(rowid),
+                                       sqlalchemy.func.max(rowid) ])\
+        .select_from(sqlalchemy.table(table_name))
+    lo, hi = engine.execute(range_select).fetchone()
+    span = hi - lo + 1
+    density = count / float(span)
+    if density < SAMPLE_MIN_ROWID_DENSITY:
+        return None
 
+    dfs, drawn, total = [], np.empty(0, dtype=np.int64), 0
+    while total < n and len(drawn) < span:
+        k = int(np.ceil((n - total) / density * SAMPLE_OVERSAMPLING))
+        k = min(k, SAMPLE_MAX_ROWIDS)
+        ids = np.unique(np.random.randint(lo, hi + 1, size=k))
+        ids = np.setdiff1d(ids, drawn, assume_unique=True)
+        drawn = np.union1d(drawn, ids)
+        # The IDs are integers, so they can safely be inlined. This avoids
+        # the limit on the number of bound parameters.
+        sample_where = sqlalchemy.text('rowid IN (%s)' % ','.join(map(str, ids)))
         if where is not None:
-            select_from = (sqlalchemy.select('*')
-                .select_from(table)
-                .where(where))
+            sample_where = sqlalchemy.and_(sample_where, _where_clause(where))
+        df = read_sql_table(engine, table_name, where=sample_where, **kw)
+        dfs.append(df)
+        total += len(df)
+    return _subsample(pandas.concat(dfs, axis=0, copy=False), n)
+
+def _reservoir_sample(frames, n):
+    # Sample from a stream of data frames, keeping at most n rows in memory.
+    # Every row is given a random key, and the rows with the n smallest keys
+    # are kept: they are a uniform random sample of the rows seen so far.
+    # Returns None if there are no frames.
+    sample, keys = None, None
+    for df in frames:
+        df_keys = np.random.uniform(size=len(df))
+        if sample is None:
+            sample, keys = df, df_keys
+        else:
+            sample = pandas.concat([sample, df], axis=0, copy=False)
+            keys = np.concatenate([keys, df_keys])
+        if len(sample) > n:
+            keep = np.sort(np.argpartition(keys, n)[:n])
+            sample, keys = sample.iloc[keep], keys[keep]
+    return sample
+
+def _subsample(df, n):
+    # Discard the excess rows of a random sample.
+    if len(df) > n:
+        keep = np.sort(np.random.choice(len(df), n, replace=False))
+        df = df.iloc[keep]
+    return df
+
+def _read_query_frames(engine, query, index_col, columns, limit, order_by,
+                       where, coerce_types, offset, chunksize=None):
+    # Read the result of a query as a subquery, as by `_read_frames`, or as
+    # is if the database does not accept it as a subquery.
+    sql_select = _query_select(query, index_col, columns)
+    sql_select = _refine_select(sql_select, limit, order_by, where, offset)
+    frames = _read_frames(engine, sql_select, index_col, coerce_types,
+                          chunksize=chunksize)
+    try:
+        first = next(frames, None)
+    except sqlalchemy.exc.DBAPIError:
+        if where is not None or order_by is not None or offset is not None:
+            raise
+        logger.info('Running query as is, since it cannot be a subquery',
+                    exc_info=True)
+        frames = _read_raw_query(engine, query, index_col, columns, limit,
+                                 coerce_types, chunksize)
+        first = next(frames, None)
+    if first is not None:
+        yield first
+    for df in frames:
+        yield df
+
+def _read_raw_query(engine, query, index_col, columns, limit, coerce_types,
+                    chunksize):
+    # Run a query as is, selecting the columns and rows of the result as it
+    # is fetched. The data frames are as for `_read_frames`.
+    columns = _with_index(columns, index_col)
+    with engine.connect() as conn:
+        conn = conn.execution_options(stream_results=True)
+        result = conn.execute(sqlalchemy.text(query))
+        column_names = list(result.keys())
+        frames, count = [], 0
+        while limit is None or count < limit:
+            size = chunksize or DEFAULT_CHUNKSIZE
+            if limit is not None:
+                size = min(size, limit - count)
+            data = result.fetchmany(size)
+            if not data:
+                break
+            count += len(data)
+            frame = _select_columns(
+                pandas.DataFrame.from_records(data, columns=column_names),
+                columns, index_col, coerce_types)
+            if chunksize is None:
+                frames.append(frame)
+            else:
+                yield frame
+    if chunksize is None:
+        if frames:
+            yield pandas.concat(frames, axis=0, copy=False)
+        else:
+            yield _select_columns(pandas.DataFrame(columns=column_names),
+                                  columns, index_col, coerce_types)
+
+def _select_columns(frame, columns, index_col, coerce_types):
+    # Select the columns of a data frame and set its index, as `_make_frame`.
+    if columns:
+        frame = frame[columns]
+    if index_col is not None:
+        frame = frame.set_index(index_col)
+    return _coerce_types(frame, coerce_types)
+
+def _read_frames(engine, sql_select, index_col, coerce_types, chunksize=None):
+    # Execute a SELECT statement, yielding data frames of at most `chunksize`
+    # rows. If no chunk size is given, yields a single data frame with all
+    # the rows, even if there are none.
+    with engine.connect() as conn:
+        if chunksize is not None:
+            conn = conn.execution_options(stream_results=True)
+        result = conn.execute(sql_select)
+        column_names = list(result.keys())
+        if chunksize is None:
+            yield _make_frame(result.fetchall(), column_names, index_col,
+                              coerce_types)
+            return
+        while True:
+            data = result.fetchmany(chunksize)
+            if not data:
+                break
+            yield _make_frame(data, column_names, index_col, coerce_types)
+
+def _make_frame(data, column_names, index_col, coerce_types):
+    frame = pandas.DataFrame.from_records(data, index=index_col,
+                                          columns=column_names)
+    return _coerce_types(frame, coerce_types)
+
+def _coerce_types(frame, coerce_types):
+    # Coerce types, overriding pandas type inference.
+    if coerce_types:
+        for col, dtype in coerce_types.iteritems():
+            frame[col] = frame[col].astype(dtype, copy=False)
+    return frame
+
+
+# Globals and constants
+
+# The characters stripped from the end of a query to use it as a subquery.
+SQL_QUERY_TRAILER = ';' + string.whitespace
+
+# The default sampling method for each SQL dialect. Other dialects use
+# reservoir sampling over the streamed table.
+SAMPLE_METHODS = {
+    'mssql': 'tablesample',
+    'ibm_db_sa': 'tablesample',
+    'db2': 'tablesample',
+    'sqlite': 'rowid',
+}
+
+# The largest fraction of a table that is sampled with TABLESAMPLE or row IDs.
+# A larger sample is drawn from the whole table.
+SAMPLE_MAX_FRACTION = 0.5
+
+# How many more rows to sample than needed, to allow for sampling error.
+SAMPLE_OVERSAMPLING = 1.2
 
-    return read_sql_table(engine, table_name, select_from=select_from,
-                          where=sample_where, order_by=order_by, limit=n, **kw)
+# The smallest fraction of the range of row IDs that must be selected to
+# sample by row IDs, and the largest number of row IDs looked up at a time.
+SAMPLE_MIN_ROWID_DENSITY = 0.25
+SAMPLE_MAX_ROWIDS = 100000
@@ -1,13 +1,19 @@
 from __future__ import absolute_import
 
 import os.path
-import pandas as pd
+import threading
+
 import sqlalchemy
+from nemesis.fingerprint import (FINGERPRINT_BLOCK_ROWS,
+                                 FINGERPRINT_CHUNK_ROWS, block_offsets,
+                                 fingerprint, frame_fingerprint)
 from nemesis.r import ast
-from traits.api import Bool, Enum, Int, Property, Str
+from traits.api import Any, Bool, Enum, Int, Property, Str
 
 from .data_source import DataSource
-from .sql import read_sql_table, sample_sql_table, query_limit
+from .sql import (DEFAULT_CHUNKSIZE, iter_sql_query, iter_sql_table,
+                  read_sql_query, read_sql_table, sample_sql_query,
+                  sample_sql_table, strip_sql_query)
 from .variable import Variable
 from .file_data_source import FileDataSource, FileReader, CsvFileReader
 
@@ -51,11 +57,26 @@ class SQLDataSource(DataSource):
         else:
             return self.query
 
+    # The number of connections kept open in the connection pool, and
+    # whether to test connections for liveness before using them. The pool
+    # size does not apply to SQLite, which opens connections as needed.
+    pool_size = Int(5)
+    pool_pre_ping = Bool(True)
+
+    # Whether to log the SQL statements that are executed.
+    echo = Bool(False)
+
     # Whether there is enough information to connect to the database.
     can_connect = Property(Bool, depends_on=['dialect', 'host', 'username', 'password', 'database'])
     # DataSource interface
     can_load = Property(Bool, depends_on=['can_connect', 'table'])
 
+    # Private storage. The engine is neither copied nor serialized with the
+    # data source.
+    _engine = Any(transient=True)
+    _engine_cache_key = Any(transient=True)
+    _engine_lock = Any(transient=True)
+
     def ast(self):
         conn = self.ast_for_dbi_call(ast.Name('dbConnect'))
         print('ast')
@@ -81,14 +102,17 @@ class SQLDataSource(DataSource):
                     (ast.Name('db2'), ast.Constant(0))]
 
 
-    def load(self, variables=None):
+    def load(self, variables=None, all_rows=False):
 
         # if self.table is not None and self.table != "NA":
         print('load')
         return self.load_table(
             self.table,
             columns=variables,
-            limit=self.num_rows if self.limit_rows else None)
+            limit=self.num_rows if self.limit_rows and not all_rows else None)
+
+    def iter_load(self, variables=None):
+        return self.iter_table(self.table, columns=variables)
 
     def load_metadata(self):
         # Use pandas type inference, rather than trying it ourselves
@@ -97,6 +121,28 @@ class SQLDataSource(DataSource):
         self.variables = Variable.from_data_frame(df)
         return self.variables
 
+    def fingerprint(self, full=False):
+        # The row count and the blocks of rows are fetched with generic SQL,
+        # so that this works for every dialect.
+        with self.get_engine().connect() as conn:
+            count = conn.execute(sqlalchemy.text(
+                'SELECT COUNT(*) FROM (%s) counted' %
+                strip_sql_query(self.query_table())
+            )).scalar()
+        if full:
+            chunks = self.iter_table(self.table, FINGERPRINT_CHUNK_ROWS)
+        else:
+            # Sort by every column, so that the sampled blocks are the same
+            # whatever order the database returns the rows in.
+            columns = list(self.load_table(self.table, limit=0).columns)
+            chunks = [ self.load_table(self.table, order_by=columns,
+                                       offset=offset,
+                                       limit=FINGERPRINT_BLOCK_ROWS)
+                       for offset in block_offsets(count,
+                                                   FINGERPRINT_BLOCK_ROWS) ]
+        parts = [ frame_fingerprint(chunk) for chunk in chunks ]
+        return fingerprint('full' if full else 'sampled', str(count), *parts)
+
     # SQLDataSource interface
     def ast_for_dbi_call(self, call_name, *call_args):
         """ Returns a Call to an R function supporting the DBI connections parameters.
@@ -118,8 +164,34 @@ class SQLDataSource(DataSource):
         #              (ast.Name('host'), ast.Constant(self.host)), ]
         return ast.Call(call_name, args, libraries=['DBI', R_DBI_LIBRARIES[self.dialect]])
 
+    def get_engine(self):
+        """ Get the SQLAlchemy engine for interacting with the database.
+
+        The engine, with its pool of connections, is created on first use and
+        shared by all the queries of the data source, until the connection
+        parameters change.
+        """
+        key = self._engine_key()
+        with self._engine_lock:
+            if self._engine is None or key != self._engine_cache_key:
+                if self._engine is not None:
+                    self._engine.dispose()
+                self._engine = self.create_engine()
+                self._engine_cache_key = key
+            return self._engine
+
+    def dispose_engine(self):
+        """ Close the pooled connections to the database, if any.
+        """
+        with self._engine_lock:
+            if self._engine is not None:
+                self._engine.dispose()
+                self._engine = None
+
     def create_engine(self):
-        """ Create a SQLAlchemy engine for interacting with the database.
+        """ Create a new SQLAlchemy engine for interacting with the database.
+
+        Use `get_engine` to share an engine instead.
         """
         if self.dialect == 'sqlite':
             path = os.path.abspath(self.database)
@@ -130,28 +202,42 @@ class SQLDataSource(DataSource):
             engine_str = 'ibm_db_sa://{username}:{password}@{host}:{port}/{database}'.format(**self.__dict__)
         else:
             engine_str = '{dialect}://{username}:{password}@{host}:{port}/{database}'.format(**self.__dict__)
-        return sqlalchemy.create_engine(engine_str, echo=True)
+        kw = dict(echo=self.echo, pool_pre_ping=self.pool_pre_ping)
+        if self.dialect != 'sqlite':
+            kw['pool_size'] = self.pool_size
+        return sqlalchemy.create_engine(engine_str, **kw)
 
     def load_table(self, table, **kw):
         """ Load a table from the database.
         """
-        engine = self.create_engine()
+        engine = self.get_engine()
         if self.table == "NA":
+            return read_sql_query(engine, self.query, **kw)
+        else:
+            return read_sql_table(engine, table, **kw)
 
-            query = self.query
-            conn = engine.connect()
-            data = pd.read_sql(query, conn)
-            return query_limit(data, **kw)
+    def iter_table(self, table, chunksize=DEFAULT_CHUNKSIZE, **kw):
+        """ Load a table from the database in chunks of at most `chunksize`
+        rows.
 
+        Returns an iterator of data frames. Additional keyword arguments are
+        as for `load_table`.
+        """
+        engine = self.get_engine()
+        if self.table == "NA":
+            return iter_sql_query(engine, self.query, chunksize, **kw)
         else:
-            return read_sql_table(engine, table, **kw)
+            return iter_sql_table(engine, table, chunksize, **kw)
 
 
     def sample_table(self, table, n, **kw):
         """ Randomly sample from a table in the database.
         """
-        engine = self.create_engine()
-        return sample_sql_table(engine, table, n, **kw)
+        engine = self.get_engine()
+        if self.table == "NA":
+            return sample_sql_query(engine, self.query, n, **kw)
+        else:
+            return sample_sql_table(engine, table, n, **kw)
 
     # Private interface
     def _get_can_connect(self):
@@ -163,6 +249,13 @@ class SQLDataSource(DataSource):
     def _get_can_load(self):
         return bool(self.can_connect and self.table)
 
+    def _engine_key(self):
+        # The parameters that the engine was created with.
+        return tuple(getattr(self, name) for name in ENGINE_TRAITS)
+
+    def __engine_lock_default(self):
+        return threading.Lock()
+
     def _dialect_changed(self):
         self.port = self._port_default()
 
@@ -170,6 +263,11 @@ class SQLDataSource(DataSource):
         return DEFAULT_PORT_MAP[self.dialect]
 
 
+# The traits that determine the SQLAlchemy engine of a data source.
+ENGINE_TRAITS = [ 'dialect', 'host', 'port', 'username', 'password',
+                  'database', 'dsn', 'pool_size', 'pool_pre_ping', 'echo' ]
+
+
 # Default port numbers for database dialects.
 # Reference: http://en.wikipedia.org/wiki/List_of_TCP_and_UDP_port_numbers
 DEFAULT_PORT_MAP = {
@@ -0,0 +1,93 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from ..column_store import ColumnStore
+from ..data_frame_query import DataFrameQuery
+
+
+class TestColumnStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='nemesis_test_')
+        self.store = ColumnStore(os.path.join(self.dir, 'store'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_trip(self):
+        """ Are the chunks of a table stored and read back?
+        """
+        chunks = [
+            pd.DataFrame({ 'i': [1, 2], 'x': [0.5, np.nan],
+                           's': [u'a', None], 'n': [None, None] },
+                         columns=['i', 'x', 's', 'n']),
+            pd.DataFrame({ 'i': [3, 4], 'x': [1.5, 2.5],
+                           's': [u'b', u'a'], 'n': [None, None] },
+                         columns=['i', 'x', 's', 'n']),
+        ]
+        self.store.write_table('t', chunks)
+        self.assertTrue(self.store.has_table('t'))
+        self.assertFalse(self.store.has_table('u'))
+
+        df = self.store.open_table('t').to_frame()
+        self.assertEqual(list(df.columns), ['i', 'x', 's', 'n'])
+        self.assertEqual(list(df['i']), [1, 2, 3, 4])
+        self.assertEqual(df['i'].dtype, np.int64)
+        np.testing.assert_array_equal(df['x'], [0.5, np.nan, 1.5, 2.5])
+        self.assertEqual(list(df['s'].isnull()), [False, True, False, False])
+        self.assertEqual(list(df['s'].dropna()), [u'a', u'b', u'a'])
+        self.assertTrue(df['n'].isnull().all())
+
+        df = self.store.open_table('t').to_frame(['s', 'i'], np.array([1, 3]))
+        self.assertEqual(list(df.columns), ['s', 'i'])
+        self.assertEqual(list(df['i']), [2, 4])
+
+    def test_promotion(self):
+        """ Are the types of columns promoted to fit later chunks?
+        """
+        chunks = [
+            pd.DataFrame({ 'i': [1, 2], 'x': [None, None] }),
+            pd.DataFrame({ 'i': [None, None], 'x': [1, 2] }),
+        ]
+        df = self.store.write_table('t', chunks).to_frame()
+        np.testing.assert_array_equal(df['i'], [1, 2, np.nan, np.nan])
+        np.testing.assert_array_equal(df['x'], [np.nan, np.nan, 1, 2])
+
+    def test_query(self):
+        """ Can a stored table be filtered before it is read?
+        """
+        df = pd.DataFrame({ 'g': list('abcab'), 'v': np.arange(5) })
+        table = self.store.write_table('t', [ df ])
+        mask = DataFrameQuery("g IN ('a', 'c') AND v > 0").mask(table)
+        self.assertEqual(list(np.flatnonzero(mask)), [2, 3])
+
+    def test_replace(self):
+        """ Does writing a table replace the stored table?
+        """
+        self.store.write_table('t', [ pd.DataFrame({ 'a': [1, 2] }) ])
+        self.store.write_table('t', [ pd.DataFrame({ 'b': [u'x'] }) ])
+        df = self.store.open_table('t').to_frame()
+        self.assertEqual(list(df.columns), ['b'])
+        self.assertEqual(len(os.listdir(self.store.path)), 1)
+
+        self.store.remove_table('t')
+        self.assertIsNone(self.store.open_table('t'))
+
+    def test_empty(self):
+        """ Can an empty table be stored?
+        """
+        empty = pd.DataFrame({ 'a': [], 'b': [] }, columns=['a', 'b'])
+        table = self.store.write_table('t', [ empty ])
+        self.assertEqual(len(table), 0)
+        self.assertEqual(list(table.to_frame().columns), ['a', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from .. import csv_reader
+from ..csv_reader import iter_csv_file, read_csv_file
+
+
+class TestCsvReader(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='nemesis_test_')
+        self.path = os.path.join(self.dir, 'data.csv')
+        n = 1000
+        self.df = pd.DataFrame({
+            'id': np.arange(n),
+            'x': np.where(np.arange(n) < 900, 1, 2.5),
+            'late': [ str(i) for i in range(n - 1) ] + [ 'end' ],
+            'name': [ 'n%i' % (i % 7) for i in range(n) ],
+        }, columns=['id', 'x', 'late', 'name'])
+        self.df.to_csv(self.path, index=False)
+
+        # Use small chunks and sampled blocks.
+        self.constants = (csv_reader.CSV_CHUNK_BYTES,
+                          csv_reader.SNIFF_BLOCK_BYTES)
+        csv_reader.CSV_CHUNK_BYTES = 1000
+        csv_reader.SNIFF_BLOCK_BYTES = 500
+
+    def tearDown(self):
+        csv_reader.CSV_CHUNK_BYTES, csv_reader.SNIFF_BLOCK_BYTES = \
+            self.constants
+        shutil.rmtree(self.dir)
+
+    def assert_read(self, df, **kw):
+        expected = pd.read_csv(self.path, **kw)
+        self.assertEqual(list(df.columns), list(expected.columns))
+        for name in df.columns:
+            self.assertEqual(df[name].dtype, expected[name].dtype, name)
+            self.assertEqual(list(df[name]), list(expected[name]), name)
+
+    def test_read(self):
+        """ Is a file read in chunks as pandas reads it in one piece?
+        """
+        for workers in (1, 2):
+            self.assert_read(read_csv_file(self.path, workers=workers))
+            self.assert_read(
+                read_csv_file(self.path, columns=['name', 'x'],
+                              workers=workers),
+                usecols=['name', 'x'])
+
+    def test_sniff(self):
+        """ Are the types of the first rows sniffed from the whole file?
+        """
+        df = read_csv_file(self.path, limit=10)
+        self.assertEqual(len(df), 10)
+        self.assertEqual(df['id'].dtype.kind, 'i')
+        self.assertEqual(df['x'].dtype.kind, 'f')
+        self.assertEqual(df['late'].dtype.kind, 'O')
+
+    def test_iter(self):
+        """ Are the chunks of a file consecutive?
+        """
+        chunks = list(iter_csv_file(self.path, columns=['id']))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(list(pd.concat(chunks)['id']), list(self.df['id']))
+
+    def test_quoted(self):
+        """ Is a file with line breaks in quoted fields read correctly?
+        """
+        self.df.loc[500, 'name'] = 'two\nlines'
+        self.df.to_csv(self.path, index=False)
+        self.assert_read(read_csv_file(self.path))
+
+    def test_tsv(self):
+        """ Is a tab-separated file read?
+        """
+        self.df.to_csv(self.path, sep='\t', index=False)
+        self.assert_read(read_csv_file(self.path, sep='\t'), sep='\t')
+
+    def test_empty(self):
+        """ Is a file with only a header read?
+        """
+        with open(self.path, 'w') as f:
+            f.write('a,b\n')
+        df = read_csv_file(self.path)
+        self.assertEqual(list(df.columns), ['a', 'b'])
+        self.assertEqual(len(df), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
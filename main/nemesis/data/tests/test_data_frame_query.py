@@ -0,0 +1,79 @@
+from __future__ import absolute_import
+
+import sqlite3
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from ..data_frame_query import DataFrameQuery, QueryError
+
+
+class TestDataFrameQuery(unittest.TestCase):
+
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'id': np.arange(8),
+            'x': [1.0, 2.5, np.nan, -1.0, 4.0, 2.5, np.nan, 0.0],
+            'name': ['foo', 'Bar', None, 'baz', 'food', 'bar', 'x_y', ''],
+        }, columns=['id', 'x', 'name'])
+
+    def select(self, where):
+        df = DataFrameQuery.execute(self.df, where)
+        return list(df['id'])
+
+    def test_sqlite(self):
+        """ Are the same rows selected as by SQLite?
+        """
+        db = sqlite3.connect(':memory:')
+        self.df.to_sql('df', db, index=False)
+        clauses = [
+            'x > 1',
+            'x >= 2.5 and id < 5',
+            'x = 2.5 or name = "foo"',
+            'not x > 1',
+            'not (x > 1 or name = \'baz\')',
+            'x is null',
+            'x is not null and name is not null',
+            'id in (1, 3, 5)',
+            'id not in (1, 3, 5)',
+            'id in (\'1\', \'3\', \'x\')',
+            'x = \'2.5\'',
+            'name in (\'foo\', NULL)',
+            'name not in (\'foo\', NULL)',
+            'name like \'ba%\'',
+            'name not like \'%o%\'',
+            'name like \'x_y\'',
+            'x between 0 and 2.5',
+            'x not between 0 and 2.5',
+            'x * 2 - 1 > id',
+            '-x < -1',
+            'x / 0 is null',
+            '[name] = \'\' OR `id` = 0',
+            'ID = 3',
+            '1 = 1',
+            'NULL',
+        ]
+        for clause in clauses:
+            expected = [ row[0] for row in
+                         db.execute('SELECT id FROM df WHERE ' + clause) ]
+            self.assertEqual(self.select(clause), expected, clause)
+
+    def test_empty(self):
+        """ Does an empty query select all the rows?
+        """
+        self.assertEqual(self.select(''), list(range(8)))
+        self.assertEqual(self.select(None), list(range(8)))
+
+    def test_errors(self):
+        """ Are invalid queries reported?
+        """
+        for clause in ('x >', 'x > 1 and', '(x > 1', 'x ! 1', 'x in 1',
+                       'x between 1', 'x = 1 y'):
+            self.assertRaises(QueryError, DataFrameQuery, clause)
+        for clause in ('missing > 1', 'name + 1 > 0'):
+            self.assertRaises(QueryError, self.select, clause)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+from ..file_cache import FileCache
+from ..file_data_source import CsvFileReader, TsvFileReader
+
+
+class TestFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='nemesis_test_')
+        self.cache = FileCache(os.path.join(self.dir, 'cache'))
+        self.reader = CsvFileReader()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write_file(self, name, n):
+        path = os.path.join(self.dir, name)
+        pd.DataFrame({ 'a': range(n), 'b': [ u'x' ] * n }).to_csv(
+            path, index=False)
+        return path
+
+    def test_convert(self):
+        """ Is a converted table used until the file changes?
+        """
+        path = self.write_file('data.csv', 10)
+        self.assertIsNone(self.cache.open_table(path, self.reader))
+        table = self.cache.convert(path, self.reader)
+        self.assertEqual(table.columns, ['a', 'b'])
+        self.assertEqual(list(table.read_column('a', slice(8, None))), [8, 9])
+        self.assertIsNotNone(self.cache.open_table(path, self.reader))
+
+        # The table depends on the options of the reader.
+        self.assertIsNone(self.cache.open_table(path, TsvFileReader()))
+
+        self.write_file('data.csv', 11)
+        self.assertIsNone(self.cache.open_table(path, self.reader))
+
+    def test_prune(self):
+        """ Are the least recently used tables removed to fit the cache?
+        """
+        paths = [ self.write_file('data%i.csv' % i, 1000) for i in range(3) ]
+        tables = [ self.cache.convert(path, self.reader) for path in paths ]
+        table_size = sum(os.path.getsize(os.path.join(tables[0].path, name))
+                         for name in os.listdir(tables[0].path))
+
+        # Use the first table, so that the second is the least recently used.
+        for i, path in enumerate(paths):
+            os.utime(tables[i].path, (i, i))
+        self.cache.open_table(paths[0], self.reader)
+        self.cache.max_size = 2 * table_size
+        self.cache.prune()
+        self.assertIsNotNone(self.cache.open_table(paths[0], self.reader))
+        self.assertIsNone(self.cache.open_table(paths[1], self.reader))
+        self.assertIsNotNone(self.cache.open_table(paths[2], self.reader))
+
+        # The table just converted is kept, even if it does not fit.
+        self.cache.max_size = 0
+        self.cache.convert(paths[1], self.reader)
+        self.assertEqual(len(os.listdir(self.cache.path)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
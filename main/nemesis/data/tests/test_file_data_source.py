@@ -1,20 +1,23 @@
 from __future__ import absolute_import
 
 import os.path
+import shutil
+import tempfile
 import unittest
 from pandas.util.testing import assert_frame_equal
 
 from nemesis.r.ast import Call, Name, Constant
+from ..file_cache import FileCache
 from ..file_data_source import FileDataSource
 from .sample_data import sample_data, sample_variables
 
 
 class TestFileDataSource(unittest.TestCase):
 
-    def _test_load_file_type(self, ext, check_types=True):
+    def _test_load_file_type(self, ext, check_types=True, file_cache=None):
         data_dir = os.path.join(os.path.dirname(__file__), 'data')
         path = os.path.join(data_dir, 'sample_data' + ext)
-        ds = FileDataSource(path=path)
+        ds = FileDataSource(path=path, file_cache=file_cache)
         
         self.assertTrue(ds.can_load)
         ds.load_metadata()
@@ -49,6 +52,17 @@ class TestFileDataSource(unittest.TestCase):
         target = Call(Name('read.xlsx'), Constant('foo.xls'), Constant(1))
         self.assertEqual(ds.ast(), target)
     
+    def test_ast_xls_sheet(self):
+        ds = FileDataSource(path='foo.xlsx', sheet='Data')
+        target = Call(Name('read.xlsx'), Constant('foo.xlsx'),
+                      (Name('sheetName'), Constant('Data')))
+        self.assertEqual(ds.ast(), target)
+
+    def test_ast_parquet(self):
+        ds = FileDataSource(path='foo.parquet')
+        target = Call(Name('read_parquet'), Constant('foo.parquet'))
+        self.assertEqual(ds.ast(), target)
+
     def test_ast_rds(self):
         ds = FileDataSource(path='foo.RDS')
         target = Call(Name('readRDS'), Constant('foo.RDS'))
@@ -57,12 +71,94 @@ class TestFileDataSource(unittest.TestCase):
     def test_load_csv(self):
         self._test_load_file_type('.csv')
 
+    def test_load_cached_csv(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            cache = FileCache(tmp_dir)
+            # Once to convert the file, and once to read the converted table.
+            for i in range(2):
+                self._test_load_file_type('.csv', file_cache=cache)
+                self.assertEqual(len(os.listdir(tmp_dir)), 1)
+            ds = FileDataSource(path=os.path.join(
+                os.path.dirname(__file__), 'data', 'sample_data.csv'))
+            self.assertIsNotNone(cache.open_table(ds.path, ds._file_reader))
+            chunks = list(FileDataSource(path=ds.path, file_cache=cache)
+                          .iter_load(['bar', 'id']))
+            assert_frame_equal(chunks[0], sample_data[['id', 'bar']])
+        finally:
+            shutil.rmtree(tmp_dir)
+
     def test_load_tsv(self):
         self._test_load_file_type('.tsv')
 
     def test_load_excel(self):
         self._test_load_file_type('.xlsx')
+
+    def test_excel_background_convert(self):
+        data_dir = os.path.join(os.path.dirname(__file__), 'data')
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            cache = FileCache(tmp_dir)
+            path = os.path.join(data_dir, 'sample_data.xlsx')
+            ds = FileDataSource(path=path, sheet='Sheet', file_cache=cache)
+            cache.convert_async(path, ds._file_reader, export=True).result()
+            export_path = cache.export_path(path, ds._file_reader)
+            # Only the program of a run reads the exported file.
+            self.assertEqual(ds.ast(), ds._file_reader.ast(path))
+            self.assertEqual(ds.run_ast(), Constant(export_path))
+            loaded = FileDataSource(path=export_path).load()
+            assert_frame_equal(loaded, sample_data)
+
+            ds.limit_rows = True
+            ds.num_rows = 1
+            assert_frame_equal(ds.load(variables=['baz', 'id']),
+                               sample_data[:1][['id', 'baz']])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_load_parquet(self):
+        self._test_load_file_type('.parquet')
+
+    def test_load_feather(self):
+        self._test_load_file_type('.feather')
+
+    def test_parquet_filters(self):
+        data_dir = os.path.join(os.path.dirname(__file__), 'data')
+        path = os.path.join(data_dir, 'sample_data.parquet')
+        reader = FileDataSource(path=path)._file_reader
+        loaded = reader.read_data(path, columns=['foo'],
+                                  filters=[('id', '>=', 2)])
+        assert_frame_equal(loaded, sample_data.loc[[0, 2], ['foo']]
+                           .reset_index(drop=True))
+        loaded = reader.read_data(path, filters=[('foo', 'in', ['b'])])
+        assert_frame_equal(loaded, sample_data[2:].reset_index(drop=True))
+        loaded = reader.read_data(path, filters=[('id', '>', 3)])
+        assert_frame_equal(loaded, sample_data[:0])
     
+    def test_fingerprint(self):
+        data_dir = os.path.join(os.path.dirname(__file__), 'data')
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'sample_data.csv')
+            shutil.copy(os.path.join(data_dir, 'sample_data.csv'), path)
+            ds = FileDataSource(path=path)
+            original = FileDataSource(
+                path=os.path.join(data_dir, 'sample_data.csv'))
+            sampled, full = ds.fingerprint(), ds.fingerprint(full=True)
+            self.assertEqual(ds.fingerprint(), sampled)
+            self.assertNotEqual(sampled, full)
+
+            # A full fingerprint recognizes a copy of the same data.
+            self.assertEqual(original.fingerprint(full=True), full)
+
+            with open(path, 'a') as f:
+                f.write('1,2,3\n')
+            self.assertNotEqual(ds.fingerprint(), sampled)
+            self.assertNotEqual(ds.fingerprint(full=True), full)
+        finally:
+            shutil.rmtree(tmp_dir)
+        self.assertIsNone(ds.fingerprint())
+
     def test_file_types(self):
         ds = FileDataSource()
         self.assertTrue('.csv' in ds.file_types)
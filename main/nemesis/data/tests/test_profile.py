@@ -0,0 +1,88 @@
+from __future__ import absolute_import
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from ..profile import DataProfile, profile_chunks
+
+
+class TestProfile(unittest.TestCase):
+
+    def setUp(self):
+        n = 20000
+        rs = np.random.RandomState(0)
+        x = rs.normal(100, 10, n)
+        x[::7] = np.nan
+        self.df = pd.DataFrame({
+            'i': rs.randint(0, 5000, n),
+            'x': x,
+            's': np.array([ u'v%i' % i for i in range(50) ],
+                          dtype=object)[rs.randint(0, 50, n)],
+            'd': rs.randint(0, 5, n),
+        }, columns=['i', 'x', 's', 'd'])
+        self.chunks = [ self.df[i:i + 3000] for i in range(0, n, 3000) ]
+
+    def test_statistics(self):
+        """ Are the statistics of chunks those of the whole data?
+        """
+        profile = profile_chunks(self.chunks)
+        self.assertEqual(profile.rows, len(self.df))
+        for name in ('i', 'x', 'd'):
+            stats = profile.statistics(name)
+            column = self.df[name]
+            self.assertEqual(stats['count'], column.count())
+            self.assertAlmostEqual(stats['mean'], column.mean())
+            self.assertAlmostEqual(stats['std'], column.std())
+            self.assertEqual(stats['min'], column.min())
+            self.assertEqual(stats['max'], column.max())
+            unique = column.nunique()
+            self.assertTrue(abs(stats['unique'] - unique) <= 0.05 * unique)
+
+        stats = profile.statistics('s')
+        counts = self.df['s'].value_counts()
+        self.assertEqual(stats['unique'], 50)
+        self.assertEqual(stats['top'], counts.index[0])
+        self.assertEqual(stats['freq'], counts.iloc[0])
+
+    def test_discrete(self):
+        """ Is the discrete/continuous decision that of the heuristic?
+        """
+        profile = profile_chunks(self.chunks)
+        self.assertFalse(profile.is_discrete('i'))
+        self.assertFalse(profile.is_discrete('x'))
+        self.assertTrue(profile.is_discrete('s'))
+        self.assertTrue(profile.is_discrete('d'))
+
+    def test_types(self):
+        """ Are the types of columns promoted across chunks?
+        """
+        profile = DataProfile(['a', 'b'])
+        profile.update(pd.DataFrame({ 'a': [1, 2], 'b': [None, None] }))
+        profile.update(pd.DataFrame({ 'a': [np.nan, 3.5], 'b': [1, 2] }))
+        self.assertEqual(profile.dtype('a'), np.float64)
+        self.assertEqual(profile.dtype('b'), np.int64)
+
+        variables = profile.variables(source='t')
+        self.assertEqual([ var.name for var in variables ], ['a', 'b'])
+        self.assertEqual(variables[0].statistics['count'], 3)
+        self.assertEqual(variables[1].statistics['mean'], 1.5)
+
+    def test_cancelled(self):
+        """ Does profiling stop at the next chunk once it is cancelled?
+        """
+        read = []
+        def chunks():
+            for chunk in self.chunks:
+                read.append(chunk)
+                yield chunk
+        profile = profile_chunks(chunks(), cancelled=lambda: len(read) > 2)
+        self.assertIsNone(profile)
+        self.assertEqual(len(read), 3)
+        self.assertIsNotNone(profile_chunks(self.chunks,
+                                            cancelled=lambda: False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,7 +8,8 @@ import pandas as pd
 from pandas.util.testing import assert_frame_equal
 import sqlalchemy
 
-from ..sql import read_sql_table, sample_sql_table
+from ..sql import iter_sql_query, iter_sql_table, read_sql_query, \
+    read_sql_table, sample_sql_table
 from .sample_data import sample_data
 
 
@@ -56,6 +57,70 @@ class TestSqlFunctions(unittest.TestCase):
         loaded = read_sql_table(engine, name, where=where)
         assert_frame_equal(standardize(loaded), standardize(target))
     
+    def test_iter_table_sqlite(self):
+        data_dir = os.path.join(os.path.dirname(__file__), 'data')
+        path = os.path.join(data_dir, 'sample_data.db')
+        engine = sqlalchemy.create_engine('sqlite:///{path}'.format(path=path))
+        name = 'sample_tbl'
+        
+        chunks = list(iter_sql_table(engine, name, 2))
+        self.assertEqual([ len(chunk) for chunk in chunks ],
+                         [ 2 ] * (len(sample_data) // 2) +
+                         [ 1 ] * (len(sample_data) % 2))
+        loaded = pd.concat(chunks, ignore_index=True)
+        assert_frame_equal(loaded, read_sql_table(engine, name))
+        
+        cols = ['foo','bar']
+        chunks = iter_sql_table(engine, name, 2, index_col='id', columns=cols)
+        assert_frame_equal(pd.concat(chunks),
+                           read_sql_table(engine, name, index_col='id',
+                                          columns=cols))
+    
+    def test_read_query_sqlite(self):
+        data_dir = os.path.join(os.path.dirname(__file__), 'data')
+        path = os.path.join(data_dir, 'sample_data.db')
+        engine = sqlalchemy.create_engine('sqlite:///{path}'.format(path=path))
+        query = 'SELECT * FROM sample_tbl WHERE baz = 1'
+        
+        loaded = read_sql_query(engine, query)
+        assert_frame_equal(loaded,
+                           read_sql_table(engine, 'sample_tbl', where='baz = 1'))
+        
+        # Columns, limits and orderings are applied in the database.
+        loaded = read_sql_query(engine, query, index_col='id',
+                                columns=['foo'], order_by='id', limit=1)
+        self.assertEqual(list(loaded.columns), ['foo'])
+        self.assertEqual(len(loaded), 1)
+        self.assertEqual(loaded.index[0],
+                         sample_data.query('baz == 1')['id'].min())
+
+        # A trailing semicolon does not prevent the query being a subquery.
+        loaded = read_sql_query(engine, query + ' ;\n', columns=['foo'],
+                                where='id > 0', limit=1)
+        self.assertEqual(list(loaded.columns), ['foo'])
+        self.assertEqual(len(loaded), 1)
+
+    def test_read_raw_query_sqlite(self):
+        data_dir = os.path.join(os.path.dirname(__file__), 'data')
+        path = os.path.join(data_dir, 'sample_data.db')
+        engine = sqlalchemy.create_engine('sqlite:///{path}'.format(path=path))
+        # A statement that cannot be a subquery is run as is.
+        query = 'PRAGMA table_info(sample_tbl)'
+
+        loaded = read_sql_query(engine, query, index_col='cid')
+        self.assertEqual(list(loaded['name']), list(sample_data.columns))
+        loaded = read_sql_query(engine, query, columns=['name'], limit=2)
+        self.assertEqual(list(loaded.columns), ['name'])
+        self.assertEqual(len(loaded), 2)
+        chunks = list(iter_sql_query(engine, query, 2))
+        self.assertEqual(len(chunks[0]), 2)
+        self.assertEqual(sum(map(len, chunks)), len(sample_data.columns))
+        self.assertEqual(len(read_sql_query(engine, query, limit=0)), 0)
+
+        # The WHERE clause cannot be applied to it.
+        with self.assertRaises(sqlalchemy.exc.DBAPIError):
+            read_sql_query(engine, query, where='cid > 0')
+    
     def test_sample_table_sqlite(self):
         engine = sqlalchemy.create_engine('sqlite:///:memory:')
         n = 1000
@@ -70,6 +135,40 @@ class TestSqlFunctions(unittest.TestCase):
         
         sampled = sample_sql_table(engine, 'tbl', 1100)
         self.assertEqual(len(sampled), 1000)
+        
+        for method in ('rowid', 'reservoir'):
+            sampled = sample_sql_table(engine, 'tbl', 100, method=method)
+            self.assertEqual(len(sampled), 100)
+            self.assertEqual(len(sampled['id'].unique()), 100)
+            
+            sampled = sample_sql_table(engine, 'tbl', 50, method=method,
+                                       where='id % 2 = 0')
+            self.assertEqual(len(sampled), 50)
+            self.assertTrue((sampled['id'] % 2 == 0).all())
+            
+            sampled = sample_sql_table(engine, 'tbl', 10, method=method,
+                                       where='id < 0')
+            self.assertEqual(len(sampled), 0)
+            self.assertEqual(list(sampled.columns), ['id', 'x'])
+        
+        # Row ID sampling with gaps in the row IDs.
+        engine.execute('DELETE FROM tbl WHERE id >= 100 AND id < 500')
+        sampled = sample_sql_table(engine, 'tbl', 200, method='rowid')
+        self.assertEqual(len(sampled), 200)
+        self.assertEqual(len(sampled['id'].unique()), 200)
+
+        # Sparse row IDs and selective WHERE clauses fall back to a scan.
+        sparse = pd.DataFrame({ 'id': np.arange(n) * 10 ** 12 })
+        sparse.to_sql('sparse', engine, index=False,
+                      dtype={ 'id': sqlalchemy.Integer })
+        engine.execute('CREATE TABLE keyed (id INTEGER PRIMARY KEY)')
+        engine.execute('INSERT INTO keyed SELECT id FROM sparse')
+        sampled = sample_sql_table(engine, 'keyed', 100, method='rowid')
+        self.assertEqual(len(sampled['id'].unique()), 100)
+        sampled = sample_sql_table(engine, 'tbl', 20, method='rowid',
+                                   where='id < 50')
+        self.assertEqual(len(sampled), 20)
+        self.assertTrue((sampled['id'] < 50).all())
 
 
 if __name__ == '__main__':
@@ -1,10 +1,17 @@
 from __future__ import absolute_import
 
 import os.path
+import shutil
+import sqlite3
+import tempfile
 import unittest
+from contextlib import closing
 
+import numpy as np
+import pandas as pd
 from pandas.util.testing import assert_frame_equal
 
+from nemesis.fingerprint import FINGERPRINT_BLOCK_ROWS, FINGERPRINT_NUM_BLOCKS
 from nemesis.r.ast import Call, Name, Constant
 from ..sql_data_source import SQLDataSource
 from .sample_data import sample_data, sample_variables
@@ -75,6 +82,95 @@ class TestSqlDataSource(unittest.TestCase):
         loaded = ds.load()
         assert_frame_equal(loaded, sample_data[:2])
 
+    def test_profile(self):
+        data_dir = os.path.join(os.path.dirname(__file__), 'data')
+        ds = SQLDataSource(
+            dialect = 'sqlite',
+            database = os.path.join(data_dir, 'sample_data.db'),
+            table = 'sample_tbl',
+        )
+        chunks = list(ds.iter_load(['id', 'bar']))
+        assert_frame_equal(chunks[0], sample_data[['id', 'bar']])
+
+        variables = ds.profile()
+        self.assertEqual(variables, sample_variables)
+        self.assertEqual(variables[2].statistics['mean'],
+                         sample_data['bar'].mean())
+
+    def test_engine_cache(self):
+        data_dir = os.path.join(os.path.dirname(__file__), 'data')
+        ds = SQLDataSource(
+            dialect = 'sqlite',
+            database = os.path.join(data_dir, 'sample_data.db'),
+            table = 'sample_tbl',
+        )
+        engine = ds.get_engine()
+        self.assertIs(ds.get_engine(), engine)
+        self.assertFalse(engine.echo)
+
+        # The engine is not shared with copies of the data source...
+        clone = ds.clone_traits()
+        self.assertIsNot(clone.get_engine(), engine)
+
+        # ...and is replaced when the connection parameters change.
+        ds.echo = True
+        self.assertIsNot(ds.get_engine(), engine)
+        self.assertTrue(ds.get_engine().echo)
+        ds.dispose_engine()
+        self.assertIsNot(ds.get_engine(), engine)
+
+    def test_fingerprint(self):
+        data_dir = os.path.join(os.path.dirname(__file__), 'data')
+        path = os.path.join(data_dir, 'sample_data.db')
+        ds = SQLDataSource(
+            dialect = 'sqlite',
+            database = path,
+            table = 'sample_tbl',
+        )
+        sampled, full = ds.fingerprint(), ds.fingerprint(full=True)
+        self.assertNotEqual(sampled, full)
+
+        # The same data from a reformatted query has the same fingerprint.
+        query = SQLDataSource(
+            dialect = 'sqlite',
+            database = path,
+            table = 'NA',
+            query = 'SELECT *\n  FROM sample_tbl',
+        )
+        self.assertEqual(query.fingerprint(), sampled)
+        self.assertEqual(query.fingerprint(full=True), full)
+
+        query.query = 'SELECT * FROM sample_tbl LIMIT 2'
+        self.assertNotEqual(query.fingerprint(), sampled)
+
+    def test_fingerprint_sampled_blocks(self):
+        n = 3 * FINGERPRINT_NUM_BLOCKS * FINGERPRINT_BLOCK_ROWS
+        df = pd.DataFrame({ 'id': np.arange(n), 'value': np.arange(n) * 0.5 })
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'data.db')
+            with closing(sqlite3.connect(path)) as conn:
+                df.to_sql('tbl', conn, index=False)
+                # The same rows, stored in a different order.
+                df.iloc[::-1].to_sql('reversed', conn, index=False)
+            ds = SQLDataSource(dialect='sqlite', database=path, table='tbl')
+            sampled = ds.fingerprint()
+            reversed_ds = SQLDataSource(dialect='sqlite', database=path,
+                                        table='reversed')
+            self.assertEqual(reversed_ds.fingerprint(), sampled)
+
+            # An edit to the last row, far past the first block, is detected
+            # even though the row count is unchanged.
+            with closing(sqlite3.connect(path)) as conn:
+                conn.execute('UPDATE tbl SET value = -1 WHERE id = ?',
+                             (n - 1,))
+                conn.commit()
+            ds.dispose_engine()
+            self.assertNotEqual(ds.fingerprint(), sampled)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -20,6 +20,10 @@ class BaseTableModel(QAbstractTableModel):
         self.selection_drag = selection_drag
         self.decoration = decoration
 
+        # Incremented whenever all the data may have changed, so that views
+        # of whole columns can be cached (see `get_column`).
+        self.data_version = 0
+
     # BaseTableModel abstract interface
 
     @abstractmethod
@@ -49,6 +53,10 @@ class BaseTableModel(QAbstractTableModel):
     # BaseTableModel interface
 
     def filter(self, text):
+        """ Filter the rows with a SQL WHERE clause.
+
+        Models may raise a QueryError if the clause is invalid.
+        """
         pass
 
     def add_columns(self, columns):
@@ -63,6 +71,15 @@ class BaseTableModel(QAbstractTableModel):
         for i in range(self.columnCount()):
             self.remove_column(0)
 
+    def get_column(self, j):
+        """ Get the values of a column, in the order of the rows, as an array.
+
+        The array must not be modified. This implementation gets the values
+        one at a time, so subclasses should override it.
+        """
+        return np.array([self.get_value(i, j)
+                         for i in range(self.rowCount())])
+
     def map_to_col(self, j):
         return self.get_columns()[j]
 
@@ -89,6 +106,7 @@ class BaseTableModel(QAbstractTableModel):
     def emit_all_data_changed(self):
         """ Emit signals to note that all data has changed, e.g. by sorting.
         """
+        self.data_version += 1
         self.dataChanged.emit(
             self.index(0, 0),
             self.index(self.rowCount() - 1, self.columnCount() - 1)
@@ -4,6 +4,7 @@ from atom.api import Typed, List, Bool, Str, Event, observe
 from enaml.core.api import d_
 from enaml.widgets.api import Container
 
+from nemesis.data.data_frame_query import QueryError
 from nemesis.data.ui.base_table_model import BaseTableModel
 
 
@@ -20,6 +21,9 @@ class DataExplorerBase(Container):
     # Filter field text
     filter_text = d_(Str())
 
+    # The error in the filter text, if it is invalid
+    filter_error = d_(Str())
+
     # An event fired when a data explorer widget is changed
     dirtied = d_(Event())
 
@@ -32,7 +36,12 @@ class DataExplorerBase(Container):
     @observe('filter_text')
     def _change_filter_text(self, change):
         if self.model:
-            self.model.filter(change['value'])
+            try:
+                self.model.filter(change['value'])
+            except QueryError as exc:
+                self.filter_error = unicode(exc)
+            else:
+                self.filter_error = u''
 
     def save_state(self):
         return {
@@ -1,4 +1,5 @@
 import numpy as np
+import pandas as pd
 
 from enaml.qt.QtCore import QModelIndex, Qt
 
@@ -22,32 +23,38 @@ class DataFrameTableModel(BaseTableModel):
         else:
             self.id_column = None
 
-        self._sorted_column = None
-        self._sorted_order = None
+        # The sort keys, (column name, ascending) pairs, most significant
+        # first, and the sort cache (see `_update_sort`).
+        self._sort_keys = []
+        self._sort_codes = {}
+        self._sort_permutations = {}
+        self._row_index = None
         self.columns = data_frame.columns
         self.set_data_frame(data_frame)
 
     # BaseTableModel interface
 
     def filter(self, text):
+        """ Filter the rows with a SQL WHERE clause.
+
+        Raises a QueryError if the clause is invalid, leaving the rows
+        unchanged.
+        """
         df = DataFrameQuery.execute(self.original_data_frame, text)
-        if df is not None:
-            self.set_data_frame(df)
-        else:
-            self.set_data_frame(self.original_data_frame)
+        self.set_data_frame(df)
 
     def set_columns(self, columns):
         if self.id_column not in columns:
             columns.insert(0, self.id_column)
 
         self.columns = columns
-        self.argsort_indices = None
-        self.inverse_argsort_indices = None
         self.cache = ColumnCache(self.data_frame.ix[:, columns])
 
-        if self._sorted_column in self.columns and self._sorted_order is not None:
-            self.sort(self.columns.index(self._sorted_column),
-                      self._sorted_order)
+        # Keep sorting by the columns that remain. The permutation is reused
+        # from the cache unless a sort column was removed.
+        self._sort_keys = [ key for key in self._sort_keys
+                            if key[0] in columns ]
+        self._update_sort()
 
         self.emit_all_data_changed()
 
@@ -59,14 +66,14 @@ class DataFrameTableModel(BaseTableModel):
         return column in self.original_data_frame.columns
 
     def map_to_row(self, i):
-        return self.original_data_frame[self.id_column].iloc[
+        return self.data_frame[self.id_column].iloc[
             self.map_view_to_data(i)
         ]
 
     def map_from_row(self, row):
-        return self.map_data_to_view(
-            self.original_data_frame[self.id_column].get_loc(row)
-        )
+        if self._row_index is None:
+            self._row_index = pd.Index(self.data_frame[self.id_column])
+        return self.map_data_to_view(self._row_index.get_loc(row))
 
     def map_view_to_data(self, i):
         if self.argsort_indices is not None:
@@ -81,10 +88,20 @@ class DataFrameTableModel(BaseTableModel):
     def get_value(self, i, j):
         return self.cache[self.map_view_to_data(i), j]
 
+    def get_column(self, j):
+        # Unless the rows are sorted, this is a view of the data frame.
+        column = self.cache.columns[j]
+        if self.argsort_indices is not None:
+            column = column[self.argsort_indices]
+        return column
+
     # DataFrameModel interface
 
     def set_data_frame(self, df):
         self.data_frame = df
+        self._sort_codes = {}
+        self._sort_permutations = {}
+        self._row_index = None
         self.set_columns(self.columns)
 
     def _strip_index(self, df):
@@ -114,38 +131,96 @@ class DataFrameTableModel(BaseTableModel):
         return 0
 
     def sort(self, column, order=Qt.AscendingOrder):
-        self._sorted_column = self.columns[column]
-        self._sorted_order = order
         if column == -1:
             # Return to unsorted.
-            if self.argsort_indices is not None:
-                self.argsort_indices = None
-                self.emit_all_data_changed()
-            return
-        ascending = (order == Qt.AscendingOrder)
-        data = self.cache.columns[column]
-        # If things are currently sorted, we will try to be stable
-        # relative to that order, not the original data's order.
-        if self.argsort_indices is not None:
-            data = data[self.argsort_indices]
-        if ascending:
-            indices = np.argsort(data, kind='mergesort')
+            keys = []
         else:
-            # Do the double-reversing to maintain stability.
-            indices = (len(data) - 1 -
-                       np.argsort(data[::-1], kind='mergesort')[::-1])
-            if np.issubdtype(data.dtype, np.dtype(np.floating)):
-                # The block of NaNs is now at the beginning. Move it to
-                # the bottom.
-                num_nans = np.isnan(data).sum()
-                if num_nans > 0:
-                    indices = np.roll(indices, -num_nans)
-        if self.argsort_indices is not None:
-            indices = self.argsort_indices[indices]
-        self.argsort_indices = indices
-        self.inverse_argsort_indices = np.argsort(indices)
+            # Sort by the column, then stably by the previous sort keys.
+            name = self.columns[column]
+            keys = [ (name, order == Qt.AscendingOrder) ]
+            keys.extend(key for key in self._sort_keys if key[0] != name)
+        self._sort_keys = keys
+        self._update_sort()
         self.emit_all_data_changed()
 
+    # Private interface
+
+    def _update_sort(self):
+        """ Set the sort permutation for the current sort keys.
+
+        The permutations are cached by sort keys, and the rank codes of the
+        columns by name, until the data frame changes. So toggling the order
+        of a column, or adding or removing columns, does not sort again.
+        """
+        keys = tuple(self._sort_keys)
+        if not keys:
+            self.argsort_indices = None
+            self.inverse_argsort_indices = None
+            return
+        cached = self._sort_permutations.get(keys)
+        if cached is None:
+            ranks = self._sort_ranks(*keys[0])
+            # Ranking a column caches its ascending permutation.
+            cached = self._sort_permutations.get(keys)
+        if cached is None:
+            previous = self._sort_permutations.get(keys[1:])
+            if len(keys) == 1:
+                indices = np.argsort(ranks, kind='mergesort')
+            elif previous is not None:
+                # Usually the rows were just sorted by the other keys, so
+                # refine that order.
+                previous = previous[0]
+                indices = previous[
+                    np.argsort(ranks[previous], kind='mergesort')]
+            else:
+                # np.lexsort is stable and sorts by the last key first.
+                indices = np.lexsort(
+                    [ self._sort_ranks(*key) for key in reversed(keys[1:]) ]
+                    + [ ranks ])
+            # Invert the permutation by scattering, rather than sorting.
+            inverse = np.empty_like(indices)
+            inverse[indices] = np.arange(len(indices))
+            if len(self._sort_permutations) >= MAX_CACHED_SORTS:
+                self._sort_permutations.clear()
+            cached = self._sort_permutations[keys] = (indices, inverse)
+        self.argsort_indices, self.inverse_argsort_indices = cached
+
+    def _sort_ranks(self, name, ascending):
+        """ The ranks of the values of a column in the given order, with
+        missing values last.
+        """
+        if name not in self._sort_codes:
+            self._sort_codes[name] = self._rank_column(name)
+        codes, n = self._sort_codes[name]
+        ranks = codes if ascending else n - 1 - codes
+        return np.where(codes < 0, n, ranks)
+
+    def _rank_column(self, name):
+        """ Compute the dense rank codes of a column, with -1 for missing
+        values, and the number of distinct values.
+
+        The ascending sort permutation of the column is a by-product, so it
+        is cached too.
+        """
+        values = self.data_frame[name].values
+        missing = pd.isnull(values)
+        if missing.any():
+            present = np.flatnonzero(~missing)
+            order = present[np.argsort(values[present], kind='mergesort')]
+        else:
+            order = np.argsort(values, kind='mergesort')
+        sorted_values = values[order]
+        distinct = np.ones(len(order), dtype=bool)
+        distinct[1:] = sorted_values[1:] != sorted_values[:-1]
+        codes = np.full(len(values), -1, dtype=np.intp)
+        codes[order] = np.cumsum(distinct) - 1
+
+        indices = np.concatenate([ order, np.flatnonzero(missing) ])
+        inverse = np.empty_like(indices)
+        inverse[indices] = np.arange(len(indices))
+        self._sort_permutations[((name, True),)] = (indices, inverse)
+        return codes, int(distinct.sum())
+
 
 class ColumnCache(object):
     """ Pull out a view for each column for quick element access.
@@ -174,3 +249,9 @@ class ColumnCache(object):
         """
         del self.data_frame
         del self.columns
+
+
+# Globals and constants
+
+# The maximum number of sort permutations cached for a data frame.
+MAX_CACHED_SORTS = 8
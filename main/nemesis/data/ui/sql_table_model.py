@@ -1,17 +1,38 @@
+import logging
+import threading
+from collections import OrderedDict, deque
 from math import ceil
-from threading import Thread
 
+import pandas
 import sqlalchemy
+try:
+    from concurrent import futures # version 3
+except ImportError:
+    import futures # version 2
+from enaml.application import deferred_call
 from enaml.qt.QtCore import Qt, QModelIndex
 
 from nemesis.data.ui.base_table_model import BaseTableModel
 
+logger = logging.getLogger(__name__)
+
 
 class SQLLazyCache(object):
     """ A caching data source that fetches results lazily from a SQL table
+
+    The rows are fetched in chunks, ordered by the sort column and then by the
+    ID column, so that the order is total. Chunks are located by seeking to
+    the sort key of a neighbouring chunk that has already been fetched (keyset
+    pagination), rather than with an OFFSET, which is linear in the offset.
+
+    Chunks are fetched in the background by a single worker thread, which
+    takes requests from a queue. The chunks are cached separately for each
+    sort order and filter, so that switching back to a previous sort or
+    filter does not fetch them again. The row counts of filters are cached
+    too, and are computed in the background.
     """
     def __init__(self, engine, table, columns, id_column, chunk_size=100,
-                 prefetch=1):
+                 prefetch=1, max_chunks=100, loaded_callback=None):
         """ Initialize the cache.
 
         Parameters:
@@ -33,6 +54,14 @@ class SQLLazyCache(object):
 
         prefetch : int, optional
             The number of chunks to fetch before and after the current chunk.
+
+        max_chunks : int, optional
+            The maximum number of chunks to keep in the cache, for each sort
+            order and filter.
+
+        loaded_callback : callable, optional
+            Called with the index of a chunk when it has been fetched in the
+            background. It is called on the worker thread.
         """
         self.engine = engine
         self.table = table
@@ -40,48 +69,107 @@ class SQLLazyCache(object):
         self.id_column = id_column
         self.chunk_size = chunk_size
         self.prefetch = prefetch
+        self.max_chunks = max_chunks
+        self.loaded_callback = loaded_callback
         self.sorted = None
         self.where = None
 
+        self._lock = threading.Condition()
+        self._queue = deque()
+        self._pending = set()
+        self._worker = None
+        self._views = OrderedDict()
+        self._view = _View(None, None, 0)
+        self._counts = OrderedDict()
+        self._count_future = None
+        self._executor = None
         self.reset()
 
+    @property
+    def total_rows(self):
+        """ The number of rows in the current sort order and filter.
+        """
+        return self._view.total_rows
+
     def reset(self):
         """ Reset the cache.
+
+        The cached rows are discarded, but the cached row counts are kept.
         """
+        where = self.where
         try:
-            next_rows = self._compute_row_count()
+            count = self._counts.get(where)
+            if count is None:
+                count = self._compute_row_count(where)
         except:
             return
 
-        self.total_rows = next_rows
-        self._cache = {}
-        self._row_to_idx = {}
+        with self._lock:
+            self._add_count(where, count)
+            self._views.clear()
+            self._activate((self.sorted, where), count)
 
     def __getitem__(self, item):
         """ Fetch an item from the cache.
+
+        If the item is not cached, this waits until it has been fetched.
         """
         i, j = item
+        view = self._view
 
-        if i >= self.total_rows:
+        if i >= view.total_rows:
             raise IndexError('Invalid row index')
 
-        chunk = i / self.chunk_size
+        chunk = i // self.chunk_size
+        self.prefetch_chunks(chunk)
+        rows = self._wait_for_chunk(view, chunk)
+        if rows is None:
+            self.fetch_chunk(chunk, view=view)
+            rows = self._cached_chunk(view, chunk)
+        return rows[i % self.chunk_size][j]
 
-        thread = Thread(target=self.prefetch_chunks, args=(chunk,))
-        thread.start()
-        self.fetch_chunk(chunk)
-        thread.join()
+    def request_row(self, i):
+        """ Request the chunk containing a row, and the chunks around it,
+        without waiting for them to be fetched.
 
-        return self._cache[chunk][i % self.chunk_size][j]
+        Returns whether the row is already cached.
+        """
+        chunk = i // self.chunk_size
+        self.prefetch_chunks(chunk)
+        return self._cached_chunk(self._view, chunk) is not None
 
     def prefetch_chunks(self, chunk):
-        """ Prefetch chunks before and after a given chunk.
-        """
-        for k in range(chunk - self.prefetch, chunk):
-            self.fetch_chunk(k)
+        """ Request a chunk and the chunks before and after it.
 
-        for k in range(chunk - 1, chunk + self.prefetch + 1):
-            self.fetch_chunk(k)
+        The chunks are fetched in the background, nearest first.
+        """
+        chunks = [chunk]
+        for k in range(1, self.prefetch + 1):
+            chunks.extend([chunk + k, chunk - k])
+
+        with self._lock:
+            view = self._view
+            total_chunks = self._total_chunks(view)
+            for k in reversed(chunks):
+                if k < 0 or k >= total_chunks or k in view.chunks:
+                    continue
+                # The latest requests are the most urgent.
+                request = (view, k)
+                if request in self._pending:
+                    if request not in self._queue:
+                        continue    # Being fetched.
+                    self._queue.remove(request)
+                self._queue.appendleft(request)
+                self._pending.add(request)
+
+            # Forget requests that have fallen behind, e.g. when scrolling
+            # quickly, keeping enough for a few consecutive positions.
+            while len(self._queue) > 4 * len(chunks):
+                self._pending.discard(self._queue.pop())
+
+            if self._queue:
+                self._start_worker()
+                self._lock.notify_all()
 
     def sort(self, column, ascending):
         """ Sort the data by a column.
@@ -94,9 +182,12 @@ class SQLLazyCache(object):
         ascending : bool
             Whether the sort is ascending (True) or descending (False)
 
+        Returns
+        -------
+        A future that is done when the sorted rows are available.
         """
-        self.sorted = (column, ascending)
-        self.reset()
+        self.sorted = (self.columns[column], ascending)
+        return self._update_view()
 
     def filter(self, text):
         """ Filter the data with a where clause.
@@ -105,9 +196,53 @@ class SQLLazyCache(object):
         ----------
         text : str
             The clause to filter by
+
+        Returns
+        -------
+        A future that is done when the filtered rows are available. Until
+        then, the previous rows remain available. The future is cancelled if
+        the filter is changed again before its rows are counted.
         """
-        self.where = text
-        self.reset()
+        self.where = text or None
+        return self._update_view()
+
+    def count_rows(self, where=None):
+        """ Count the rows selected by a where clause, in the background.
+
+        Returns a future for the count. The counts are cached.
+        """
+        with self._lock:
+            count = self._counts.get(where)
+            if count is not None:
+                self._add_count(where, count)
+                future = futures.Future()
+                future.set_result(count)
+                return future
+
+            if self._executor is None:
+                self._executor = futures.ThreadPoolExecutor(max_workers=1)
+            return self._executor.submit(self._count_job, where)
+
+    def get_column(self, name):
+        """ Fetch all the values of a column, in the current order, as an
+        array.
+
+        This takes a single query, and does not use or fill the cache.
+        """
+        with self._lock:
+            view = self._view
+            query = sqlalchemy.select([ sqlalchemy.column(name) ])\
+                .select_from(sqlalchemy.table(self.table))
+            if view.where is not None:
+                query = query.where(sqlalchemy.text(view.where))
+            query = query.order_by(*[
+                sqlalchemy.desc(expr) if descending else sqlalchemy.asc(expr)
+                for expr, descending in self._order_terms(view) ])
+
+        values = [ row[0] for row in self.engine.execute(query) ]
+        # Let pandas infer the type, so that NULLs become NaNs in numeric
+        # columns.
+        return pandas.Series(values).values
 
     def map_to_row(self, i):
         """ Map an integer row position to a row identifier.
@@ -116,21 +251,29 @@ class SQLLazyCache(object):
 
     def map_from_row(self, row):
         """ Map a row identifier to an integer row position.
-        """
-        if row in self._row_to_idx:
-            return self._row_to_idx[row]
-
-        # This is a brute force fallback, but there is no easy database
-        # agnostic way to get row indices in a query.
-        total_chunks = int(ceil(self.total_rows / float(self.chunk_size)))
-        for chunk in range(0, total_chunks):
-            self.fetch_chunk(chunk)
-            if row in self._row_to_idx:
-                return self._row_to_idx[row]
 
-        return None
-
-    def fetch_chunk(self, chunk, force=False):
+        Returns None if there is no such row, e.g. because it is filtered
+        out. Positions that are not known from the cached chunks are found
+        by counting the rows that come before the row in the database.
+        """
+        with self._lock:
+            view = self._view
+            position = view.row_to_idx.pop(row, None)
+            if position is not None:
+                view.row_to_idx[row] = position
+                return position
+            query = self._position_query(view, row)
+
+        count = self.engine.execute(query).fetchone()[0]
+        if not count:
+            return None
+
+        position = count - 1
+        with self._lock:
+            view.index_row(row, position)
+        return position
+
+    def fetch_chunk(self, chunk, force=False, view=None):
         """ Fetch a chunk from the database.
 
         Parameters
@@ -141,55 +284,315 @@ class SQLLazyCache(object):
         force : bool, optional
             Refetch the chunk even if it is already in the cache.
 
+        view : optional
+            The sort order and filter to fetch the chunk for. By default, the
+            current ones.
         """
-        total_chunks = ceil(self.total_rows / float(self.chunk_size))
-
-        if chunk < 0 or chunk >= total_chunks:
-            return
-
-        if chunk in self._cache and not force:
-            return
+        with self._lock:
+            if view is None:
+                view = self._view
+            if chunk < 0 or chunk >= self._total_chunks(view):
+                return
+            if chunk in view.chunks and not force:
+                return
+            query, reverse = self._chunk_query(view, chunk)
 
-        offset = chunk * self.chunk_size
-        limit = self.chunk_size
-
-        table = sqlalchemy.table(self.table)
-        columns = map(sqlalchemy.column, self.columns)
-        query = sqlalchemy.select(columns).select_from(table)
-
-        if self.sorted is not None:
-            col, ascending = self.sorted
-            order_by = sqlalchemy.column(self.columns[col])
-            if ascending:
-                order_by = sqlalchemy.asc(order_by)
-            else:
-                order_by = sqlalchemy.desc(order_by)
-
-            query = query.order_by(order_by)
-
-        query = query.offset(offset).limit(limit)
+        chunk_data = self.engine.execute(query).fetchall()
+        if reverse:
+            chunk_data.reverse()
 
-        if self.where is not None and len(self.where) > 0:
-            query = query.where(sqlalchemy.text(self.where))
+        with self._lock:
+            self._store_chunk(view, chunk, chunk_data)
 
-        chunk_data = self.engine.execute(query).fetchall()
-        self._cache[chunk] = chunk_data
+    def close(self):
+        """ Stop the background worker and any pending row count.
+        """
+        with self._lock:
+            self._queue.clear()
+            self._pending.clear()
+            self._worker = None
+            self._lock.notify_all()
+            if self._count_future is not None:
+                self._count_future.cancel()
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    # Private interface
+
+    def _update_view(self):
+        # Switch to the rows for the current sort order and filter, once
+        # their count is known. A count in progress for a previous filter is
+        # no longer needed.
+        key = (self.sorted, self.where)
+        if self._count_future is not None:
+            self._count_future.cancel()
+        future = self._count_future = self.count_rows(self.where)
+
+        def done(future):
+            if future.cancelled() or future.exception() is not None:
+                return
+            with self._lock:
+                if key == (self.sorted, self.where):
+                    self._activate(key, future.result())
+
+        future.add_done_callback(done)
+        return future
+
+    def _activate(self, key, count):
+        # Make the cached rows for a sort order and filter current. Requests
+        # for chunks of the previous rows are cancelled.
+        view = self._views.pop(key, None)
+        if view is None:
+            view = _View(key[0], key[1], count)
+        self._views[key] = view
+        while len(self._views) > MAX_CACHED_VIEWS:
+            self._views.popitem(last=False)
+        self._view = view
+        self._queue.clear()
+        self._pending.clear()
+        self._lock.notify_all()
+
+    def _count_job(self, where):
+        count = self._compute_row_count(where)
+        with self._lock:
+            self._add_count(where, count)
+        return count
+
+    def _add_count(self, where, count):
+        self._counts.pop(where, None)
+        self._counts[where] = count
+        while len(self._counts) > MAX_CACHED_COUNTS:
+            self._counts.popitem(last=False)
+
+    def _total_chunks(self, view):
+        return int(ceil(view.total_rows / float(self.chunk_size)))
+
+    def _cached_chunk(self, view, chunk):
+        # Get a cached chunk, marking it as recently used, or None.
+        with self._lock:
+            rows = view.chunks.pop(chunk, None)
+            if rows is not None:
+                view.chunks[chunk] = rows
+            return rows
+
+    def _wait_for_chunk(self, view, chunk):
+        # Wait until a requested chunk is no longer pending, and return it if
+        # it was fetched.
+        with self._lock:
+            while (view, chunk) in self._pending:
+                self._lock.wait()
+        return self._cached_chunk(view, chunk)
+
+    def _store_chunk(self, view, chunk, chunk_data):
+        # Cache a chunk, evicting the least recently used chunks. The sort
+        # keys of evicted chunks are kept for seeking.
+        view.chunks.pop(chunk, None)
+        view.chunks[chunk] = chunk_data
+        while len(view.chunks) > self.max_chunks:
+            view.chunks.popitem(last=False)
+
+        if chunk_data:
+            key = self._row_key(view)
+            view.first_keys[chunk] = key(chunk_data[0])
+            view.last_keys[chunk] = key(chunk_data[-1])
 
+        offset = chunk * self.chunk_size
         id_index = self.columns.index(self.id_column)
         for i, row in enumerate(chunk_data):
-            self._row_to_idx[row[id_index]] = i + offset
-
-    def _compute_row_count(self):
+            view.index_row(row[id_index], i + offset)
+
+    def _start_worker(self):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run_worker)
+            self._worker.daemon = True
+            self._worker.start()
+
+    def _run_worker(self):
+        # Fetch the requested chunks until there have been no requests for a
+        # while. The worker is then stopped, so that it does not keep the
+        # cache alive.
+        me = threading.current_thread()
+        while True:
+            with self._lock:
+                if not self._queue and self._worker is me:
+                    self._lock.wait(WORKER_IDLE_TIMEOUT)
+                if self._worker is not me:
+                    return
+                if not self._queue:
+                    self._worker = None
+                    return
+                view, chunk = request = self._queue.popleft()
+
+            try:
+                self.fetch_chunk(chunk, view=view)
+            except Exception:
+                logger.exception('Failed to fetch rows from %s', self.table)
+
+            with self._lock:
+                self._pending.discard(request)
+                loaded = view is self._view and chunk in view.chunks
+                self._lock.notify_all()
+
+            if loaded and self.loaded_callback is not None:
+                self.loaded_callback(chunk)
+
+    def _chunk_query(self, view, chunk):
+        # Create the query for a chunk. Returns the query and whether the
+        # rows are in reverse order.
+        #
+        # The query seeks from the nearest chunk before or after, whose sort
+        # key is known, or from the start or end of the table, skipping the
+        # rows in between.
+        start = chunk * self.chunk_size
+        end = min(start + self.chunk_size, view.total_rows)
+
+        before = [ k for k in view.last_keys if k < chunk ]
+        before = max(before) if before else None
+        forward_skip = start
+        if before is not None:
+            forward_skip = start - (before + 1) * self.chunk_size
+
+        after = [ k for k in view.first_keys if k > chunk ]
+        after = min(after) if after else None
+        backward_skip = view.total_rows - end
+        if after is not None:
+            backward_skip = after * self.chunk_size - end
+
+        reverse = backward_skip < forward_skip
+        if reverse:
+            anchor = None if after is None else view.first_keys[after]
+            skip = backward_skip
+        else:
+            anchor = None if before is None else view.last_keys[before]
+            skip = forward_skip
+
+        terms = self._order_terms(view)
+        columns = [ sqlalchemy.column(c) for c in self._query_columns(view) ]
+        query = sqlalchemy.select(columns)\
+            .select_from(sqlalchemy.table(self.table))
+
+        if view.where is not None:
+            query = query.where(sqlalchemy.text(view.where))
+
+        if anchor is not None:
+            query = query.where(_seek_clause(terms, anchor, reverse))
+
+        query = query.order_by(*[
+            sqlalchemy.desc(expr) if descending != reverse
+            else sqlalchemy.asc(expr)
+            for expr, descending in terms ])
+
+        if skip > 0:
+            query = query.offset(skip)
+        query = query.limit(end - start)
+        return query, reverse
+
+    def _position_query(self, view, row):
+        # Create a query for the number of rows up to and including the row
+        # with the given ID, in the current order. It is zero if the row does
+        # not exist or is filtered out.
+        #
+        # The sort key of the row is selected by a subquery, so that the
+        # lookup takes a single query. As in `_seek_clause`, the comparison
+        # of sort keys is expanded, and NULLs compare equal.
+        terms = self._order_terms(view)
+        table = sqlalchemy.table(self.table)
+        id_term = sqlalchemy.column(self.id_column)
+        where = None
+        if view.where is not None:
+            where = sqlalchemy.text(view.where)
+        target = sqlalchemy.select([
+            expr.label('target_%i' % i) for i, (expr, _) in enumerate(terms)
+        ]).select_from(table).where(id_term == row)
+        if where is not None:
+            target = target.where(where)
+        target = target.alias('target')
+        values = list(target.c)
+
+        clauses = [ id_term == row ]
+        for i, (expr, descending) in enumerate(terms):
+            before = expr > values[i] if descending else expr < values[i]
+            equal = [ sqlalchemy.or_(e == v, e == None)
+                      for (e, _), v in zip(terms[:i], values[:i]) ]
+            clauses.append(sqlalchemy.and_(*(equal + [ before ])))
+
+        query = sqlalchemy.select([ sqlalchemy.func.count() ])\
+            .select_from(table).select_from(target)\
+            .where(sqlalchemy.or_(*clauses))
+        if where is not None:
+            query = query.where(where)
+        return query
+
+    def _order_terms(self, view):
+        # The expressions that the rows are ordered by, as a list of tuples
+        # (expression, descending). NULLs are sorted last, explicitly, since
+        # the default differs between databases.
+        id_term = sqlalchemy.column(self.id_column)
+        if view.sorted is None:
+            return [ (id_term, False) ]
+        name, ascending = view.sorted
+        if name == self.id_column:
+            return [ (id_term, not ascending) ]
+        column = sqlalchemy.column(name)
+        is_null = sqlalchemy.case([ (column == None, 1) ], else_=0)
+        return [ (is_null, False), (column, not ascending),
+                 (id_term, not ascending) ]
+
+    def _row_key(self, view):
+        # A function returning the values of the order terms for a row.
+        columns = self._query_columns(view)
+        id_index = columns.index(self.id_column)
+        if view.sorted is None or view.sorted[0] == self.id_column:
+            return lambda row: (row[id_index],)
+        index = columns.index(view.sorted[0])
+        return lambda row: (int(row[index] is None), row[index], row[id_index])
+
+    def _query_columns(self, view):
+        # The columns to select, including the sort column, which is needed
+        # for the sort keys.
+        columns = list(self.columns)
+        if view.sorted is not None and view.sorted[0] not in columns:
+            columns.append(view.sorted[0])
+        return columns
+
+    def _compute_row_count(self, where):
         table = sqlalchemy.table(self.table)
         select = sqlalchemy.select([sqlalchemy.func.count()])
         query = select.select_from(table)
 
-        if self.where is not None and len(self.where) > 0:
-            query = query.where(sqlalchemy.text(self.where))
+        if where is not None:
+            query = query.where(sqlalchemy.text(where))
 
         return self.engine.execute(query).fetchone()[0]
 
 
+class _View(object):
+    """ The cached rows of a table for a sort order and filter.
+    """
+
+    def __init__(self, sorted, where, total_rows):
+        self.sorted = sorted
+        self.where = where
+        self.total_rows = total_rows
+
+        # The most recently used chunks, the sort keys of the first and last
+        # rows of every chunk fetched, and the positions of rows by ID.
+        self.chunks = OrderedDict()
+        self.first_keys = {}
+        self.last_keys = {}
+        self.row_to_idx = OrderedDict()
+
+    def index_row(self, row, position):
+        """ Add a row to the index of row positions, evicting the least
+        recently used rows.
+        """
+        self.row_to_idx.pop(row, None)
+        self.row_to_idx[row] = position
+        while len(self.row_to_idx) > MAX_INDEXED_ROWS:
+            self.row_to_idx.popitem(last=False)
+
+
 class SQLTableModel(BaseTableModel):
     """ A table model for SQL tables that lazily loads its data.
     """
@@ -199,13 +602,17 @@ class SQLTableModel(BaseTableModel):
         self.id_column = id_column
         self.original_columns = self._get_columns(engine, table, columns)
         self.cache = SQLLazyCache(engine, table, self.original_columns,
-                                  self.id_column)
+                                  self.id_column,
+                                  loaded_callback=self._on_chunk_loaded)
 
     # BaseTableModel interface
 
     def get_value(self, i, j):
         return self.cache[i, j]
 
+    def get_column(self, j):
+        return self.cache.get_column(self.cache.columns[j])
+
     def reset_columns(self):
         self.set_columns(self.original_columns)
 
@@ -221,8 +628,7 @@ class SQLTableModel(BaseTableModel):
         return self.cache.columns[:]
 
     def filter(self, text):
-        self.cache.filter(text)
-        self.emit_all_data_changed()
+        self.cache.filter(text).add_done_callback(self._on_rows_changed)
 
     def map_to_row(self, i):
         return self.cache.map_to_row(i)
@@ -230,8 +636,26 @@ class SQLTableModel(BaseTableModel):
     def map_from_row(self, row):
         return self.cache.map_from_row(row)
 
+    # SQLTableModel interface
+
+    def close(self):
+        """ Stop fetching rows in the background, when the model is no
+        longer used.
+        """
+        self.cache.close()
+
     # QAbstractTableModel interface
 
+    def data(self, index, role=Qt.DisplayRole):
+        """ Reimplemented to show empty cells until their rows are fetched,
+        rather than waiting for the database.
+        """
+        if (index.isValid() and role in (Qt.DisplayRole, Qt.DecorationRole)
+                and 0 <= index.row() < self.rowCount()
+                and not self.cache.request_row(index.row())):
+            return None
+        return super(SQLTableModel, self).data(index, role)
+
     def headerData(self, section, orientation, role):
         if role == Qt.DisplayRole and orientation == Qt.Horizontal:
             return unicode(self.cache.columns[section])
@@ -249,8 +673,8 @@ class SQLTableModel(BaseTableModel):
         return 0
 
     def sort(self, column, order=Qt.AscendingOrder):
-        self.cache.sort(column, order == Qt.AscendingOrder)
-        self.emit_all_data_changed()
+        future = self.cache.sort(column, order == Qt.AscendingOrder)
+        future.add_done_callback(self._on_rows_changed)
 
     # SQLTableModel interface
 
@@ -267,3 +691,57 @@ class SQLTableModel(BaseTableModel):
         self.cache.columns = columns
         self.cache.reset()
         self.emit_all_data_changed()
+
+    def _on_rows_changed(self, future):
+        # Called when the rows for a new sort order or filter are available,
+        # possibly on the count thread of the cache.
+        if not future.cancelled() and future.exception() is None:
+            deferred_call(self.emit_all_data_changed)
+
+    def _on_chunk_loaded(self, chunk):
+        # Called on the worker thread of the cache.
+        deferred_call(self._chunk_loaded, chunk)
+
+    def _chunk_loaded(self, chunk):
+        first = chunk * self.cache.chunk_size
+        last = min(first + self.cache.chunk_size, self.rowCount()) - 1
+        if first <= last:
+            self.dataChanged.emit(self.index(first, 0),
+                                  self.index(last, self.columnCount() - 1))
+
+
+# Private functions
+
+def _seek_clause(terms, key, reverse=False):
+    # A clause selecting the rows that come after the given sort key (or
+    # before, if reversed), where the terms are as for `_order_terms`.
+    #
+    # This is the row value comparison (a, b, c) > (x, y, z), expanded
+    # because not all databases support it. A NULL value is the last in its
+    # group, so no row comes strictly after it.
+    clauses = []
+    for i, (expr, descending) in enumerate(terms):
+        value = key[i]
+        if value is None:
+            continue
+        if descending != reverse:
+            after = expr < value
+        else:
+            after = expr > value
+        equal = [ e == v for (e, _), v in zip(terms[:i], key[:i]) ]
+        clauses.append(sqlalchemy.and_(*(equal + [ after ])))
+    return sqlalchemy.or_(*clauses)
+
+
+# Globals and constants
+
+# The maximum numbers of sort orders and filters whose rows are cached, of
+# filters whose row counts are cached, and of row positions kept in the index
+# of each sort order and filter.
+MAX_CACHED_VIEWS = 8
+MAX_CACHED_COUNTS = 32
+MAX_INDEXED_ROWS = 100000
+
+# How long, in seconds, the background worker of a cache waits for requests
+# before stopping.
+WORKER_IDLE_TIMEOUT = 30
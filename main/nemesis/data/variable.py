@@ -57,13 +57,18 @@ class Variable(HasStrictTraits):
     @classmethod
     def from_data_frame(cls, df, statistics=False, **traits):
         """ Extract a list of Variables from a pandas DataFrame.
+
+        If `statistics` is true, the statistics of all the columns are
+        computed together (see `nemesis.data.profile`).
         """
+        if statistics:
+            from nemesis.data.profile import DataProfile
+            profile = DataProfile(df.columns)
+            profile.update(df)
+            return profile.variables(**traits)
         variables = []
         for col, dtype in zip(df.columns, df.dtypes):
-            var = cls.from_dtype(col, dtype, **traits)
-            if statistics:
-                var.statistics = dict(df[col].describe())
-            variables.append(var)
+            variables.append(cls.from_dtype(col, dtype, **traits))
         return variables
 
     @classmethod
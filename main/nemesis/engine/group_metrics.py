@@ -0,0 +1,201 @@
+""" NumPy implementations of the group metric functions.
+
+These are counterparts of the Rcpp functions in the NemesisOutliers R package
+(``src/*.cpp``), which compute one value per group from the entity-level
+values and the group of each entity. Here, the groups are given by integer
+codes 0, 1, ..., k-1, as returned by `stat_util.factorize`, and the result is
+an array of length k.
+
+Rather than building a map of counts for every group, the functions count
+the distinct (group, value) pairs once, using a sort, and then aggregate
+the counts by group with `np.bincount`.
+"""
+from __future__ import absolute_import, division
+
+import math
+
+import numpy as np
+
+from nemesis.engine import stat_util
+
+
+def entropy_disc(values, group_codes, type='frequent'):
+    """ The information entropy of the values in each group.
+
+    If `type` is 'normal', the entropy is normalized by the maximum possible
+    entropy, the logarithm of the group size.
+    """
+    if type not in ('frequent', 'normal'):
+        raise ValueError('Unknown entropy_disc type: %s' % type)
+    counts = _pair_counts(values, group_codes)
+    sizes = counts.group_sizes()
+    p = counts.counts / sizes[counts.groups]
+    terms = -p * np.log(p)
+    if type == 'normal':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            terms /= np.log(sizes[counts.groups])
+    return counts.sum_by_group(terms)
+
+
+def uniq_disc(values, group_codes, type='distinct'):
+    """ A ratio of the unique values in each group.
+
+    If `type` is 'distinct', this is the number of distinct values (less one)
+    relative to the group size (less one). If `type` is 'frequent', it is the
+    count of the most frequent value relative to the group size.
+    """
+    counts = _pair_counts(values, group_codes)
+    sizes = counts.group_sizes().astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if type == 'distinct':
+            num_distinct = np.bincount(counts.groups,
+                                       minlength=counts.num_groups)
+            return (num_distinct - 1) / (sizes - 1)
+        elif type == 'frequent':
+            max_counts = np.zeros(counts.num_groups)
+            np.maximum.at(max_counts, counts.groups, counts.counts)
+            return max_counts / sizes
+    raise ValueError('Unknown unique_disc type: %s' % type)
+
+
+def uniq_cont(values, group_codes):
+    """ The ratio of the coefficient of variation of each group to that of
+    the population. Missing values are ignored.
+    """
+    x = np.asarray(values, dtype=float)
+    codes = np.asarray(group_codes)
+    num_groups = _num_groups(codes)
+
+    valid = ~np.isnan(x)
+    x, codes = x[valid], codes[valid]
+    counts = np.bincount(codes, minlength=num_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.bincount(codes, x, minlength=num_groups) / counts
+        dev = x - means[codes]
+        sds = np.sqrt(np.bincount(codes, dev * dev, minlength=num_groups) /
+                      (counts - 1))
+        return (sds / means) / (stat_util.sd(x) / stat_util.mean(x))
+
+
+def graph_density(values, group_codes):
+    """ The density of the links between equal values in each group.
+
+    Any two entities in a group with the same value are linked. The density is
+    the number of links relative to the number of possible links.
+    """
+    counts = _pair_counts(values, group_codes)
+    sizes = counts.group_sizes().astype(float)
+    c = counts.counts.astype(float)
+    links = counts.sum_by_group(c * (c - 1) / 2)
+    links_possible = sizes * (sizes - 1) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(links_possible == 0, 0.0, links / links_possible)
+
+
+def chisq_test(values, group_codes):
+    """ The Chi-squared test of each group's distribution of values against
+    that of the population.
+
+    Returns (1 - p-value) * 100 for each group.
+    """
+    counts = _pair_counts(values, group_codes)
+    sizes = counts.group_sizes().astype(float)
+    pop_counts = np.bincount(counts.values, counts.counts).astype(float)
+    n = float(pop_counts.sum())
+
+    # The Pearson statistic is sum((o - e)^2 / e) over all the values in the
+    # population, where o and e are the observed and expected counts. Since
+    # sum(o) = sum(e), this is sum(o^2 / e) - sum(o), which only requires
+    # the values observed in the group.
+    o = counts.counts.astype(float)
+    e = sizes[counts.groups] * pop_counts[counts.values] / n
+    stats = counts.sum_by_group(o * o / e) - sizes
+
+    df = len(pop_counts) - 1
+    return np.array([ 100 * (1 - chi2_sf(stat, df)) for stat in stats ])
+
+
+def chi2_sf(x, df):
+    """ The survival function (upper tail probability) of the Chi-squared
+    distribution, like R's ``pchisq(x, df, lower.tail=FALSE)``.
+    """
+    if np.isnan(x):
+        return np.nan
+    elif df == 0 or x <= 0:
+        return 0.0 if df == 0 and x >= 0 else 1.0
+    return _gamma_q(df / 2.0, x / 2.0)
+
+
+# Private classes and functions
+
+class _PairCounts(object):
+    """ The counts of the distinct (group, value) pairs.
+    """
+
+    def __init__(self, groups, values, counts, num_groups):
+        self.groups = groups
+        self.values = values
+        self.counts = counts
+        self.num_groups = num_groups
+
+    def group_sizes(self):
+        return np.bincount(self.groups, self.counts,
+                           minlength=self.num_groups).astype(np.int64)
+
+    def sum_by_group(self, x):
+        return np.bincount(self.groups, x, minlength=self.num_groups)
+
+
+def _pair_counts(values, group_codes):
+    codes = np.asarray(group_codes, dtype=np.int64)
+    value_codes, num_values = stat_util.factorize(np.asarray(values))
+    pairs, counts = np.unique(codes * max(num_values, 1) + value_codes,
+                              return_counts=True)
+    groups, values = np.divmod(pairs, max(num_values, 1))
+    return _PairCounts(groups, values, counts, _num_groups(codes))
+
+def _num_groups(codes):
+    return codes.max() + 1 if len(codes) else 0
+
+def _gamma_q(a, x):
+    """ The regularized upper incomplete gamma function Q(a, x).
+
+    Uses the series expansion of P(a, x) for x < a + 1 and the continued
+    fraction for Q(a, x) otherwise (Numerical Recipes, section 6.2).
+    """
+    log_prefactor = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        term = total = 1.0 / a
+        ap = a
+        for _ in range(_GAMMA_MAX_ITER):
+            ap += 1
+            term *= x / ap
+            total += term
+            if abs(term) < abs(total) * _GAMMA_EPS:
+                break
+        return 1.0 - total * math.exp(log_prefactor)
+    else:
+        tiny = 1e-300
+        b = x + 1 - a
+        c = 1.0 / tiny
+        d = 1.0 / b
+        h = d
+        for i in range(1, _GAMMA_MAX_ITER):
+            an = -i * (i - a)
+            b += 2
+            d = an * d + b
+            d = tiny if abs(d) < tiny else d
+            c = b + an / c
+            c = tiny if abs(c) < tiny else c
+            d = 1.0 / d
+            delta = d * c
+            h *= delta
+            if abs(delta - 1) < _GAMMA_EPS:
+                break
+        return math.exp(log_prefactor) * h
+
+
+# Globals and constants
+
+_GAMMA_EPS = 1e-15
+_GAMMA_MAX_ITER = 10000
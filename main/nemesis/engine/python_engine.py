@@ -0,0 +1,531 @@
+""" An in-process model execution engine based on NumPy and pandas.
+
+The engine mirrors the semantics of ``run_model`` in the NemesisOutliers R
+package (see ``engine.R``) and writes the same output tables, so that the run
+results can be read by `RunResults` regardless of the engine used.
+"""
+from __future__ import absolute_import
+
+import logging
+from collections import OrderedDict
+import platform
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from traits.api import Bool, Callable, HasTraits, Instance
+
+from nemesis.data.file_data_source import FileDataSource
+from nemesis.data.sql_data_source import SQLDataSource
+from nemesis.model import GroupMetric, Model
+from nemesis.engine import stat_util
+from nemesis.engine.timing import StageTimer, null_stage
+from nemesis.fingerprint import FINGERPRINT_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+
+class EngineError(Exception):
+    """ Raised when a model cannot be run by the Python engine.
+    """
+    pass
+
+
+class EngineCancelled(EngineError):
+    """ Raised when a model run is cancelled.
+    """
+    pass
+
+
+class PythonEngine(HasTraits):
+    """ Runs a model on data in the current process.
+    """
+
+    # The model to run.
+    model = Instance(Model)
+
+    # A callable of form `log(msg)` receiving progress messages.
+    log = Callable()
+
+    # Private storage.
+    _cancelled = Bool(False)
+    _timer = Instance(StageTimer)
+
+    # PythonEngine interface
+
+    def run(self, input_source, output_source=None, input_stats=True,
+            store_input=False, create_indices=True, input_fingerprint=None,
+            fingerprints=None):
+        """ Run the model on the input data.
+
+        If an output data source is given, the results are saved to it.
+
+        If a fingerprint of the input data is given (see
+        `DataSource.fingerprint`), the input copy and input statistics in the
+        output data source are reused when they were created from data with
+        the same fingerprint. Otherwise, they are reused when they were
+        created from the same data source.
+
+        If the fingerprints of the entity-level values and scores are given
+        (see `nemesis.fingerprint.model_fingerprints`), they are saved with the
+        results, and the values and scores whose fingerprints are unchanged
+        since the previous run are reused from the output data source.
+
+        Returns a dict of data frames, keyed by table name.
+        """
+        self._cancelled = False
+        self._check_model()
+        self._timer = StageTimer()
+        try:
+            return self._run_impl(input_source, output_source, input_stats,
+                                  store_input, create_indices,
+                                  input_fingerprint, fingerprints)
+        finally:
+            self._timer = None
+
+    def cancel(self):
+        """ Cancel the current run.
+
+        The run is aborted with an EngineCancelled exception at the next
+        opportunity.
+        """
+        self._cancelled = True
+
+    def summary_stats(self, data):
+        """ Compute summary statistics for the non-ID columns of a table.
+        """
+        ids = [ self.model.entity_name, self.model.group_name ]
+        cols = [ c for c in data.columns if c not in ids ]
+        return stat_util.summary_stats(data[cols])
+
+    def score_entities(self, data, reused=None):
+        """ Compute the entity-level control values, metric values, and metric
+        scores.
+
+        Previously computed values and scores can be given as a dict with keys
+        'value' and 'score', each a dict of arrays keyed by object name. They
+        are used instead of computing the values and scores again.
+        """
+        model = self.model
+        if reused is None:
+            reused = dict(value={}, score={})
+        id_names = [ model.entity_name, model.group_name ]
+        id_df = data[id_names].reset_index(drop=True)
+        n = len(data)
+
+        objs = [ ('control', obj) for obj in model.controls ] + \
+            [ ('metric', obj) for obj in self._standard_metrics() ] + \
+            [ ('group_metric', obj) for obj in self._group_metrics() ]
+        values = id_df.copy()
+        for obj_type, obj in objs:
+            self._check_cancelled()
+            if obj.name in reused['value']:
+                self._log('Reusing %s' % obj.name)
+                values[obj.name] = reused['value'][obj.name]
+                continue
+            self._log('Computing %s' % obj.name)
+            with self._stage('score_entities', obj_type, obj.name):
+                values[obj.name] = _as_column(obj.compute(data), n)
+
+        # Score the metrics in batches sharing the same control variables, so
+        # that each combination of controls is factorized only once. Reused
+        # scores are left out of the batches.
+        cap = model.max_entity_score if model.cap_entity_score else None
+        batches = OrderedDict()
+        scores = id_df.copy()
+        for metric in self._standard_metrics():
+            if metric.name in reused['score']:
+                scores[metric.name] = reused['score'][metric.name]
+                continue
+            key = tuple(c.name for c in metric.control_for)
+            batches.setdefault(key, []).append(metric.name)
+        for controls, names in batches.items():
+            self._check_cancelled()
+            self._log('Scoring %s' % ', '.join(names))
+            with self._stage('score_entities', 'metric_score',
+                             ', '.join(names)):
+                if controls:
+                    codes, num_groups = stat_util.factorize(
+                        *[ values[name].values for name in controls ])
+                else:
+                    codes, num_groups = np.zeros(n, dtype=np.int64), 1
+                x = np.column_stack([ values[name].values.astype(float)
+                                      for name in names ])
+                z = stat_util.grouped_z_scores(x, codes, num_groups, cap)
+                for i, name in enumerate(names):
+                    scores[name] = z[:, i]
+        scores = scores[id_names + [ m.name for m in self._standard_metrics() ]]
+
+        return dict(entity_metric_values = values,
+                    entity_metric_scores = scores)
+
+    def score_groups(self, entity_results):
+        """ Compute the group-level metric values, metric scores, and
+        composite scores.
+        """
+        group_name = self.model.group_name
+        entity_values = entity_results['entity_metric_values']
+        entity_scores = entity_results['entity_metric_scores']
+        codes, labels = self._group_codes(entity_values)
+        k = len(labels)
+
+        values = pd.DataFrame({ group_name: labels })
+        scores = pd.DataFrame({ group_name: labels })
+        for metric in self._standard_metrics():
+            self._check_cancelled()
+            with self._stage('score_groups', 'metric', metric.name):
+                values[metric.name] = stat_util.group_mean(
+                    entity_values[metric.name].values, codes, k)
+            with self._stage('score_groups', 'metric_score', metric.name):
+                scores[metric.name] = stat_util.z_score(stat_util.group_mean(
+                    entity_scores[metric.name].values, codes, k))
+
+        for metric in self._group_metrics():
+            self._check_cancelled()
+            self._log('Computing group values for %s' % metric.name)
+            x = entity_values[metric.name].values
+            with self._stage('score_groups', 'group_metric', metric.name):
+                try:
+                    group_values = metric.compute_group(x, codes)
+                except NotImplementedError:
+                    raise EngineError('Group metric %s requires the R engine'
+                                      % metric.name)
+                values[metric.name] = _as_column(group_values, k)
+                scores[metric.name] = stat_util.z_score(
+                    values[metric.name].values)
+
+        composites = pd.DataFrame({ group_name: labels })
+        metric_scores = scores.drop(group_name, axis=1)
+        for composite in self.model.composite_scores:
+            self._check_cancelled()
+            self._log('Computing %s' % composite.name)
+            with self._stage('score_groups', 'composite', composite.name):
+                composites[composite.name] = _as_column(
+                    composite.compute(metric_scores), k)
+
+        return dict(group_metric_values = values,
+                    group_metric_scores = scores,
+                    group_composite_scores = composites)
+
+    def summarize_groups(self, entity_results):
+        """ Compute the group attributes, namely the group sizes.
+        """
+        entity_values = entity_results['entity_metric_values']
+        codes, labels = self._group_codes(entity_values)
+        sizes = np.bincount(codes, minlength=len(labels))
+        return pd.DataFrame({ self.model.group_name: labels, 'Size': sizes },
+                            columns = [ self.model.group_name, 'Size' ])
+
+    def summarize_run(self, input_source, input_fingerprint=None):
+        """ Create the run summary table of key-value pairs.
+        """
+        input_str, input_type = describe_input(input_source)
+        summary_data = dict(
+            date = time.ctime(),
+            platform = platform.platform(),
+            engine = 'python',
+            python_version = sys.version.split()[0],
+            input = input_str,
+            input_type = input_type,
+            input_fingerprint = input_fingerprint or '',
+            entity_name = self.model.entity_name,
+            group_name = self.model.group_name,
+        )
+        keys = sorted(summary_data)
+        return pd.DataFrame({ 'rn': keys,
+                              'value': [ summary_data[k] for k in keys ] },
+                            columns = [ 'rn', 'value' ])
+
+    # Private interface
+
+    def _run_impl(self, input_source, output_source, input_stats,
+                  store_input, create_indices, input_fingerprint,
+                  fingerprints):
+        model = self.model
+
+        self._log('Loading input data')
+        with self._stage('read_input'):
+            data = input_source.load(all_rows=True)
+        for name in (model.entity_name, model.group_name):
+            if name not in data.columns:
+                raise EngineError('Invalid entity or group column name')
+
+        run_summary = self.summarize_run(input_source, input_fingerprint)
+
+        # Determine whether the input needs to be copied and/or summarized.
+        engine = None
+        if output_source is not None:
+            engine = output_source.get_engine()
+            if input_stats or store_input:
+                reuse = self._reusable_tables(engine, run_summary)
+                store_input = store_input and 'input' not in reuse
+                input_stats = input_stats and 'input_stats' not in reuse
+
+        # Filter small groups.
+        input_data = data
+        if model.limit_group_size:
+            with self._stage('filter_groups'):
+                codes, num_groups = stat_util.factorize(
+                    data[model.group_name])
+                sizes = np.bincount(codes, minlength=num_groups)
+                keep = sizes[codes] >= model.min_group_size
+                data = data[keep].reset_index(drop=True)
+
+        # Find the entity-level values and scores left unchanged since the
+        # previous run.
+        reused = None
+        if engine is not None and fingerprints is not None:
+            reused = self._reusable_columns(engine, fingerprints, len(data))
+
+        # Perform the computations!
+        if input_stats:
+            self._log('Computing input statistics')
+            with self._stage('input_stats'):
+                input_stats_df = self.summary_stats(data)
+        with self._stage('score_entities'):
+            entity_results = self.score_entities(data, reused)
+        del reused
+        del data
+        with self._stage('entity_stats'):
+            entity_stats = self.summary_stats(
+                entity_results['entity_metric_values'])
+        with self._stage('score_groups'):
+            group_results = self.score_groups(entity_results)
+        with self._stage('summarize_groups'):
+            group_attributes = self.summarize_groups(entity_results)
+
+        # Build the results.
+        values = group_results['group_metric_values']
+        scores = group_results['group_metric_scores']
+        composites = group_results['group_composite_scores']
+        group_combined = pd.concat([
+            values,
+            scores.drop(model.group_name, axis=1).add_suffix('_Score'),
+            composites.drop(model.group_name, axis=1),
+            group_attributes.drop(model.group_name, axis=1),
+        ], axis=1)
+        group_metadata = pd.concat([
+            self._metadata(values, 'metric_value'),
+            self._metadata(scores, 'metric_score', suffix='_Score'),
+            self._metadata(composites, 'composite_score'),
+            self._metadata(group_attributes, 'attribute'),
+        ], ignore_index=True)
+
+        entity_scores = entity_results['entity_metric_scores']
+        id_names = [ model.entity_name, model.group_name ]
+        entity_scores.columns = [
+            name if name in id_names else name + '_Score'
+            for name in entity_scores.columns ]
+
+        results = dict(run_summary = run_summary,
+                       entity_metric_values =
+                           entity_results['entity_metric_values'],
+                       entity_metric_scores = entity_scores,
+                       entity_metric_stats = entity_stats,
+                       group_results = group_combined,
+                       group_metadata = group_metadata)
+        if input_stats:
+            results['input_stats'] = input_stats_df
+
+        # Save the results to the output DB.
+        if engine is not None:
+            self._log('Writing results')
+            with self._stage('write_output'):
+                # The old fingerprints are dropped first and the new ones
+                # written last, so that they never describe the output of
+                # another run.
+                write_sql_tables(engine,
+                                 { 'model_fingerprints': pd.DataFrame() })
+                write_sql_tables(engine, results)
+                if fingerprints is not None:
+                    write_sql_tables(engine, { 'model_fingerprints':
+                        pd.DataFrame(list(fingerprints),
+                                     columns=FINGERPRINT_COLUMNS) })
+            if store_input:
+                with self._stage('store_input'):
+                    write_sql_tables(engine, { 'input': input_data })
+            if create_indices:
+                with self._stage('create_indices'):
+                    create_index(engine, 'group_results', model.group_name)
+                    if store_input:
+                        create_index(engine, 'input', model.group_name)
+
+        # Save the timings last, so that they include writing the output.
+        results['run_timings'] = self._timer.to_frame()
+        if engine is not None:
+            write_sql_tables(engine,
+                             { 'run_timings': results['run_timings'] })
+
+        self._log('Model run complete')
+        return results
+
+    def _check_cancelled(self):
+        if self._cancelled:
+            raise EngineCancelled('Model run cancelled')
+
+    def _stage(self, stage, object_type='', object=''):
+        # Time a stage of the run, if the run is being timed.
+        if self._timer is None:
+            return null_stage()
+        return self._timer.stage(stage, object_type, object)
+
+    def _check_model(self):
+        model = self.model
+        if model is None:
+            raise EngineError('No model defined')
+        if not (model.entity_name and model.group_name):
+            raise EngineError('Must supply entity and group column names')
+        if model.user_code:
+            raise EngineError('User-defined code requires the R engine')
+
+    def _group_codes(self, df):
+        group = df[self.model.group_name].values
+        codes, labels = pd.factorize(group, sort=True)
+        if (codes < 0).any():
+            # Missing group IDs form a group of their own.
+            codes = codes.copy()
+            codes[codes < 0] = len(labels)
+            labels = np.append(np.asarray(labels, dtype=object), None)
+        return codes, np.asarray(labels)
+
+    def _standard_metrics(self):
+        return [ m for m in self.model.metrics
+                 if not isinstance(m, GroupMetric) ]
+
+    def _group_metrics(self):
+        return [ m for m in self.model.metrics if isinstance(m, GroupMetric) ]
+
+    def _log(self, msg):
+        logger.info(msg)
+        if self.log is not None:
+            self.log(msg)
+
+    def _metadata(self, df, type, suffix=''):
+        cols = [ c for c in df.columns if c != self.model.group_name ]
+        return pd.DataFrame({
+            'name': [ c + suffix for c in cols ],
+            'type': type,
+            'dtype': [ r_class_name(df[c]) for c in cols ],
+        }, columns = [ 'name', 'type', 'dtype' ])
+
+    def _reusable_tables(self, engine, run_summary):
+        """ Returns the names of the input tables in the output DB that were
+        created from the same input data.
+        """
+        summary = run_summary.set_index('rn')['value']
+        if summary['input_type'] == 'memory' and \
+                not summary['input_fingerprint']:
+            return set()
+        insp = sqlalchemy.inspect(engine)
+        tables = set(insp.get_table_names())
+        if 'run_summary' not in tables:
+            return set()
+        old_summary = pd.read_sql_table('run_summary', engine)
+        old_summary = old_summary.set_index('rn')['value']
+        # Compare the contents of the inputs, if both were fingerprinted, and
+        # otherwise their sources.
+        if summary['input_fingerprint'] and \
+                old_summary.get('input_fingerprint'):
+            keys = ('input_fingerprint',)
+        else:
+            keys = ('input', 'input_type')
+        for key in keys:
+            if old_summary.get(key) != summary[key]:
+                return set()
+        return tables & set(['input', 'input_stats'])
+
+    def _reusable_columns(self, engine, fingerprints, n):
+        """ Returns the entity-level values and scores in the output DB whose
+        fingerprints match the given ones, in the form expected by
+        `score_entities`.
+        """
+        reused = dict(value={}, score={})
+        insp = sqlalchemy.inspect(engine)
+        tables = set(insp.get_table_names())
+        required = set([ 'model_fingerprints', 'entity_metric_values',
+                         'entity_metric_scores' ])
+        if not required <= tables:
+            return reused
+        old = pd.read_sql_table('model_fingerprints', engine)
+        old = set(zip(old['name'], old['kind'], old['fingerprint']))
+
+        # The rows are read back in the order they were written, which is
+        # the order of the input data.
+        for kind, table, suffix in [ ('value', 'entity_metric_values', ''),
+                                     ('score', 'entity_metric_scores',
+                                      '_Score') ]:
+            names = [ name for name, k, fp in fingerprints
+                      if k == kind and (name, k, fp) in old ]
+            if not names:
+                continue
+            df = pd.read_sql_table(table, engine,
+                                   columns=[ name + suffix for name in names ])
+            if len(df) != n:
+                continue
+            for name in names:
+                reused[kind][name] = df[name + suffix].values
+        return reused
+
+
+def describe_input(input_source):
+    """ Describe a data source for the run summary.
+
+    Returns a pair (input, input_type).
+    """
+    if isinstance(input_source, FileDataSource):
+        return input_source.path, 'file'
+    elif isinstance(input_source, SQLDataSource):
+        info = [ ('dialect', input_source.dialect),
+                 ('dbname', input_source.database),
+                 ('host', input_source.host),
+                 ('user', input_source.username) ]
+        if input_source.table == 'NA':
+            info.append(('query', input_source.query))
+        else:
+            info.append(('table', input_source.table))
+        return repr(info), 'sql'
+    return ':memory:', 'memory'
+
+
+def r_class_name(column):
+    """ The name of the R class corresponding to the type of a column.
+    """
+    kind = np.asarray(column).dtype.kind
+    return { 'b': 'logical', 'i': 'integer', 'u': 'integer',
+             'f': 'numeric' }.get(kind, 'character')
+
+
+def write_sql_tables(engine, tables):
+    """ Write a dict of data frames to a SQL database.
+
+    Warning: if any of the tables already exist, they will be dropped!
+    """
+    meta = sqlalchemy.MetaData()
+    for name, df in tables.items():
+        sqlalchemy.Table(name, meta).drop(engine, checkfirst=True)
+        if len(df.columns) > 0 and len(df) > 0:
+            df.to_sql(name, engine, index=False)
+
+
+def create_index(engine, table, column):
+    """ Create an index on a table column, named as in the R package.
+    """
+    statement = 'CREATE INDEX ix_{table}_{column} ON {table} ({column})'
+    with engine.begin() as conn:
+        conn.execute(sqlalchemy.text(
+            statement.format(table=table, column=column)))
+
+
+# Private functions
+
+def _as_column(value, n):
+    """ Broadcast a computed value to a column of length n.
+    """
+    value = np.asarray(value)
+    if value.ndim == 0:
+        value = np.repeat(value, n)
+    elif len(value) != n:
+        raise EngineError('Expected %i values, got %i' % (n, len(value)))
+    return value
@@ -0,0 +1,183 @@
+""" General-purpose statistical functions for the Python engine.
+
+These are NumPy counterparts of the functions in ``stat_util.R`` from the
+NemesisOutliers R package. Missing values (NaN) are ignored throughout.
+"""
+from __future__ import absolute_import
+
+import numpy as np
+import pandas as pd
+
+
+def mean(x):
+    """ Mean, ignoring missing values. Equivalent to R's ``Mean``.
+    """
+    x = _as_float(x)
+    x = x[~np.isnan(x)]
+    return x.mean() if len(x) else np.nan
+
+
+def sd(x):
+    """ Sample standard deviation, ignoring missing values. Equivalent to R's
+    ``Sd``.
+    """
+    x = _as_float(x)
+    x = x[~np.isnan(x)]
+    return x.std(ddof=1) if len(x) > 1 else np.nan
+
+
+def z_score(x, cap=None):
+    """ Z score, ignoring missing values and optionally capped at some
+    threshold value. Equivalent to R's ``z_score``.
+    """
+    x = _as_float(x)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (x - mean(x)) / sd(x)
+    if cap is not None:
+        z = np.clip(z, -cap, cap)
+    return z
+
+
+def grouped_z_score(x, codes, cap=None):
+    """ Z scores computed separately within each group.
+
+    The groups are given by integer codes, as returned by `factorize`.
+    """
+    x = _as_float(x)
+    num_groups = codes.max() + 1 if len(codes) else 0
+    return grouped_z_scores(x[:, np.newaxis], codes, num_groups, cap)[:, 0]
+
+
+def grouped_z_scores(values, codes, num_groups, cap=None):
+    """ Z scores for each column of a matrix, computed separately within each
+    group.
+
+    This is equivalent to calling `z_score` for each column and group, but
+    all the groups are handled at once using grouped sums (`np.bincount`). The
+    mean is computed first and the sum of squared deviations second, for the
+    sake of numerical stability.
+
+    Parameters
+    ----------
+    values : array of shape (n, m)
+        The columns to score.
+
+    codes : integer array of shape (n,)
+        The group of each row, coded as integers 0, 1, ..., num_groups-1.
+
+    num_groups : int
+        The number of groups.
+
+    cap : float, optional
+        The threshold at which to cap the scores (in absolute value).
+
+    Returns
+    -------
+    An array of shape (n, m).
+    """
+    values = np.asarray(values, dtype=float)
+    scores = np.empty_like(values)
+    all_counts = np.bincount(codes, minlength=num_groups)
+
+    for j in range(values.shape[1]):
+        x = values[:, j]
+        valid = ~np.isnan(x)
+        if valid.all():
+            valid_codes, valid_x, counts = codes, x, all_counts
+        else:
+            valid_codes, valid_x = codes[valid], x[valid]
+            counts = np.bincount(valid_codes, minlength=num_groups)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = np.bincount(valid_codes, valid_x, minlength=num_groups) \
+                / counts
+            dev = x - means[codes]
+            valid_dev = dev if valid_x is x else dev[valid]
+            ss = np.bincount(valid_codes, valid_dev * valid_dev,
+                             minlength=num_groups)
+            sds = np.sqrt(ss / (counts - 1))
+            sds[counts < 2] = np.nan
+            z = dev / sds[codes]
+
+        if cap is not None:
+            np.clip(z, -cap, cap, out=z)
+        scores[:, j] = z
+    return scores
+
+
+def group_mean(x, codes, num_groups):
+    """ Group means, ignoring missing values.
+    """
+    x = _as_float(x)
+    valid = ~np.isnan(x)
+    sums = np.bincount(codes[valid], x[valid], minlength=num_groups)
+    counts = np.bincount(codes[valid], minlength=num_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return sums / counts
+
+
+def factorize(*columns):
+    """ Encode the distinct combinations of values in one or more columns
+    as integer codes.
+
+    Unlike `pandas.factorize`, missing values form a group of their own, as
+    they do in a data.table group-by.
+
+    Returns a pair (codes, num_groups).
+    """
+    if not columns:
+        raise ValueError('Must supply at least one column')
+    codes, num_groups = None, 0
+    for column in columns:
+        col_codes, uniques = pd.factorize(column, sort=True)
+        col_codes = col_codes.astype(np.int64)
+        col_codes[col_codes < 0] = len(uniques)
+        if codes is None:
+            codes = col_codes
+            num_groups = codes.max() + 1 if len(codes) else 0
+        else:
+            # Re-factorize after each column, so that the codes stay below
+            # the number of rows and the combined codes cannot overflow.
+            combined = codes * (len(uniques) + 1) + col_codes
+            codes, uniques = pd.factorize(combined, sort=True)
+            num_groups = len(uniques)
+    return codes, num_groups
+
+
+def summary_stats(df):
+    """ Summary statistics for the numeric and logical columns of a data
+    frame, in the layout of R's ``summary_stats``.
+
+    Returns a data frame with the statistics in rows, labelled by the column
+    `rn`, and the summarized variables in columns.
+    """
+    stats = {}
+    for name in df.columns:
+        x = np.asarray(df[name])
+        if x.dtype.kind not in 'biuf':
+            continue
+        x = x.astype(float)
+        x = x[~np.isnan(x)]
+        if len(x):
+            quantiles = np.percentile(x, [0, 25, 50, 75, 100])
+        else:
+            quantiles = [np.nan] * 5
+        stats[name] = [mean(x), sd(x)] + list(quantiles)
+
+    result = pd.DataFrame(stats, index=SUMMARY_STAT_NAMES,
+                          columns=[ c for c in df.columns if c in stats ])
+    # R keys the table by `rn`, which sorts the rows.
+    result = result.sort_index()
+    result.index.name = 'rn'
+    return result.reset_index()
+
+
+# Private functions
+
+def _as_float(x):
+    return np.asarray(x, dtype=float)
+
+
+# Globals and constants
+
+SUMMARY_STAT_NAMES = ['mean', 'std', 'min', '25%', '50%', '75%', 'max']
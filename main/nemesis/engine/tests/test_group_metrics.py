@@ -0,0 +1,127 @@
+from __future__ import absolute_import
+
+import os.path
+import sqlite3
+import unittest
+
+import numpy as np
+import pandas as pd
+from numpy.testing import assert_allclose
+
+from nemesis.stdlib.metrics import DistributionMetric, EntropyMetric, \
+    GraphDensityMetric, UniqueContinuousMetric, UniqueDiscreteMetric
+from ..group_metrics import chi2_sf, chisq_test, entropy_disc, \
+    graph_density, uniq_cont, uniq_disc
+from ..stat_util import factorize
+
+TEST_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'tests')
+
+
+class TestGroupMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.values = np.array(['a', 'a', 'b', 'a', 'b', 'c', 'c'],
+                               dtype=object)
+        self.codes = np.array([0, 0, 0, 1, 1, 1, 2])
+
+    def test_entropy_disc(self):
+        p = np.array([2.0, 1.0]) / 3
+        target = [ -np.sum(p * np.log(p)), np.log(3), 0 ]
+        assert_allclose(entropy_disc(self.values, self.codes), target)
+        assert_allclose(entropy_disc(self.values, self.codes, 'normal'),
+                        [ target[0] / np.log(3), 1, np.nan ])
+
+    def test_uniq_disc(self):
+        assert_allclose(uniq_disc(self.values, self.codes, 'distinct'),
+                        [ 0.5, 1, np.nan ])
+        assert_allclose(uniq_disc(self.values, self.codes, 'frequent'),
+                        [ 2.0 / 3, 1.0 / 3, 1 ])
+
+    def test_uniq_cont(self):
+        values = np.array([1.0, 2.0, 3.0, 2.0, 4.0, np.nan])
+        codes = np.array([0, 0, 0, 1, 1, 1])
+        cv = lambda x: np.std(x, ddof=1) / np.mean(x)
+        pop_cv = cv([1, 2, 3, 2, 4])
+        assert_allclose(uniq_cont(values, codes),
+                        [ cv([1, 2, 3]) / pop_cv, cv([2, 4]) / pop_cv ])
+
+    def test_graph_density(self):
+        assert_allclose(graph_density(self.values, self.codes),
+                        [ 1.0 / 3, 0, 0 ])
+
+    def test_chisq_test(self):
+        values = np.array([0, 0, 1, 1, 0, 1, 1, 1])
+        codes = np.array([0, 0, 0, 0, 1, 1, 1, 1])
+        # Expected counts (population proportions 3/8, 5/8, group size 4).
+        e = np.array([1.5, 2.5])
+        stat = np.sum((np.array([2, 2]) - e) ** 2 / e)
+        target = 100 * (1 - chi2_sf(stat, 1))
+        assert_allclose(chisq_test(values, codes), [target, target])
+
+    def test_chi2_sf(self):
+        # Reference values from R's pchisq(x, df, lower.tail=FALSE).
+        self.assertAlmostEqual(chi2_sf(1.0, 1), 0.3173105078629141)
+        self.assertAlmostEqual(chi2_sf(10.0, 3), 0.01856613546304325)
+        self.assertAlmostEqual(chi2_sf(2.0, 10), 0.9963401531726562)
+        self.assertEqual(chi2_sf(0.0, 5), 1.0)
+        self.assertEqual(chi2_sf(3.0, 0), 0.0)
+
+
+class TestGroupMetricsParity(unittest.TestCase):
+    """ Compare with the R results stored in the test databases.
+    """
+
+    metrics = {
+        'Entropy': EntropyMetric(method='frequent'),
+        'GrphDns': GraphDensityMetric(),
+        'ChiSqStat': DistributionMetric(kind='chi_square'),
+        'NumUniq': UniqueContinuousMetric(),
+        'NumberGraphDensity': GraphDensityMetric(),
+        'ColorGraphDensity': GraphDensityMetric(),
+        'NumberUnique': UniqueContinuousMetric(),
+    }
+
+    def assert_parity(self, db_name):
+        conn = sqlite3.connect(os.path.join(TEST_DIR, db_name))
+        entity_values = pd.read_sql('SELECT * FROM entity_metric_values',
+                                    conn)
+        target = pd.read_sql('SELECT * FROM group_results', conn)
+        conn.close()
+
+        codes, _ = factorize(entity_values['Letter'].values)
+        names = [ name for name in entity_values.columns
+                  if name in self.metrics ]
+        self.assertTrue(names)
+        for name in names:
+            result = self.metrics[name].compute_group(
+                entity_values[name].values, codes)
+            assert_allclose(result, target[name].astype(float),
+                            rtol=1e-10, err_msg=name)
+
+    def test_letters_numbers_1(self):
+        self.assert_parity('test_letters_numbers_1.db')
+
+    def test_letters_numbers_2(self):
+        self.assert_parity('test_letters_numbers_2.db')
+
+    def test_letters_numbers_with_zeros(self):
+        self.assert_parity('test_letters_numbers_with_zeros.db')
+
+    def test_letters_numbers_with_missing(self):
+        self.assert_parity('test_letters_numbers_with_missing.db')
+
+    def test_letters_numbers_with_blanks(self):
+        # Only the continuous metric is compared: in the C++ code, missing
+        # values are std::map keys that compare equal to every other key,
+        # so their counts depend on the insertion order.
+        self.metrics = { 'NumberUnique': UniqueContinuousMetric() }
+        self.assert_parity('test_letters_numbers_with_blanks.db')
+
+    def test_unsupported(self):
+        metric = DistributionMetric(kind='ks')
+        self.assertRaises(NotImplementedError, metric.compute_group,
+                          np.zeros(2), np.zeros(2, dtype=int))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+from __future__ import absolute_import
+
+import os.path
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from numpy.testing import assert_allclose
+
+from nemesis.data.file_data_source import FileDataSource
+from nemesis.data.sql_data_source import SQLDataSource
+from nemesis.model import Model
+from nemesis.stdlib.composite_scores import CustomScore
+from nemesis.stdlib.controls import FactorControl
+from nemesis.stdlib.metrics import ValueMetric
+from ..python_engine import EngineError, PythonEngine
+
+TEST_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'tests')
+
+
+class TestPythonEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.model = Model(
+            entity_name = 'Id',
+            group_name = 'Letter',
+            metrics = [ ValueMetric(name='Value', expression='Number') ],
+        )
+        self.engine = PythonEngine(model=self.model)
+
+    def test_parity_with_r(self):
+        """ Are the results for a standard metric the same as in R?
+        """
+        path = os.path.join(TEST_DIR, 'test_letters_numbers_1.db')
+        conn = sqlite3.connect(path)
+        data = pd.read_sql('SELECT Id, Letter, Value AS Number '
+                           'FROM entity_metric_values', conn)
+        target = pd.read_sql('SELECT * FROM group_results', conn)
+        conn.close()
+
+        entity_results = self.engine.score_entities(data)
+        group_results = self.engine.score_groups(entity_results)
+        values = group_results['group_metric_values']
+        scores = group_results['group_metric_scores']
+        self.assertEqual(list(values['Letter']), list(target['Letter']))
+        assert_allclose(values['Value'], target['Value'])
+        assert_allclose(scores['Value'], target['Value_Score'])
+
+    def test_control_for(self):
+        """ Are entity scores computed separately within each control stratum?
+        """
+        control = FactorControl(name='Half', expression='Id %% 2')
+        self.model.controls = [ control ]
+        self.model.metrics[0].control_for = [ control ]
+        self.model.cap_entity_score = False
+        data = pd.DataFrame({ 'Id': range(6), 'Letter': list('AABBCC'),
+                              'Number': [1.0, 10, 2, 20, 3, 30] })
+        scores = self.engine.score_entities(data)['entity_metric_scores']
+        assert_allclose(scores['Value'], [-1, -1, 0, 0, 1, 1])
+
+    def test_run(self):
+        """ Does a complete run write the output tables?
+        """
+        self.model.composite_scores = [
+            CustomScore(name='Double', expression='2 * Value')
+        ]
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            output = SQLDataSource(dialect='sqlite', database=os.path.join(
+                tmp_dir, 'results.db'))
+            input = FileDataSource(path=os.path.join(
+                TEST_DIR, 'test_letters_numbers_2.csv'))
+            self.engine.run(input, output, store_input=True)
+
+            conn = sqlite3.connect(output.database)
+            tables = set(name for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table'"))
+            results = pd.read_sql('SELECT * FROM group_results', conn)
+            metadata = pd.read_sql('SELECT * FROM group_metadata', conn)
+            timings = pd.read_sql('SELECT * FROM run_timings', conn)
+            conn.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+        self.assertEqual(tables, set([
+            'run_summary', 'entity_metric_values', 'entity_metric_scores',
+            'entity_metric_stats', 'group_results', 'group_metadata',
+            'input_stats', 'input', 'run_timings']))
+        self.assertEqual(list(results.columns),
+                         ['Letter', 'Value', 'Value_Score', 'Double', 'Size'])
+        assert_allclose(results['Double'], 2 * results['Value_Score'])
+        self.assertEqual(list(metadata['type']),
+                         ['metric_value', 'metric_score', 'composite_score',
+                          'attribute'])
+        self.assertEqual(list(metadata['dtype']),
+                         ['numeric', 'numeric', 'numeric', 'integer'])
+
+        stages = timings[timings['object_type'] == '']['stage']
+        self.assertEqual(list(stages), [
+            'read_input', 'input_stats', 'score_entities', 'entity_stats',
+            'score_groups', 'summarize_groups', 'write_output', 'store_input',
+            'create_indices'])
+        objects = timings[timings['object_type'] != '']
+        self.assertEqual(
+            list(zip(objects['object_type'], objects['object'])),
+            [('metric', 'Value'), ('metric_score', 'Value'),
+             ('metric', 'Value'), ('metric_score', 'Value'),
+             ('composite', 'Double')])
+        self.assertTrue((timings['elapsed'] >= 0).all())
+
+    def test_incremental_run(self):
+        """ Are entity values and scores with unchanged fingerprints reused?
+        """
+        self.model.metrics.append(
+            ValueMetric(name='Double', expression='2 * Number'))
+        fingerprints = [ ('Value', 'value', 'a'), ('Double', 'value', 'b'),
+                         ('Value', 'score', 'c'), ('Double', 'score', 'd') ]
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            output = SQLDataSource(dialect='sqlite', database=os.path.join(
+                tmp_dir, 'results.db'))
+            input = FileDataSource(path=os.path.join(
+                TEST_DIR, 'test_letters_numbers_2.csv'))
+            self.engine.run(input, output, fingerprints=fingerprints)
+
+            # Tamper with the saved values, so that reused values can be
+            # recognized.
+            conn = sqlite3.connect(output.database)
+            saved = pd.read_sql('SELECT * FROM model_fingerprints', conn)
+            with conn:
+                conn.execute('UPDATE entity_metric_values '
+                             'SET Value = 0, Double = 0')
+                conn.execute('UPDATE entity_metric_scores '
+                             'SET Value_Score = 0')
+            conn.close()
+
+            fingerprints[1] = ('Double', 'value', 'b2')
+            results = self.engine.run(input, output,
+                                      fingerprints=fingerprints)
+            values = results['entity_metric_values']
+            scores = results['entity_metric_scores']
+            self.assertTrue((values['Value'] == 0).all())
+            self.assertTrue((scores['Value_Score'] == 0).all())
+            self.assertFalse((values['Double'] == 0).any())
+            self.assertFalse((scores['Double_Score'] == 0).all())
+
+            # Without fingerprints, nothing is reused.
+            results = self.engine.run(input, output)
+            self.assertFalse((results['entity_metric_values']['Value']
+                              == 0).any())
+            conn = sqlite3.connect(output.database)
+            tables = set(name for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table'"))
+            conn.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+        self.assertEqual(list(zip(saved['name'], saved['kind'],
+                                  saved['fingerprint'])),
+                         [ ('Value', 'value', 'a'), ('Double', 'value', 'b'),
+                           ('Value', 'score', 'c'), ('Double', 'score', 'd') ])
+        self.assertNotIn('model_fingerprints', tables)
+
+    def test_reuse_input(self):
+        """ Are the input table and statistics reused for the same data?
+        """
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            output = SQLDataSource(dialect='sqlite', database=os.path.join(
+                tmp_dir, 'results.db'))
+            input = FileDataSource(path=os.path.join(
+                TEST_DIR, 'test_letters_numbers_2.csv'))
+            other = FileDataSource(path=os.path.join(
+                TEST_DIR, 'test_letters_numbers_1.csv'))
+
+            def run(input, fingerprint):
+                self.engine.run(input, output, store_input=True,
+                                input_fingerprint=fingerprint)
+                conn = sqlite3.connect(output.database)
+                count = conn.execute('SELECT COUNT(*) FROM input').fetchone()
+                with conn:
+                    conn.execute('DELETE FROM input')
+                conn.close()
+                return count[0]
+
+            self.assertGreater(run(input, 'a'), 0)
+            # The same data from another source is not copied again...
+            self.assertEqual(run(other, 'a'), 0)
+            # ...but changed data from the same source is.
+            self.assertGreater(run(other, 'b'), 0)
+            # Without fingerprints, the sources are compared.
+            self.assertEqual(run(other, None), 0)
+            self.assertGreater(run(input, None), 0)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_user_code(self):
+        """ Is user-defined R code rejected?
+        """
+        self.model.user_code = 'foo <- function(x) x'
+        input = FileDataSource(path=os.path.join(
+            TEST_DIR, 'test_letters_numbers_2.csv'))
+        self.assertRaises(EngineError, self.engine.run, input)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+from __future__ import absolute_import
+
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+from .. import stat_util
+from ..stat_util import factorize, grouped_z_scores, z_score
+
+
+class TestStatUtil(unittest.TestCase):
+
+    def test_z_score(self):
+        x = np.array([1.0, 2.0, np.nan, 3.0])
+        assert_allclose(z_score(x), [-1, 0, np.nan, 1])
+        assert_allclose(z_score(x, cap=0.5), [-0.5, 0, np.nan, 0.5])
+
+    def test_factorize(self):
+        """ Do missing values form a group of their own?
+        """
+        codes, k = factorize(np.array(['b', 'a', None, 'b'], dtype=object))
+        assert_array_equal(codes, [1, 0, 2, 1])
+        self.assertEqual(k, 3)
+
+        codes, k = factorize(np.array([1, 1, 2, 2]),
+                             np.array([0.0, np.nan, 0.0, 0.0]))
+        assert_array_equal(codes, [0, 1, 2, 2])
+        self.assertEqual(k, 3)
+
+    def test_factorize_many_columns(self):
+        """ Are the codes of many high-cardinality columns exact and in
+        lexicographic order?
+        """
+        rs = np.random.RandomState(0)
+        n, m = 500, 8  # 501**8 combinations overflow a 64-bit integer
+        columns = [ rs.permutation(n) for j in range(m) ]
+        codes, k = factorize(*columns)
+        self.assertEqual(k, n)
+        order = np.lexsort(columns[::-1])
+        assert_array_equal(codes[order], np.arange(n))
+
+    def test_grouped_z_scores(self):
+        """ Are the scores the same as those computed group by group?
+        """
+        rs = np.random.RandomState(0)
+        n, m = 1000, 5
+        values = rs.normal(size=(n, m))
+        missing = rs.rand(n, m) < 0.1
+        missing[:, 0] = False  # A column without missing values
+        values[missing] = np.nan
+        codes = rs.randint(0, 7, size=n)
+        codes[:3] = 7  # A group of size 3
+        codes[3] = 8   # A group of size 1
+
+        target = np.empty_like(values)
+        for code in range(9):
+            idx = codes == code
+            for j in range(m):
+                target[idx, j] = z_score(values[idx, j], cap=1.5)
+
+        assert_allclose(grouped_z_scores(values, codes, 9, cap=1.5), target)
+
+    def test_summary_stats(self):
+        import pandas as pd
+        df = pd.DataFrame({ 'x': [1.0, 2.0, 3.0, np.nan], 'y': list('abcd') })
+        stats = stat_util.summary_stats(df).set_index('rn')
+        self.assertEqual(list(stats.columns), ['x'])
+        self.assertEqual(stats.loc['mean', 'x'], 2.0)
+        self.assertEqual(stats.loc['std', 'x'], 1.0)
+        self.assertEqual(stats.loc['25%', 'x'], 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
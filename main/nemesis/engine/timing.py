@@ -0,0 +1,88 @@
+""" Timing of the stages of a model run.
+
+This is the counterpart of the stage timer in the NemesisOutliers R package
+(see ``timing.R``). The recorded times are saved in the ``run_timings`` output
+table, which has the same columns for both engines.
+"""
+from __future__ import absolute_import
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
+
+class StageTimer(object):
+    """ Records the wall time, CPU time and peak memory of the stages of a
+    model run, and of the individual model objects within them.
+
+    Unlike in R, where the memory used by R objects can be reset, the peak
+    memory is the high-water mark of the resident memory of the process at
+    the end of the stage. A stage that raises the mark is thus one that
+    allocated more memory than any earlier stage.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self._start = time.time()
+
+    @contextmanager
+    def stage(self, stage, object_type='', object=''):
+        """ A context manager timing the code that it encloses.
+        """
+        start = time.time()
+        start_cpu = _cpu_time()
+        yield
+        self.rows.append((
+            stage, object_type, object,
+            start - self._start,
+            time.time() - start,
+            _cpu_time() - start_cpu,
+            peak_memory_mb(),
+        ))
+
+    def to_frame(self):
+        """ The recorded times as a data frame, ordered by start time.
+        """
+        df = pd.DataFrame(self.rows, columns=TIMING_COLUMNS)
+        return df.sort_values('start', kind='mergesort').reset_index(drop=True)
+
+
+def peak_memory_mb():
+    """ The peak resident memory of the process, in MB, or NaN if it is not
+    available.
+    """
+    if resource is None:
+        return np.nan
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # The units are bytes on macOS, but kilobytes elsewhere.
+    if sys.platform == 'darwin':
+        return peak / 1024.0 ** 2
+    return peak / 1024.0
+
+
+@contextmanager
+def null_stage(*args, **kwargs):
+    """ A stand-in for `StageTimer.stage` when the run is not timed.
+    """
+    yield
+
+
+def _cpu_time():
+    # The user and system time of the process.
+    times = os.times()
+    return times[0] + times[1]
+
+
+# Globals and constants
+
+TIMING_COLUMNS = [ 'stage', 'object_type', 'object', 'start', 'elapsed',
+                   'cpu_time', 'peak_memory_mb' ]
@@ -0,0 +1,165 @@
+""" Fingerprints of input data and model objects, for reusing the results of
+previous model runs.
+
+Input data
+----------
+
+An input fingerprint identifies the contents of the input data, rather than
+where the data came from. It is recorded in the run summary, and the input
+copy and input statistics of the previous run are reused when it is
+unchanged (see `DataSource.fingerprint`).
+
+By default, the fingerprint is computed cheaply from a sample of the data:
+
+- for files, from the size, the modification time and a hash of evenly
+  spaced blocks of the file, and
+- for SQL tables and queries, from the row count, the column schema and a hash
+  of evenly spaced blocks of rows, with the rows sorted by all of the columns
+  so that the blocks do not depend on the order in which the database
+  returns them.
+
+A full fingerprint hashes all of the data. It is slower, but it detects every
+change to the data, and for files, it does not depend on the modification
+time, so that an identical copy of the data is recognized.
+
+Model objects
+-------------
+
+A model run computes the entity-level values of every control and metric, and
+the entity-level scores of every metric. These are by far the most expensive
+parts of a run. When a model is re-run after a small edit, most of them are
+unchanged, so the engines can reuse them from the output of the previous run.
+
+To decide what can be reused, each entity-level value and score is given a
+fingerprint, a hash of everything that it depends on:
+
+- the input data (see `DataSource.fingerprint`),
+- the model parameters that affect every object (entity and group columns,
+  group size filter and user-defined code),
+- the R code generated for the object itself, and
+- for metric scores, the score cap and the values of the controls.
+
+The fingerprints are saved in the ``model_fingerprints`` output table. A value
+or score is reused only if its fingerprint matches the one saved by the
+previous run.
+"""
+from __future__ import absolute_import
+
+import hashlib
+import os
+
+import pandas as pd
+
+from nemesis.model import GroupMetric
+from nemesis.r.pretty_print import print_ast
+
+
+def fingerprint(*parts):
+    """ Combine strings into a fingerprint (a hex digest).
+    """
+    h = hashlib.sha1()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = part.encode('utf-8')
+        # Prefix each part with its length, so that the parts are not
+        # ambiguous when concatenated.
+        h.update(('%i:' % len(part)).encode('ascii'))
+        h.update(part)
+    return h.hexdigest()
+
+
+def file_fingerprint(path, full=False):
+    """ A fingerprint of the contents of a file, or None if the file does not
+    exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        if full:
+            for block in iter(lambda: f.read(FINGERPRINT_BLOCK_SIZE), b''):
+                h.update(block)
+            return fingerprint('full', str(stat.st_size), h.hexdigest())
+        for offset in block_offsets(stat.st_size, FINGERPRINT_BLOCK_SIZE):
+            f.seek(offset)
+            h.update(f.read(FINGERPRINT_BLOCK_SIZE))
+    # The sample does not detect an edit that preserves the size of the
+    # file, so the modification time is included too.
+    return fingerprint('sampled', str(stat.st_size), repr(stat.st_mtime),
+                       h.hexdigest())
+
+
+def frame_fingerprint(df):
+    """ A fingerprint of the contents of a data frame, including the names and
+    types of its columns.
+    """
+    schema = [ u'%s:%s' % (name, dtype)
+               for name, dtype in zip(df.columns, df.dtypes) ]
+    values = pd.util.hash_pandas_object(df, index=False).values
+    return fingerprint(u','.join(schema), values.tobytes())
+
+
+def object_fingerprint(obj):
+    """ The fingerprint of the R code generated for a model object.
+    """
+    return fingerprint(print_ast(obj.ast()))
+
+
+def model_fingerprints(model, input_fingerprint):
+    """ Compute the fingerprints of the entity-level values and scores of a
+    model.
+
+    Returns a list of tuples (name, kind, fingerprint), where `kind` is
+    'value' for the values of controls and metrics and 'score' for the scores
+    of (non-group) metrics. The columns are as in `FINGERPRINT_COLUMNS`.
+    """
+    base = fingerprint(
+        input_fingerprint,
+        model.entity_name,
+        model.group_name,
+        str(model.min_group_size) if model.limit_group_size else '',
+        model.user_code,
+    )
+
+    rows = []
+    values = {}
+    for obj in model.controls + model.metrics:
+        values[obj.name] = fingerprint(base, object_fingerprint(obj))
+        rows.append((obj.name, 'value', values[obj.name]))
+
+    cap = str(model.max_entity_score) if model.cap_entity_score else ''
+    for metric in model.metrics:
+        if isinstance(metric, GroupMetric):
+            continue
+        controls = [ values.get(control.name, '')
+                     for control in metric.control_for ]
+        rows.append((metric.name, 'score',
+                     fingerprint(values[metric.name], cap, *controls)))
+    return rows
+
+
+def block_offsets(size, block_size):
+    """ The offsets of the blocks sampled from data of the given size (in
+    bytes or rows): the first and last blocks, and evenly spaced blocks in
+    between.
+    """
+    last = max(size - block_size, 0)
+    n = FINGERPRINT_NUM_BLOCKS
+    return sorted(set(last * i // (n - 1) for i in range(n)))
+
+
+# Globals and constants
+
+# The size of the blocks of a file that are hashed, in bytes, and the number
+# of blocks sampled from a file.
+FINGERPRINT_BLOCK_SIZE = 64 * 1024
+FINGERPRINT_NUM_BLOCKS = 16
+
+# The number of rows of a SQL table that are hashed at a time, and the number
+# of rows in each block sampled from a table.
+FINGERPRINT_CHUNK_ROWS = 10000
+FINGERPRINT_BLOCK_ROWS = 1000
+
+FINGERPRINT_COLUMNS = [ 'name', 'kind', 'fingerprint' ]
@@ -0,0 +1,238 @@
+""" Incremental reading of growing log files.
+
+A `LogTailer` follows a log file written by another process, such as the
+``run.Rout`` file of an R run. Each read returns only the bytes appended since
+the previous read, and the most recent lines are kept in a bounded buffer, so
+that the cost of following a log does not grow with its size.
+
+On Linux, the tailer waits for changes to the file using inotify. Elsewhere,
+it falls back to polling the file size.
+"""
+from __future__ import absolute_import
+
+import codecs
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import threading
+import time
+from collections import deque
+
+
+class LogTailer(object):
+    """ Follows a log file as it is written.
+    """
+
+    def __init__(self, path, max_lines=1000, poll_interval=0.25):
+        self.path = path
+
+        # The number of complete lines and bytes read so far.
+        self.line_count = 0
+        self.byte_count = 0
+
+        # The interval, in seconds, between checks for new output when
+        # inotify is not available.
+        self.poll_interval = poll_interval
+
+        self._lines = deque(maxlen=max_lines)
+        self._partial = u''
+        self._offset = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self._lock = threading.Lock()
+        self._watch = None
+        self._watch_created = False
+
+    @property
+    def lines(self):
+        """ The most recent complete lines.
+        """
+        with self._lock:
+            return list(self._lines)
+
+    def read(self):
+        """ Read the output appended since the last read.
+
+        Returns the new text, which may end with a partial line.
+        """
+        with self._lock:
+            try:
+                f = open(self.path, 'rb')
+            except (IOError, OSError):
+                return u''
+            with f:
+                size = os.fstat(f.fileno()).st_size
+                if size < self._offset:
+                    # The file was truncated or replaced: start over.
+                    self._offset = 0
+                    self._decoder.reset()
+                if size == self._offset:
+                    return u''
+                f.seek(self._offset)
+                data = f.read(size - self._offset)
+            self._offset += len(data)
+            self.byte_count += len(data)
+            text = self._decoder.decode(data)
+            self._add_text(text)
+            return text
+
+    def text(self):
+        """ The text of the most recent lines, including any partial line.
+        """
+        with self._lock:
+            lines = list(self._lines)
+            if self._partial:
+                lines.append(self._partial)
+            return u''.join(lines)
+
+    def wait(self, timeout=None):
+        """ Wait until the file may have changed, or the timeout expires.
+
+        Returns whether a change was detected. When polling, this is only an
+        indication that the file size changed.
+        """
+        if not self._watch_created:
+            # The watch is created on first use, so that tailers that are
+            # only read do not hold a file descriptor.
+            self._watch = _InotifyWatch.create(self.path)
+            self._watch_created = True
+        if self._watch is not None:
+            if self._size() != self._offset:
+                return True
+            return self._watch.wait(timeout)
+
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            if self._size() != self._offset:
+                return True
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            interval = self.poll_interval
+            time.sleep(interval if remaining is None
+                       else min(interval, remaining))
+
+    def close(self):
+        """ Release the file watch, if any.
+        """
+        if self._watch is not None:
+            self._watch.close()
+            self._watch = None
+
+    # Private interface
+
+    def _add_text(self, text):
+        lines = (self._partial + text).splitlines(True)
+        if lines and not lines[-1].endswith(('\n', '\r')):
+            self._partial = lines.pop()
+        else:
+            self._partial = u''
+        self._lines.extend(lines)
+        self.line_count += len(lines)
+
+    def _size(self):
+        try:
+            return os.stat(self.path).st_size
+        except (IOError, OSError):
+            return self._offset
+
+
+class _InotifyWatch(object):
+    """ Watches the directory of a file for changes to the file using inotify.
+
+    The directory is watched, rather than the file itself, so that the file
+    need not exist yet.
+    """
+
+    @classmethod
+    def create(cls, path):
+        """ Create a watch, or return None if inotify is not available.
+        """
+        if _libc is None:
+            return None
+        try:
+            return cls(path)
+        except OSError:
+            return None
+
+    def __init__(self, path):
+        self.name = os.path.basename(path).encode('utf-8')
+        self.fd = _libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        directory = os.path.dirname(os.path.abspath(path))
+        wd = _libc.inotify_add_watch(self.fd, directory.encode('utf-8'),
+                                     _IN_MODIFY | _IN_CREATE | _IN_MOVED_TO)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, 'inotify_add_watch failed')
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        while self.fd is not None:
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining < 0:
+                return False
+            try:
+                ready, _, _ = select.select([self.fd], [], [], remaining)
+            except (select.error, OSError) as exc:
+                if exc.args[0] == errno.EINTR:
+                    continue
+                raise
+            if not ready:
+                return False
+            if self._read_events():
+                return True
+        return False
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _read_events(self):
+        try:
+            data = os.read(self.fd, 4096)
+        except OSError as exc:
+            if exc.errno == errno.EAGAIN:
+                return False
+            raise
+        changed = False
+        pos = 0
+        while pos + _EVENT_SIZE <= len(data):
+            _, _, _, length = struct.unpack_from(_EVENT_FORMAT, data, pos)
+            pos += _EVENT_SIZE
+            name = data[pos:pos + length].rstrip(b'\0')
+            pos += length
+            changed = changed or name == self.name
+        return changed
+
+
+def _load_libc():
+    if not hasattr(os, 'uname') or os.uname()[0] != 'Linux':
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+# Globals and constants
+
+_libc = _load_libc()
+
+_IN_MODIFY = 0x00000002
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+# struct inotify_event: int wd; uint32_t mask, cookie, len; char name[].
+_EVENT_FORMAT = 'iIII'
+_EVENT_SIZE = struct.calcsize(_EVENT_FORMAT)
@@ -7,6 +7,7 @@ from traits.api import Bool, Instance, List, Range, Str, Unicode, \
     on_trait_change
 
 from nemesis.r import ast, ast_macros
+from nemesis.r.ast_eval import eval_ast
 from nemesis.r.traits import RNameTrait
 from nemesis.serialize import DirtyMixin, json_to_obj, obj_to_json
 
@@ -183,6 +184,14 @@ class Control(ModelObject):
         args = [ (ast.Name(self.name), self._ast_impl()) ]
         return ast.Call(ast.Name('def_control'), args, print_hint='long')
 
+    def compute(self, data):
+        """ Compute the entity-level values of the control variable.
+
+        The data is a mapping of column names to arrays, e.g., a pandas data
+        frame. Returns an array with one value per entity.
+        """
+        return eval_ast(self._ast_impl(), data)
+
     def _ast_impl(self):
         raise NotImplementedError
 
@@ -202,10 +211,52 @@ class Metric(ModelObject):
                            [ c.name for c in self.control_for ])) ]
         return ast.Call(ast.Name('def_metric'), args, print_hint='long')
 
+    def compute(self, data):
+        """ Compute the entity-level values of the metric.
+
+        The data is a mapping of column names to arrays, e.g., a pandas data
+        frame. Returns an array with one value per entity.
+        """
+        return eval_ast(self._ast_impl(), data)
+
     def _ast_impl(self):
         raise NotImplementedError
 
 
+class GroupMetric(Metric):
+    """ A metric whose entity-level values are combined at the group level by
+    a special function, rather than by averaging.
+    """
+
+    def ast(self):
+        args = [ ast.Constant(self.name), self._ast_impl() ]
+        args += self._ast_group_impl()
+        return ast.Call(ast.Name('def_group_metric'), args, print_hint='long')
+
+    def compute_group(self, values, group_codes):
+        """ Compute the group-level values of the metric.
+
+        Parameters
+        ----------
+        values : array
+            The entity-level values of the metric.
+
+        group_codes : integer array
+            The group of each entity, coded as integers 0, 1, ..., k-1.
+
+        Returns
+        -------
+        An array of length k, containing the value for each group.
+        """
+        raise NotImplementedError
+
+    def _ast_group_impl(self):
+        """ Returns the arguments to `def_group_metric` following the entity
+        expression, namely the R function and its extra arguments.
+        """
+        raise NotImplementedError
+
+
 class CompositeScore(ModelObject):
     """ Combines group-level metric scores into a single composite score.
     """
@@ -219,6 +270,14 @@ class CompositeScore(ModelObject):
             return ast.Call(ast.Name('def_composite_score_q'),
                             ast.Constant(self.name),
                             *self._ast_impl())
+
+    def compute(self, scores):
+        """ Compute the composite score for each group.
+
+        The scores are a mapping of metric names to arrays of group-level
+        metric scores, e.g., a pandas data frame.
+        """
+        return eval_ast(self._ast_impl(), scores)
         
     def _ast_impl(self):
         raise NotImplementedError
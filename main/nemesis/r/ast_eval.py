@@ -0,0 +1,446 @@
+""" Evaluation of R ASTs over columnar data.
+
+This module implements the subset of R semantics needed to compute model
+objects without an R interpreter: vectorized arithmetic, comparison and
+logical operators with NA propagation, the metric helpers exported by the
+NemesisOutliers package (``ratio``, ``safe_log1p``), and a selection of base R
+functions.
+
+Values are represented by NumPy arrays or scalars. As in pandas, a missing
+value (NA) is represented by NaN. Logical vectors without missing values are
+boolean arrays; logical vectors with missing values are float arrays of 0, 1
+and NaN.
+"""
+from __future__ import absolute_import, division
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from nemesis.r import ast
+from nemesis.r.ast_parse import parse_expression
+
+
+class REvalError(ValueError):
+    """ Raised when an R expression cannot be evaluated.
+    """
+    pass
+
+
+def eval_ast(node, env):
+    """ Evaluate an R AST.
+
+    Parameters
+    ----------
+    node : nemesis.r.ast.Node
+        The expression to evaluate. Raw nodes are parsed before evaluation.
+
+    env : mapping
+        The variables visible to the expression, e.g., a pandas DataFrame or
+        a dict of arrays.
+
+    Returns
+    -------
+    A NumPy array or scalar.
+    """
+    if isinstance(node, ast.Constant):
+        return node.value
+
+    elif isinstance(node, ast.Name):
+        return _lookup(env, node.value)
+
+    elif isinstance(node, ast.Raw):
+        return eval_ast(_parse_raw(node.value), env)
+
+    elif isinstance(node, ast.Call):
+        if not isinstance(node.fn, ast.Name):
+            raise REvalError('Cannot evaluate call to a non-name function')
+        fn = R_FUNCTIONS.get(node.fn.value)
+        if fn is None:
+            raise REvalError('Unsupported R function %r' % node.fn.value)
+
+        args, kwargs = [], {}
+        for node_or_pair in node.args:
+            if isinstance(node_or_pair, tuple):
+                name, value = node_or_pair
+                kwargs[name.value.replace('.', '_')] = eval_ast(value, env)
+            else:
+                args.append(eval_ast(node_or_pair, env))
+        with np.errstate(all='ignore'):
+            return fn(*args, **kwargs)
+
+    raise REvalError('Cannot evaluate node of type %s' %
+                     node.__class__.__name__)
+
+
+def eval_expression(text, env):
+    """ Parse and evaluate a string of R code.
+    """
+    return eval_ast(_parse_raw(text), env)
+
+
+def is_na(x):
+    """ Vectorized test for missing values, like R's ``is.na``.
+    """
+    x = np.asarray(x)
+    if x.dtype.kind == 'f':
+        return np.isnan(x)
+    elif x.dtype.kind == 'O':
+        return np.asarray(pd.isnull(x))
+    return np.zeros(x.shape, dtype=bool)
+
+
+# Private functions: evaluation
+
+_parsed_cache = {}
+
+def _parse_raw(text):
+    node = _parsed_cache.get(text)
+    if node is None:
+        node = _parsed_cache[text] = parse_expression(text)
+    return node
+
+def _lookup(env, name):
+    try:
+        value = env[name]
+    except KeyError:
+        if name in _BUILTIN_NAMES:
+            return _BUILTIN_NAMES[name]
+        raise REvalError("object '%s' not found" % name)
+    if isinstance(value, (pd.Series, pd.Index)):
+        value = value.values
+    return value
+
+def _num(x):
+    """ Coerce a value to a numeric array, as R does for arithmetic.
+    """
+    x = np.asarray(x)
+    if x.dtype.kind == 'b':
+        return x.astype(float)
+    elif x.dtype.kind == 'O':
+        try:
+            return x.astype(float)
+        except (TypeError, ValueError):
+            raise REvalError('Non-numeric argument to arithmetic operator')
+    return x
+
+def _logical(values, na):
+    """ Build a logical vector, setting NA where `na` is true.
+    """
+    if np.any(na):
+        return np.where(na, np.nan, np.asarray(values, dtype=float))
+    return np.asarray(values, dtype=bool)
+
+def _truth(x):
+    """ Split a logical vector into (true, na) masks.
+    """
+    x = np.asarray(x)
+    na = is_na(x)
+    if x.dtype.kind == 'O':
+        true = np.asarray(~na & (x == True), dtype=bool)
+    else:
+        true = np.asarray(~na & (np.where(na, 0, x) != 0), dtype=bool)
+    return true, na
+
+
+# Private functions: operators
+
+def _arith(op):
+    def apply(x, y=None):
+        if y is None:
+            return op(0, _num(x))
+        return op(_num(x), _num(y))
+    return apply
+
+def _compare(op):
+    def apply(x, y):
+        x, y = np.asarray(x), np.asarray(y)
+        na = is_na(x) | is_na(y)
+        try:
+            result = op(x, y)
+        except TypeError:
+            # Mixed object arrays, e.g. strings with missing values.
+            result = np.vectorize(_safe(op), otypes=[bool])(x, y)
+        return _logical(result, na)
+    return apply
+
+def _safe(op):
+    def apply(x, y):
+        try:
+            return bool(op(x, y))
+        except TypeError:
+            return False
+    return apply
+
+def _not(x):
+    true, na = _truth(x)
+    return _logical(~true, na)
+
+def _and(x, y):
+    (x_true, x_na), (y_true, y_na) = _truth(x), _truth(y)
+    false = (~x_true & ~x_na) | (~y_true & ~y_na)
+    return _logical(x_true & y_true, ~false & (x_na | y_na))
+
+def _or(x, y):
+    (x_true, x_na), (y_true, y_na) = _truth(x), _truth(y)
+    true = x_true | y_true
+    return _logical(true, ~true & (x_na | y_na))
+
+def _in(x, table):
+    x = pd.Series(np.atleast_1d(x))
+    return x.isin(np.atleast_1d(table)).values
+
+def _index(x, i):
+    x, i = np.atleast_1d(x), np.atleast_1d(i)
+    if i.dtype.kind == 'b':
+        return x[i]
+    return x[_num(i).astype(int) - 1]
+
+
+# Private functions: R functions
+
+def _c(*args):
+    if not args:
+        return None
+    return np.concatenate([np.atleast_1d(arg) for arg in args])
+
+def _ratio(x, y, min=None, min_to=None, max=None, max_to=None,
+           zero_to=None, inf_to=None, na_to=None):
+    # Port of `ratio` in the NemesisOutliers package (R/metrics.R).
+    # Note that NA and NaN are not distinguished, so `inf_to` also replaces
+    # missing values.
+    result = np.array(_num(x) / _num(y), dtype=float, ndmin=1)
+
+    if min is not None:
+        result[result < min] = min if min_to is None else min_to
+    if max is not None:
+        result[result > max] = max if max_to is None else max_to
+
+    if zero_to is not None:
+        result[result == 0] = zero_to
+    if inf_to is not None:
+        result[np.isinf(result) | np.isnan(result)] = inf_to
+    if na_to is not None:
+        result[np.isnan(result)] = na_to
+
+    return result
+
+def _safe_log1p(x):
+    x = _num(x)
+    return np.sign(x) * np.log1p(np.abs(x))
+
+def _cut(x, breaks, labels=None, include_lowest=False, right=True,
+         dig_lab=3):
+    # Port of `cut.default` from base R.
+    x = _num(x)
+    breaks = np.atleast_1d(_num(breaks)).astype(float)
+    if len(breaks) == 1:
+        nb = int(breaks[0] + 1)
+        lo, hi = np.nanmin(x), np.nanmax(x)
+        dx = hi - lo
+        if dx == 0:
+            dx = abs(lo) if lo != 0 else 1.0
+            breaks = np.linspace(lo - dx / 1000, hi + dx / 1000, nb)
+        else:
+            breaks = np.linspace(lo, hi, nb)
+            breaks[[0, -1]] = [lo - dx / 1000, hi + dx / 1000]
+    else:
+        breaks = np.sort(breaks)
+        nb = len(breaks)
+
+    if labels is None:
+        for digits in range(dig_lab, max(12, dig_lab) + 1):
+            ch_br = [_format_g(b, digits) for b in breaks]
+            if all(a != b for a, b in zip(ch_br[:-1], ch_br[1:])):
+                break
+        left_paren, right_paren = ('(', ']') if right else ('[', ')')
+        labels = [left_paren + a + ',' + b + right_paren
+                  for a, b in zip(ch_br[:-1], ch_br[1:])]
+        if include_lowest:
+            if right:
+                labels[0] = '[' + labels[0][1:]
+            else:
+                labels[-1] = labels[-1][:-1] + ']'
+    else:
+        labels = [str(label) for label in np.atleast_1d(labels)]
+        if len(labels) != nb - 1:
+            raise REvalError("lengths of 'breaks' and 'labels' differ")
+
+    codes = np.searchsorted(breaks, x, side='left' if right else 'right')
+    if include_lowest:
+        edge = breaks[0] if right else breaks[-1]
+        codes[x == edge] = 1 if right else nb - 1
+    valid = (codes >= 1) & (codes <= nb - 1) & ~np.isnan(x)
+
+    result = np.empty(np.shape(x), dtype=object)
+    result[:] = np.nan
+    result[valid] = np.asarray(labels, dtype=object)[codes[valid] - 1]
+    return result
+
+def _format_g(value, digits):
+    # Equivalent to R's `formatC(value, digits = digits, width = 1)`.
+    if math.isinf(value):
+        return 'Inf' if value > 0 else '-Inf'
+    return '%.*g' % (digits, value)
+
+def _log(x, base=math.e):
+    result = np.log(_num(x))
+    if base != math.e:
+        result = result / np.log(base)
+    return result
+
+def _round(x, digits=0):
+    return np.round(_num(x), int(digits))
+
+def _ifelse(test, yes, no):
+    true, na = _truth(test)
+    result = np.where(true, yes, no)
+    if np.any(na):
+        result = np.where(na, np.nan, result)
+    return result
+
+def _pminmax(reduce):
+    def apply(*args, **kwargs):
+        na_rm = kwargs.get('na_rm', False)
+        args = np.broadcast_arrays(*[_num(arg) for arg in args])
+        stacked = np.vstack([np.atleast_1d(arg) for arg in args])
+        if na_rm:
+            return getattr(np, 'nan' + reduce)(stacked, axis=0)
+        return getattr(np, reduce)(stacked, axis=0)
+    return apply
+
+def _reduction(reduce):
+    def apply(x, na_rm=False):
+        x = _num(x)
+        if na_rm:
+            x = x[~np.isnan(x)]
+        return reduce(x)
+    return apply
+
+def _as_logical(x):
+    true, na = _truth(x)
+    return _logical(true, na)
+
+def _as_character(x):
+    x = np.asarray(x)
+    na = is_na(x)
+    result = x.astype(str).astype(object)
+    result[na] = np.nan
+    return result
+
+def _as_integer(x):
+    x = _num(x)
+    return np.where(np.isnan(x), np.nan, np.trunc(x)) \
+        if x.dtype.kind == 'f' else x
+
+def _paste(*args, **kwargs):
+    sep = kwargs.get('sep', ' ')
+    args = np.broadcast_arrays(*[np.asarray(arg).astype(str) for arg in args])
+    result = args[0].astype(object)
+    for arg in args[1:]:
+        result = result + sep + arg.astype(object)
+    return result
+
+def _string_map(fn):
+    def apply(x):
+        x = np.asarray(x, dtype=object)
+        na = is_na(x)
+        result = np.empty(x.shape, dtype=object)
+        result[~na] = [fn(v) for v in x[~na]]
+        result[na] = np.nan
+        return result
+    return apply
+
+def _sd(x, na_rm=True):
+    x = _num(x)
+    if na_rm:
+        x = x[~np.isnan(x)]
+    return np.std(x, ddof=1) if len(x) > 1 else np.nan
+
+def _scale(x):
+    x = _num(x)
+    return (x - np.nanmean(x)) / _sd(x)
+
+
+# Globals and constants
+
+_BUILTIN_NAMES = {
+    'T': True,
+    'F': False,
+    'pi': math.pi,
+    'NULL': None,
+}
+
+# The R functions supported by the evaluator. Named arguments are passed as
+# keyword arguments, with periods replaced by underscores (e.g., `na.rm`
+# becomes `na_rm`).
+R_FUNCTIONS = {
+    # Operators
+    '+': _arith(np.add),
+    '-': _arith(np.subtract),
+    '*': _arith(np.multiply),
+    '/': _arith(np.true_divide),
+    '^': _arith(np.power),
+    '%%': _arith(np.mod),
+    '%/%': _arith(np.floor_divide),
+    '==': _compare(lambda x, y: x == y),
+    '!=': _compare(lambda x, y: x != y),
+    '<': _compare(lambda x, y: x < y),
+    '>': _compare(lambda x, y: x > y),
+    '<=': _compare(lambda x, y: x <= y),
+    '>=': _compare(lambda x, y: x >= y),
+    '!': _not,
+    '&': _and,
+    '&&': _and,
+    '|': _or,
+    '||': _or,
+    '%in%': _in,
+    '(': lambda x: x,
+    '[': _index,
+    '[[': _index,
+
+    # NemesisOutliers functions
+    'ratio': _ratio,
+    'safe_log1p': _safe_log1p,
+    'Mean': _reduction(np.nanmean),
+    'Sd': _sd,
+    'Scale': _scale,
+
+    # Base R functions
+    'c': _c,
+    'cut': _cut,
+    'abs': lambda x: np.abs(_num(x)),
+    'sign': lambda x: np.sign(_num(x)),
+    'sqrt': lambda x: np.sqrt(_num(x)),
+    'exp': lambda x: np.exp(_num(x)),
+    'log': _log,
+    'log1p': lambda x: np.log1p(_num(x)),
+    'log2': lambda x: np.log2(_num(x)),
+    'log10': lambda x: np.log10(_num(x)),
+    'floor': lambda x: np.floor(_num(x)),
+    'ceiling': lambda x: np.ceil(_num(x)),
+    'round': _round,
+    'is.na': is_na,
+    'is.finite': lambda x: np.isfinite(_num(x)),
+    'is.infinite': lambda x: np.isinf(_num(x)),
+    'ifelse': _ifelse,
+    'pmin': _pminmax('min'),
+    'pmax': _pminmax('max'),
+    'mean': _reduction(np.mean),
+    'sum': _reduction(np.sum),
+    'min': _reduction(np.min),
+    'max': _reduction(np.max),
+    'sd': lambda x, na_rm=False: _sd(x, na_rm),
+    'length': lambda x: np.size(x),
+    'as.numeric': lambda x: _num(x).astype(float),
+    'as.double': lambda x: _num(x).astype(float),
+    'as.integer': _as_integer,
+    'as.logical': _as_logical,
+    'as.character': _as_character,
+    'nchar': _string_map(len),
+    'toupper': _string_map(lambda v: v.upper()),
+    'tolower': _string_map(lambda v: v.lower()),
+    'paste': _paste,
+    'paste0': lambda *args: _paste(*args, sep=''),
+}
@@ -0,0 +1,229 @@
+""" A parser for the subset of R expressions used in model definitions.
+
+Unlike ``nemesis.r.parse``, which defers to an external R process, this parser
+is implemented in pure Python and produces nodes of the R AST defined in
+``nemesis.r.ast``. It supports constants, names (including backquoted names),
+function calls with named arguments, indexing, and the unary and binary
+operators listed in ``nemesis.r.pretty_print.OP_PRECEDENCE``.
+
+Control flow (``if``, ``for``, ``function``, etc.) is not supported.
+"""
+from __future__ import absolute_import
+
+import re
+
+from nemesis.r import ast
+from nemesis.r.pretty_print import OP_PRECEDENCE
+
+
+class RParseError(ValueError):
+    """ Raised when an expression cannot be parsed.
+    """
+    pass
+
+
+def parse_expression(text):
+    """ Parse a single R expression into an AST.
+
+    Raises an RParseError if the text is not a single, supported expression.
+    """
+    parser = _Parser(tokenize(text))
+    node = parser.parse_expression(0)
+    parser.expect('end')
+    return node
+
+
+def tokenize(text):
+    """ Split a string of R code into a list of (kind, value) tokens.
+    """
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if match is None:
+            raise RParseError('Invalid character %r at position %i' %
+                              (text[pos], pos))
+        pos = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind in ('space', 'comment'):
+            continue
+        elif kind == 'string':
+            value = _unescape_string(value)
+        elif kind == 'backquote':
+            kind, value = 'name', value[1:-1]
+        elif kind == 'name' and value in _KEYWORDS:
+            kind = 'keyword'
+        tokens.append((kind, value))
+    tokens.append(('end', None))
+    return tokens
+
+
+# Private parser
+
+class _Parser(object):
+    """ A precedence climbing parser over a token list.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos]
+
+    def next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def expect(self, kind, value=None):
+        token = self.next()
+        if token[0] != kind or (value is not None and token[1] != value):
+            expected = value if value is not None else kind
+            raise RParseError('Expected %s, found %s' %
+                              (expected, _describe(token)))
+        return token
+
+    def parse_expression(self, min_prec):
+        left = self.parse_unary()
+        while True:
+            kind, value = self.peek()
+            if kind != 'op' or not _is_binary(value):
+                break
+            prec = _binary_precedence(value)
+            if prec < min_prec:
+                break
+            self.next()
+            # Exponentiation and assignment are right associative.
+            right_assoc = value in _RIGHT_ASSOC
+            right = self.parse_expression(prec if right_assoc else prec + 1)
+            left = ast.Call(ast.Name(value), left, right)
+        return left
+
+    def parse_unary(self):
+        kind, value = self.peek()
+        if kind == 'op' and (value, 1) in OP_PRECEDENCE:
+            self.next()
+            prec = OP_PRECEDENCE[(value, 1)]
+            operand = self.parse_expression(prec)
+            return ast.Call(ast.Name(value), operand)
+        return self.parse_postfix(self.parse_primary())
+
+    def parse_postfix(self, node):
+        while True:
+            kind, value = self.peek()
+            if kind == 'op' and value == '(':
+                self.next()
+                node = ast.Call(node, self.parse_arguments(')'))
+            elif kind == 'op' and value in ('[', '[['):
+                self.next()
+                index = self.parse_expression(0)
+                self.expect('op', ']')
+                if value == '[[':
+                    self.expect('op', ']')
+                node = ast.Call(ast.Name(value), node, index)
+            else:
+                return node
+
+    def parse_arguments(self, closing):
+        args = []
+        if self.peek() == ('op', closing):
+            self.next()
+            return args
+        while True:
+            kind, value = self.peek()
+            following = self.tokens[self.pos + 1]
+            if kind in ('name', 'string') and following == ('op', '='):
+                self.next()
+                self.next()
+                args.append((ast.Name(value), self.parse_expression(0)))
+            else:
+                args.append(self.parse_expression(0))
+            token = self.next()
+            if token == ('op', closing):
+                return args
+            elif token != ('op', ','):
+                raise RParseError('Expected , or %s, found %s' %
+                                  (closing, _describe(token)))
+
+    def parse_primary(self):
+        token = self.next()
+        kind, value = token
+        if kind == 'number':
+            return ast.Constant(_parse_number(value))
+        elif kind == 'string':
+            return ast.Constant(value)
+        elif kind == 'name':
+            return ast.Name(value)
+        elif kind == 'keyword':
+            if value in _KEYWORD_CONSTANTS:
+                return ast.Constant(_KEYWORD_CONSTANTS[value])
+            elif value == 'NULL':
+                return ast.Name(value)
+            raise RParseError('Unsupported keyword %r' % value)
+        elif token == ('op', '('):
+            # R keeps parentheses in its AST, but we do not need to: the
+            # pretty printer restores them from operator precedence.
+            node = self.parse_expression(0)
+            self.expect('op', ')')
+            return node
+        raise RParseError('Unexpected %s' % _describe(token))
+
+
+# Private functions
+
+def _is_binary(op):
+    return (op, 2) in OP_PRECEDENCE or (op.startswith('%') and len(op) > 1)
+
+def _binary_precedence(op):
+    return OP_PRECEDENCE.get((op, 2), OP_PRECEDENCE[('%%', 2)])
+
+def _parse_number(text):
+    # In R, numeric literals are doubles unless suffixed with 'L'.
+    is_integer = text.endswith('L')
+    if is_integer:
+        text = text[:-1]
+    if text[:2] in ('0x', '0X'):
+        value = int(text, 16)
+    else:
+        value = float(text)
+    return int(value) if is_integer else float(value)
+
+def _unescape_string(text):
+    body = text[1:-1]
+    return re.sub(r'\\(.)', lambda m: _ESCAPES.get(m.group(1), m.group(1)),
+                  body)
+
+def _describe(token):
+    kind, value = token
+    return 'end of input' if kind == 'end' else repr(value)
+
+
+# Globals and constants
+
+_KEYWORD_CONSTANTS = {
+    'TRUE': True, 'FALSE': False,
+    'Inf': float('inf'), 'NaN': float('nan'),
+    'NA': float('nan'), 'NA_real_': float('nan'), 'NA_integer_': float('nan'),
+    'NA_character_': float('nan'),
+}
+
+_KEYWORDS = set(_KEYWORD_CONSTANTS) | set([
+    'NULL', 'if', 'else', 'repeat', 'while', 'function', 'for', 'in', 'next',
+    'break',
+])
+
+_RIGHT_ASSOC = set(['^', '<-', '<<-', '='])
+
+_ESCAPES = { 'n': '\n', 't': '\t', 'r': '\r', '0': '\0' }
+
+_TOKEN_RE = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<comment>\#[^\n]*)
+  | (?P<number>0[xX][0-9a-fA-F]+L?|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?L?)
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<backquote>`[^`]+`)
+  | (?P<name>(?:[a-zA-Z]|\.[a-zA-Z_.]?)[\w.]*|\.)
+  | (?P<op>%[^%]*%|<<-|->>|<-|->|<=|>=|==|!=|&&|\|\||\[\[|[-+*/^:~?!<>=&|()\[\],])
+''', re.VERBOSE)
@@ -85,7 +85,12 @@ def _write_call_operator(node, out, indent):
     # Unary case.
     if len(node.args) == 1:
         _write_ast(node.fn, out, indent)
-        _write_ast(node.args[0], out, indent)
+        arg = node.args[0]
+        parens = (_is_call_operator(arg) and
+                  _operator_precedence(arg) < _operator_precedence(node))
+        out.write('(' if parens else '')
+        _write_ast(arg, out, indent)
+        out.write(')' if parens else '')
     
     # Binary case.
     elif len(node.args) == 2:
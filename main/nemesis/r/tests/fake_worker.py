@@ -0,0 +1,65 @@
+""" A stand-in for worker.R that speaks the same stdin/stdout protocol.
+
+Programs are not R code. Each line of a program is one of:
+
+  sleep <seconds>   Sleep, unless interrupted (SIGINT).
+  fail <message>    Finish with an error.
+  crash             Exit the process immediately.
+
+The program path is written to the log, followed by the program itself.
+"""
+from __future__ import print_function
+
+import os
+import signal
+import sys
+import time
+
+interrupted = [False]
+
+def on_interrupt(signum, frame):
+    interrupted[0] = True
+
+def reply(*fields):
+    print('\t'.join(fields))
+    sys.stdout.flush()
+
+def run_program(prog_path, log_path):
+    with open(prog_path) as f:
+        lines = f.read().splitlines()
+    with open(log_path, 'w') as log:
+        log.write(os.path.basename(prog_path) + '\n')
+        for line in lines:
+            log.write('> ' + line + '\n')
+            log.flush()
+            cmd, _, arg = line.partition(' ')
+            if cmd == 'sleep':
+                end = time.time() + float(arg)
+                while time.time() < end and not interrupted[0]:
+                    time.sleep(0.01)
+                if interrupted[0]:
+                    return ['cancelled']
+            elif cmd == 'fail':
+                return ['error', arg]
+            elif cmd == 'crash':
+                os._exit(3)
+    return ['ok']
+
+def main():
+    signal.signal(signal.SIGINT, on_interrupt)
+    reply('ready')
+    while True:
+        try:
+            line = sys.stdin.readline()
+        except IOError:
+            continue    # Interrupted while idle (Python 2)
+        if not line:
+            break
+        args = line.rstrip('\n').split('\t')
+        if args[0] == 'quit':
+            break
+        interrupted[0] = False
+        reply('done', *run_program(args[1], args[2]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+from __future__ import absolute_import
+
+import unittest
+
+import numpy as np
+import pandas as pd
+from numpy.testing import assert_array_equal, assert_allclose
+from ..ast import Constant, Name, Call, Raw
+from ..ast_eval import REvalError, eval_ast, eval_expression
+
+
+class TestREval(unittest.TestCase):
+
+    def setUp(self):
+        self.data = pd.DataFrame({
+            'x': [1.0, 2.0, np.nan, 4.0],
+            'y': [0.0, 1.0, 2.0, 0.0],
+            's': ['a', 'b', None, 'a'],
+            'i': [1, 2, 3, 4],
+            'j': [2, 2, 2, 2],
+        })
+
+    def assert_eval(self, text, target):
+        assert_allclose(eval_expression(text, self.data), target)
+
+    def test_nodes(self):
+        self.assertEqual(eval_ast(Constant(1.0), self.data), 1.0)
+        assert_array_equal(eval_ast(Name('y'), self.data), [0, 1, 2, 0])
+        self.assertEqual(eval_ast(Raw('1 + 2'), self.data), 3.0)
+        self.assertEqual(
+            eval_ast(Call(Name('+'), Constant(1.0), Constant(2.0)), {}), 3.0)
+
+    def test_arithmetic(self):
+        self.assert_eval('x + y', [1, 3, np.nan, 4])
+        self.assert_eval('-x ^ 2', [-1, -4, np.nan, -16])
+        self.assert_eval('x / y', [np.inf, 2, np.nan, np.inf])
+        self.assert_eval('5 %/% 2', 2)
+        self.assert_eval('-5 %% 3', 1)
+
+    def test_logical(self):
+        """ Are missing values propagated as in R's three-valued logic?
+        """
+        self.assert_eval('x > 1', [0, 1, np.nan, 1])
+        self.assert_eval('x > 1 & y > 0', [0, 1, np.nan, 0])
+        self.assert_eval('x > 1 | y > 0', [0, 1, 1, 1])
+        self.assert_eval('!(x > 1)', [1, 0, np.nan, 0])
+        self.assert_eval('s == "a"', [1, 0, np.nan, 1])
+        self.assert_eval('s %in% c("a")', [1, 0, 0, 1])
+        self.assert_eval('is.na(x)', [0, 0, 1, 0])
+
+    def test_ratio(self):
+        self.assert_eval('ratio(x, y)', [np.inf, 2, np.nan, np.inf])
+        self.assert_eval('ratio(x, y, inf_to = 0)', [0, 2, 0, 0])
+        self.assert_eval('ratio(x, y, na_to = -1)', [np.inf, 2, -1, np.inf])
+        self.assert_eval('ratio(x, y, max = 1.5)', [1.5, 1.5, np.nan, 1.5])
+        self.assert_eval('safe_log1p(y)', np.log1p([0, 1, 2, 0]))
+
+    def test_cut(self):
+        result = eval_expression('cut(x, c(0, 2, 5), right = FALSE)',
+                                 self.data)
+        self.assertEqual(list(result[[0, 1, 3]]), ['[0,2)', '[2,5)', '[2,5)'])
+        self.assertTrue(pd.isnull(result[2]))
+
+        result = eval_expression('cut(y, 2, labels = c("lo", "hi"))',
+                                 self.data)
+        self.assertEqual(list(result), ['lo', 'lo', 'hi', 'lo'])
+
+    def test_integer_columns(self):
+        """ Are integer columns divided as doubles, as in R?
+        """
+        self.assert_eval('ratio(i, j)', [0.5, 1, 1.5, 2])
+        self.assert_eval('i / j', [0.5, 1, 1.5, 2])
+        result = eval_expression('cut(i, 2)', self.data)
+        self.assertEqual(list(result), ['(0.997,2.5]', '(0.997,2.5]',
+                                        '(2.5,4]', '(2.5,4]'])
+
+    def test_functions(self):
+        self.assert_eval('ifelse(x > 1, 1, 0)', [0, 1, np.nan, 1])
+        self.assert_eval('pmax(x, y)', [1, 2, np.nan, 4])
+        self.assert_eval('log(y + 1, 2)', np.log2([1, 2, 3, 1]))
+        self.assert_eval('Mean(x)', 7.0 / 3)
+
+    def test_errors(self):
+        self.assertRaises(REvalError, eval_expression, 'z + 1', self.data)
+        self.assertRaises(REvalError, eval_expression, 'foo(x)', self.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+from __future__ import absolute_import
+
+import unittest
+from ..ast import Constant, Name, Call
+from ..ast_parse import RParseError, parse_expression
+from ..pretty_print import print_ast
+
+
+class TestRParse(unittest.TestCase):
+
+    def assert_parse(self, text, target):
+        self.assertEqual(parse_expression(text), target)
+
+    def test_constant(self):
+        self.assert_parse('1', Constant(1.0))
+        self.assert_parse('1L', Constant(1))
+        self.assert_parse('1e3', Constant(1000.0))
+        self.assert_parse("'foo'", Constant('foo'))
+        self.assert_parse('"foo\\"bar"', Constant('foo"bar'))
+        self.assert_parse('TRUE', Constant(True))
+        self.assert_parse('Inf', Constant(float('inf')))
+
+    def test_name(self):
+        self.assert_parse('foo', Name('foo'))
+        self.assert_parse('foo.bar_1', Name('foo.bar_1'))
+        self.assert_parse('`foo bar`', Name('foo bar'))
+
+    def test_call(self):
+        self.assert_parse('foo()', Call(Name('foo')))
+        self.assert_parse('foo(x, 1)',
+                          Call(Name('foo'), Name('x'), Constant(1.0)))
+        self.assert_parse('foo(x, bar = 1)',
+                          Call(Name('foo'), Name('x'),
+                               (Name('bar'), Constant(1.0))))
+
+    def test_operators(self):
+        self.assert_parse('a + b * c',
+                          Call(Name('+'), Name('a'),
+                               Call(Name('*'), Name('b'), Name('c'))))
+        self.assert_parse('(a + b) * c',
+                          Call(Name('*'),
+                               Call(Name('+'), Name('a'), Name('b')),
+                               Name('c')))
+        self.assert_parse('a - b - c',
+                          Call(Name('-'),
+                               Call(Name('-'), Name('a'), Name('b')),
+                               Name('c')))
+        self.assert_parse('-a^2',
+                          Call(Name('-'),
+                               Call(Name('^'), Name('a'), Constant(2.0))))
+        self.assert_parse('!a & b',
+                          Call(Name('&'), Call(Name('!'), Name('a')),
+                               Name('b')))
+        self.assert_parse('a %in% b',
+                          Call(Name('%in%'), Name('a'), Name('b')))
+
+    def test_index(self):
+        self.assert_parse('x[1]', Call(Name('['), Name('x'), Constant(1.0)))
+        self.assert_parse('x[[1]]', Call(Name('[['), Name('x'), Constant(1.0)))
+
+    def test_round_trip(self):
+        """ Does printing a parsed expression preserve its structure?
+        """
+        for text in ('a + b * c', '(a + b) * c', 'ratio(x, y, min = 0.0)',
+                     '-(a - b)', 'a > 0 & !(b < 1)'):
+            node = parse_expression(text)
+            self.assertEqual(parse_expression(print_ast(node)), node)
+
+    def test_invalid(self):
+        for text in ('', 'a +', 'foo(a', 'a b', 'function(x) x', 'a $ b'):
+            self.assertRaises(RParseError, parse_expression, text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+from __future__ import absolute_import
+
+import io
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from nemesis.r.worker import RWorker, RWorkerJob, RWorkerPool
+
+# A worker script that speaks the worker.R protocol without needing R.
+FAKE_WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'fake_worker.py')
+COMMAND = [sys.executable, FAKE_WORKER]
+TIMEOUT = 10
+
+
+class WorkerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='nemesis_test_')
+        self.count = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write_program(self, *lines, **kwargs):
+        self.count += 1
+        name = kwargs.get('name', u'prog_%i' % self.count)
+        prog_path = os.path.join(self.dir, name + u'.R')
+        with io.open(prog_path, 'w') as f:
+            f.write(u''.join(line + u'\n' for line in lines))
+        return prog_path, os.path.join(self.dir, name + u'.Rout')
+
+    def read_log(self, job):
+        with io.open(job.log_path) as f:
+            return f.read()
+
+    def wait_for_log(self, job, text):
+        end = time.time() + TIMEOUT
+        while time.time() < end:
+            if os.path.exists(job.log_path) and text in self.read_log(job):
+                return
+            time.sleep(0.01)
+        self.fail('Timed out waiting for %r in the log' % text)
+
+
+class TestRWorker(WorkerTestCase):
+
+    def setUp(self):
+        super(TestRWorker, self).setUp()
+        self.worker = RWorker(command=COMMAND)
+
+    def tearDown(self):
+        self.worker.shutdown()
+        self.worker._proc.wait()
+        super(TestRWorker, self).tearDown()
+
+    def submit(self, *lines, **kwargs):
+        job = RWorkerJob(*self.write_program(*lines, **kwargs))
+        self.worker.submit(job)
+        return job
+
+    def test_submit(self):
+        """ Does a submitted job run to completion on the worker?
+        """
+        job = self.submit(u'sleep 0.1')
+        self.assertEqual(job.pid, self.worker.pid)
+        self.assertEqual(job.wait(TIMEOUT), 0)
+        self.assertEqual(job.poll(), 0)
+        self.assertFalse(job.cancelled)
+        self.assertIn(u'> sleep 0.1', self.read_log(job))
+        self.assertTrue(self.worker.idle)
+
+        # The worker is reused for the next job.
+        job = self.submit(u'fail boom')
+        self.assertEqual(job.wait(TIMEOUT), 1)
+        self.assertEqual(job.message, u'boom')
+        self.assertTrue(self.worker.idle)
+
+    def test_busy(self):
+        """ Is submitting to a busy worker an error?
+        """
+        self.submit(u'sleep 0.5')
+        self.assertRaises(RuntimeError, self.submit, u'sleep 0')
+
+    def test_interrupt(self):
+        """ Does cancelling a job interrupt it without killing the worker?
+        """
+        job = self.submit(u'sleep %i' % TIMEOUT)
+        self.wait_for_log(job, u'> sleep')
+        job.cancel()
+        self.assertEqual(job.wait(TIMEOUT), 1)
+        self.assertTrue(job.cancelled)
+        self.assertTrue(self.worker.alive)
+
+        job = self.submit(u'sleep 0')
+        self.assertEqual(job.wait(TIMEOUT), 0)
+
+    def test_interrupt_finished(self):
+        """ Does cancelling a finished job leave the next job alone?
+        """
+        first = self.submit(u'sleep 0')
+        self.assertEqual(first.wait(TIMEOUT), 0)
+        second = self.submit(u'sleep 0.5')
+        self.wait_for_log(second, u'> sleep')
+        first.cancel()
+        self.assertEqual(second.wait(TIMEOUT), 0)
+        self.assertFalse(second.cancelled)
+
+    def test_non_ascii_path(self):
+        """ Are non-ASCII paths passed to the worker intact?
+        """
+        name = u'caf\xe9'
+        try:
+            name.encode(sys.getfilesystemencoding())
+        except UnicodeEncodeError:
+            self.skipTest('File system encoding cannot represent the path')
+        job = self.submit(u'sleep 0', name=name)
+        self.assertEqual(job.wait(TIMEOUT), 0)
+        self.assertTrue(self.read_log(job).startswith(name + u'.R\n'))
+
+
+class TestRWorkerPool(WorkerTestCase):
+
+    def setUp(self):
+        super(TestRWorkerPool, self).setUp()
+        self.pool = RWorkerPool(size=2, command=COMMAND)
+
+    def tearDown(self):
+        self.pool.shutdown()
+        super(TestRWorkerPool, self).tearDown()
+
+    def test_submit(self):
+        """ Are jobs spread over the workers, up to the pool size?
+        """
+        jobs = [ self.pool.submit(*self.write_program(u'sleep 0.2'))
+                 for i in range(3) ]
+        self.assertEqual(len(set(job.pid for job in jobs[:2])), 2)
+        self.assertEqual([ job.wait(TIMEOUT) for job in jobs ], [0, 0, 0])
+        self.assertIn(jobs[2].pid, [ job.pid for job in jobs[:2] ])
+
+    def test_cancel_queued(self):
+        """ Is a queued job cancelled without being run?
+        """
+        self.pool.size = 1
+        running = self.pool.submit(*self.write_program(u'sleep 0.5'))
+        queued = self.pool.submit(*self.write_program(u'sleep 0'))
+        queued.cancel()
+        self.assertEqual(queued.wait(TIMEOUT), 1)
+        self.assertTrue(queued.cancelled)
+        self.assertEqual(running.wait(TIMEOUT), 0)
+        self.assertFalse(os.path.exists(queued.log_path))
+
+    def test_respawn(self):
+        """ Is a worker that crashes replaced by a new one?
+        """
+        self.pool.size = 1
+        job = self.pool.submit(*self.write_program(u'crash'))
+        self.assertEqual(job.wait(TIMEOUT), 1)
+        self.assertFalse(job.cancelled)
+        self.assertEqual(job.message, u'R worker exited with code 3')
+        crashed_pid = job.pid
+
+        job = self.pool.submit(*self.write_program(u'sleep 0'))
+        self.assertEqual(job.wait(TIMEOUT), 0)
+        self.assertNotEqual(job.pid, crashed_pid)
+
+
+if __name__ == '__main__':
+    unittest.main()
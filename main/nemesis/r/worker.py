@@ -0,0 +1,301 @@
+""" Persistent R worker processes for running model programs.
+
+Starting R and attaching the engine packages takes several seconds, which
+dominates the run time of small models. An `RWorker` keeps a single R process
+alive (see ``worker.R``) and feeds it programs over stdin. An `RWorkerPool`
+manages several workers, dispatching each program to an idle worker.
+"""
+from __future__ import absolute_import
+
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+from collections import deque
+
+from nemesis.r import R_HOME
+
+logger = logging.getLogger(__name__)
+
+# The R script run by the worker processes.
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'worker.R')
+
+
+class RWorkerJob(object):
+    """ A program submitted to an R worker.
+
+    The interface mimics that of `subprocess.Popen`, so that a job can stand
+    in for an `R CMD BATCH` process.
+    """
+
+    def __init__(self, prog_path, log_path):
+        self.prog_path = prog_path
+        self.log_path = log_path
+        self.cancelled = False
+        self.returncode = None
+        self.message = ''
+        self.worker = None
+        self._done = threading.Event()
+
+    @property
+    def pid(self):
+        return self.worker.pid if self.worker else None
+
+    def poll(self):
+        """ Returns the exit code if the job has finished, else None.
+        """
+        return self.returncode
+
+    def wait(self, timeout=None):
+        """ Wait for the job to finish. Returns the exit code, or None on
+        timeout.
+        """
+        self._done.wait(timeout)
+        return self.returncode
+
+    def cancel(self):
+        """ Cancel the job, without killing the worker (except on Windows).
+        """
+        self.cancelled = True
+        worker = self.worker
+        if worker is None:
+            # Still queued: the pool will discard the job.
+            self._finish('cancelled')
+        else:
+            worker.interrupt(self)
+
+    def terminate(self):
+        self.cancel()
+
+    def _finish(self, status, message=''):
+        if self._done.is_set():
+            return
+        self.message = message
+        if status == 'ok':
+            self.returncode = 0
+        elif status == 'cancelled':
+            self.cancelled = True
+            self.returncode = 1
+        else:
+            self.returncode = 1
+        self._done.set()
+
+
+class RWorker(object):
+    """ A long-lived R process that runs programs one at a time.
+    """
+
+    def __init__(self, on_idle=None, command=None):
+        # Called with the worker whenever it becomes idle.
+        self.on_idle = on_idle
+        self.job = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+        # The command is overridable so that the worker protocol can be
+        # exercised without R.
+        if command is None:
+            r_path = os.path.join(R_HOME, 'bin', 'Rscript')
+            command = [r_path, '--vanilla', WORKER_SCRIPT]
+        startupinfo = None
+        if os.name == 'nt':
+            # Don't show a console in Windows.
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        self._proc = subprocess.Popen(
+            command, shell=False, startupinfo=startupinfo,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            universal_newlines=True, bufsize=1)
+
+        self._reader = threading.Thread(target=self._read_loop)
+        self._reader.daemon = True
+        self._reader.start()
+
+    @property
+    def pid(self):
+        return self._proc.pid
+
+    @property
+    def alive(self):
+        return self._proc.poll() is None
+
+    @property
+    def idle(self):
+        return self.job is None and self.alive
+
+    def submit(self, job):
+        """ Run a job on the worker, which must be idle.
+        """
+        with self._lock:
+            if self.job is not None:
+                raise RuntimeError('R worker is busy')
+            self.job = job
+            job.worker = self
+        try:
+            self._proc.stdin.write('run\t%s\t%s\n' % (
+                _encode_path(job.prog_path), _encode_path(job.log_path)))
+            self._proc.stdin.flush()
+        except (IOError, OSError) as exc:
+            with self._lock:
+                self.job = None
+            job._finish('error', 'R worker is not running: %s' % exc)
+
+    def interrupt(self, job):
+        """ Interrupt a running job.
+        """
+        # Signal while holding the lock, so that the job cannot finish and
+        # the worker cannot start another one in between.
+        with self._lock:
+            if self.job is not job:
+                return
+            if os.name == 'nt':
+                # Windows has no SIGINT for child processes, so the worker
+                # must be killed. The pool replaces it on the next submission.
+                self.shutdown()
+            elif self.alive:
+                os.kill(self._proc.pid, signal.SIGINT)
+
+    def shutdown(self):
+        """ Stop the worker process.
+        """
+        if not self.alive:
+            return
+        if os.name == 'nt':
+            # On Windows, calling terminate() does not kill the grandchild
+            # processes that the R executable spawns.
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            subprocess.call([
+                'taskkill', '/pid', str(self._proc.pid), '/T', '/F'
+            ], shell=False, startupinfo=startupinfo)
+        elif self.job is None:
+            try:
+                self._proc.stdin.write(u'quit\n')
+                self._proc.stdin.close()
+            except (IOError, OSError):
+                self._proc.terminate()
+        else:
+            self._proc.terminate()
+
+    # Private interface
+
+    def _read_loop(self):
+        for line in iter(self._proc.stdout.readline, ''):
+            fields = line.rstrip('\n').split('\t')
+            if fields[0] == 'ready':
+                self._ready.set()
+            elif fields[0] == 'done' and len(fields) > 1:
+                self._job_finished(fields[1], '\t'.join(fields[2:]))
+            # Anything else is output from package loading; ignore it.
+
+        # The process has exited.
+        self._proc.wait()
+        self._job_finished('cancelled' if self._job_cancelled() else 'error',
+                           'R worker exited with code %s' %
+                           self._proc.returncode)
+
+    def _job_cancelled(self):
+        job = self.job
+        return job is not None and job.cancelled
+
+    def _job_finished(self, status, message):
+        with self._lock:
+            job, self.job = self.job, None
+        if job is None:
+            return
+        job._finish(status, message)
+        if self.on_idle is not None:
+            try:
+                self.on_idle(self)
+            except Exception:
+                logger.exception('Error dispatching to R worker')
+
+
+class RWorkerPool(object):
+    """ A pool of persistent R workers.
+
+    Programs are queued and run, in order of submission, by the first
+    available worker. Workers are started lazily, up to the pool size, and
+    are replaced if they die.
+    """
+
+    def __init__(self, size=1, command=None):
+        if size < 1:
+            raise ValueError('R worker pool size must be positive')
+        self.size = size
+        self.command = command
+        self._workers = []
+        self._queue = deque()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """ Start all the workers ahead of time, so that the first runs do not
+        pay for R startup.
+        """
+        with self._lock:
+            self._prune()
+            while len(self._workers) < self.size:
+                self._workers.append(self._new_worker())
+
+    def submit(self, prog_path, log_path):
+        """ Queue an R program for execution.
+
+        Returns an RWorkerJob.
+        """
+        job = RWorkerJob(prog_path, log_path)
+        with self._lock:
+            self._queue.append(job)
+        self._dispatch()
+        return job
+
+    def shutdown(self):
+        """ Stop all the workers. Queued jobs are cancelled.
+        """
+        with self._lock:
+            workers, self._workers = self._workers, []
+            queue, self._queue = list(self._queue), deque()
+        for job in queue:
+            job.cancelled = True
+            job._finish('cancelled')
+        for worker in workers:
+            worker.shutdown()
+
+    # Private interface
+
+    def _dispatch(self, worker=None):
+        with self._lock:
+            while self._queue:
+                job = self._queue[0]
+                if job.cancelled:
+                    self._queue.popleft()._finish('cancelled')
+                    continue
+                self._prune()
+                idle = [ w for w in self._workers if w.idle ]
+                if idle:
+                    worker = idle[0]
+                elif len(self._workers) < self.size:
+                    worker = self._new_worker()
+                    self._workers.append(worker)
+                else:
+                    return
+                self._queue.popleft()
+                worker.submit(job)
+
+    def _new_worker(self):
+        return RWorker(on_idle=self._dispatch, command=self.command)
+
+    def _prune(self):
+        self._workers = [ w for w in self._workers if w.alive ]
+
+
+# Private functions
+
+def _encode_path(path):
+    # Under Python 2, the worker's stdin is a byte stream, which cannot take
+    # non-ASCII unicode. Under Python 3, it is a text stream.
+    if str is bytes and isinstance(path, unicode):
+        return path.encode(sys.getfilesystemencoding())
+    return path
@@ -1,8 +1,22 @@
-from pandas import DataFrame
+import logging
+import os
+import shutil
+from itertools import chain
+
+import numpy as np
+from pandas import DataFrame, Series
+import sqlalchemy
+from sqlalchemy.dialects import sqlite
 from traits.api import HasTraits, Instance, List, Property, Str
 
+from nemesis.data.column_store import ColumnStore
+from nemesis.data.data_frame_query import DataFrameQuery, QueryError
+from nemesis.data.sql import DEFAULT_CHUNKSIZE
 from nemesis.data.sql_data_source import SQLDataSource
 from nemesis.data.variable import Variable
+from nemesis.fingerprint import fingerprint, frame_fingerprint
+
+logger = logging.getLogger(__name__)
 
 
 class RunResults(HasTraits):
@@ -15,10 +29,21 @@ class RunResults(HasTraits):
     
     # Output database from the model run. Required.
     output_source = Instance(SQLDataSource)
+
+    # Directory in which the tables of the output DB are cached as
+    # memory-mapped columns (see `ColumnStore`), keyed by output DB and run.
+    # A table is cached the first time that it is loaded in full, and later
+    # loads and samples are read from the cache. If empty, nothing is cached.
+    cache_dir = Str
     
     # Run summary/metadata table. This is the only table from the output DB
     # that is automatically read and stored.
     run_summary = Instance('pandas.DataFrame')
+
+    # The wall time, CPU time and peak memory of each stage of the run, and of
+    # each control, metric and composite score. None if the run did not
+    # record timings.
+    run_timings = Instance('pandas.DataFrame')
     
     # Convenience accessors for important run metadata.
     entity_name = Property(Str, depends_on='run_summary')
@@ -30,6 +55,9 @@ class RunResults(HasTraits):
     metric_vars = List(Variable)
     metric_score_vars = List(Variable)
     composite_score_vars = List(Variable)
+
+    # The cache of the tables of this run, opened on demand.
+    _store = Instance(ColumnStore, transient=True)
     
     # --- RunResults interface ---
     
@@ -61,8 +89,27 @@ class RunResults(HasTraits):
             index_col = kw.pop('index_col')
         else:
             index_col = self._get_index_column(table)
+        if ds is self.output_source:
+            df = self._load_cached(ds_table, index_col, **kw)
+            if df is not None:
+                return df
         return ds.load_table(ds_table, index_col=index_col, **kw)
     
+    def iter_data(self, table, chunksize=DEFAULT_CHUNKSIZE, **kw):
+        """ Load data from an input or output table in chunks.
+
+        Returns an iterator of data frames of at most `chunksize` rows.
+        """
+        ds, ds_table = self._get_data_source(table)
+        if ds is None:
+            return iter([])
+
+        if 'index_col' in kw:
+            index_col = kw.pop('index_col')
+        else:
+            index_col = self._get_index_column(table)
+        return ds.iter_table(ds_table, chunksize, index_col=index_col, **kw)
+
     def sample_data(self, table, n, **kw):
         """ Randomly sample from an input or output table.
         """
@@ -74,6 +121,10 @@ class RunResults(HasTraits):
             index_col = kw.pop('index_col')
         else:
             index_col = self._get_index_column(table)
+        if ds is self.output_source:
+            df = self._sample_cached(ds_table, n, index_col, **kw)
+            if df is not None:
+                return df
         return ds.sample_table(ds_table, n, index_col=index_col, **kw)
     
     # --- Private interface ---
@@ -97,12 +148,84 @@ class RunResults(HasTraits):
             'entity_metric_stats'    : 'rn'
         }
         return index_map.get(table)
+
+    def _get_store(self):
+        # The cache of the tables of this run, or None if there is none. The
+        # run is identified by its summary.
+        if self._store is None and self.cache_dir and \
+                self.run_summary is not None:
+            ds = self.output_source
+            key = fingerprint(
+                frame_fingerprint(self.run_summary.reset_index()),
+                *[ unicode(getattr(ds, name)) for name in CACHE_KEY_TRAITS ])
+            path = os.path.join(self.cache_dir, key)
+            _prune_cache(self.cache_dir, path)
+            self._store = ColumnStore(path)
+        return self._store
+
+    def _load_cached(self, table, index_col, where=None, order_by=None,
+                     limit=None, **kw):
+        # Load a table from the cache, caching it first if it is loaded in
+        # full, i.e., without a filter, order or limit. Returns None if the
+        # load cannot be done from the cache.
+        store = self._get_store()
+        query = _where_query(where)
+        if store is None or query is None or \
+                not (order_by is None or isinstance(order_by, basestring)):
+            return None
+        stored = store.open_table(table)
+        if stored is None:
+            if where is not None or order_by is not None or \
+                    limit is not None:
+                # Not worth copying the whole table for a part of it.
+                return None
+            frames = self.output_source.iter_table(
+                table, DEFAULT_CHUNKSIZE, raise_on_missing=False)
+            if frames is None:
+                return None
+            # An empty chunk first, so that the columns of an empty table are
+            # known.
+            empty = self.output_source.load_table(table, limit=0)
+            try:
+                stored = store.write_table(table, chain([ empty ], frames))
+            except (EnvironmentError, TypeError):
+                logger.warning('Could not cache table %s', table,
+                               exc_info=True)
+                return None
+        rows = _select_rows(stored, query)
+        if rows is None:
+            return None
+        if order_by is not None:
+            # Sort stably, with NULLs first as in SQLite.
+            keys = Series(stored.read_column(order_by)[rows])
+            rows = rows[keys.sort_values(kind='mergesort',
+                                         na_position='first').index.values]
+        if limit is not None:
+            rows = rows[:limit]
+        return _read_rows(stored, rows, index_col, **kw)
+
+    def _sample_cached(self, table, n, index_col, where=None, **kw):
+        # Sample from a cached table. Returns None if the table is not cached.
+        store = self._get_store()
+        query = _where_query(where)
+        if store is None or query is None:
+            return None
+        stored = store.open_table(table)
+        rows = None if stored is None else _select_rows(stored, query)
+        if rows is None:
+            return None
+        if len(rows) > n:
+            rows = np.sort(np.random.choice(rows, n, replace=False))
+        return _read_rows(stored, rows, index_col, **kw)
         
     def _update_tables(self):
         if self.output_source:
             self.run_summary = self.load_data('run_summary')
+            self.run_timings = self.load_data('run_timings',
+                                              raise_on_missing=False)
         else:
             self.run_summary = None
+            self.run_timings = None
     
     def _update_variables(self):
         
@@ -142,4 +265,72 @@ class RunResults(HasTraits):
         return self.get_summary_data('entity_name')
     
     def _get_group_name(self):
-        return self.get_summary_data('group_name')
\ No newline at end of file
+        return self.get_summary_data('group_name')
+
+
+# Private functions
+
+def _where_query(where):
+    # The WHERE clause as a query that can be evaluated on a cached table, or
+    # None if it cannot be.
+    if where is not None and not isinstance(where, basestring):
+        try:
+            where = unicode(where.compile(
+                dialect=sqlite.dialect(),
+                compile_kwargs={ 'literal_binds': True }))
+        except (sqlalchemy.exc.SQLAlchemyError, NotImplementedError):
+            return None
+    try:
+        return DataFrameQuery(where)
+    except QueryError:
+        return None
+
+def _select_rows(stored, query):
+    # The numbers of the rows of a cached table selected by a query, or None
+    # if the query cannot be evaluated.
+    try:
+        return np.flatnonzero(query.mask(stored))
+    except QueryError:
+        return None
+
+def _read_rows(stored, rows, index_col, columns=None, coerce_types=None,
+               **kw):
+    # Read rows of a cached table, as `SQLDataSource.load_table` would.
+    if columns is not None and len(columns) > 0:
+        columns = list(columns)
+        if index_col is not None and index_col not in columns:
+            columns.insert(0, index_col)
+    else:
+        columns = None
+    df = stored.to_frame(columns, rows)
+    if coerce_types:
+        for col, dtype in coerce_types.items():
+            df[col] = df[col].astype(dtype, copy=False)
+    if index_col is not None:
+        df = df.set_index(index_col)
+    return df
+
+def _prune_cache(cache_dir, path):
+    # Mark the cache of a run as used, and remove the least recently used
+    # caches of other runs.
+    if os.path.exists(path):
+        os.utime(path, None)
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return
+    paths = sorted((os.path.join(cache_dir, name) for name in names),
+                   key=os.path.getmtime, reverse=True)
+    for old_path in paths[MAX_CACHED_RUNS:]:
+        if old_path != path:
+            shutil.rmtree(old_path, ignore_errors=True)
+
+
+# Globals and constants
+
+# The traits of the output source that identify the output DB.
+CACHE_KEY_TRAITS = [ 'dialect', 'host', 'port', 'database', 'dsn',
+                     'username' ]
+
+# The number of runs whose tables are kept in the cache.
+MAX_CACHED_RUNS = 4
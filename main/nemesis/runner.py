@@ -1,34 +1,64 @@
 from __future__ import absolute_import
 
 import os, shutil, tempfile
+import io
 import logging
 import subprocess
+import threading
+import time
 from traceback import format_exception_only
 try:
     from concurrent import futures # version 3
 except ImportError:
     import futures # version 2
 
-from traits.api import (HasTraits, Bool, Callable, Directory, File, Instance,
-                        Property)
+from traits.api import (HasTraits, Any, Bool, Callable, Directory, Either,
+                        Enum, File, Instance, Int, Property, Str)
 
 from .data.data_source import DataSource
 from .data.sql_data_source import SQLDataSource
 from .model import Model
+from nemesis.engine.python_engine import EngineCancelled, PythonEngine
+from nemesis.fingerprint import FINGERPRINT_COLUMNS, model_fingerprints
+from nemesis.log_tail import LogTailer
 from nemesis.run_results import RunResults
-from nemesis.r import ast, ast_transform
+from nemesis.r import ast, ast_macros, ast_transform
 from nemesis.r.pretty_print import write_ast
+from nemesis.r.worker import RWorkerJob, RWorkerPool
 from nemesis.r import R_HOME
 
 logger = logging.getLogger(__name__)
 
 
+class RunError(Exception):
+    """ Raised by the future of a failed model run.
+    """
+
+    def __init__(self, msg, detail=''):
+        super(RunError, self).__init__(msg)
+        self.detail = detail
+
+
+class RunCancelled(RunError):
+    """ Raised by the future of a cancelled model run.
+    """
+    pass
+
+
 class Runner(HasTraits):
     """ Runs a model on data.
     """
 
     # The model to run.
     model = Instance(Model)
+
+    # The engine that executes the model: the NemesisOutliers R package, run
+    # in a subprocess, or the in-process Python engine.
+    engine = Enum('r', 'python')
+
+    # A pool of persistent R processes to run the model on. If not specified,
+    # a new R process is started for each run.
+    worker_pool = Instance(RWorkerPool)
     
     # Whether the model is currently running.
     running = Property(Bool)
@@ -41,15 +71,39 @@ class Runner(HasTraits):
     
     # The results from the model run.
     results = Instance(RunResults)
+
+    # Whether to reuse the entity-level values and scores of the previous
+    # run in the output source, where neither the model objects nor the input
+    # data have changed since (see `nemesis.fingerprint`).
+    incremental = Bool(False)
+
+    # Whether to hash all of the input data to decide whether it has changed
+    # since the previous run, rather than a sample of it.
+    full_fingerprint = Bool(False)
+
+    # The exit code of the last run, or None if no run has finished.
+    returncode = Either(None, Int)
     
     # The handler for model run errors, a callable of form:
     #     handler(msg, detail)
     # If not specified, errors are logged using the `logging` module.
     error_handler = Callable()
+
+    # The handler for new output from the model run, a callable of form:
+    #     handler(text)
+    # It is called from a background thread as the output is written.
+    output_handler = Callable()
     
     # Private storage.
-    _proc = Instance(subprocess.Popen)
+    _proc = Either(Instance(subprocess.Popen), Instance(RWorkerJob))
+    _future = Instance(futures.Future)
+    _python_engine = Instance(PythonEngine)
+    _executor = Any()
+    _input_fingerprint = Either(None, Str)
+    _input_ast = Any()
     _log_path = File()
+    _log_tailer = Instance(LogTailer)
+    _output_lock = Any()
     _output_dir = Directory()
     
     # Runner interface
@@ -72,15 +126,57 @@ class Runner(HasTraits):
     def run(self):
         """ Run the model asynchronously.
         
-        Returns the Future instance for the run.
+        Returns a Future for the run. On success, the future's result is the
+        RunResults instance (or None, if there is no output source). If the
+        run fails or is cancelled, the future raises a RunError or
+        RunCancelled.
         """
         if not self.model:
             raise RuntimeError('No model defined')
         elif not self.input_source:
             raise RuntimeError('No input data for model run')
+        elif self.running:
+            raise RuntimeError('Model is already running')
 
-        self._proc = self._run_start()
-        return self._proc
+        future = futures.Future()
+        future.set_running_or_notify_cancel()
+        self._future = future
+        self.results = None
+        self.returncode = None
+        self._log_tailer = None
+
+        try:
+            self._input_fingerprint = self._compute_input_fingerprint()
+            if self.engine == 'python':
+                engine_future = self._run_python_start()
+            else:
+                self._proc = proc = self._run_start()
+        except:
+            self._future = None
+            self._cleanup()
+            raise
+
+        if self.output_handler is not None:
+            tail_thread = threading.Thread(target=self._tail_output,
+                                           args=(self._log_tailer, future),
+                                           name='nemesis-runner-output')
+            tail_thread.daemon = True
+            tail_thread.start()
+
+        if self.engine == 'python':
+            engine_future.add_done_callback(
+                lambda f: self._complete(future, self._run_python_finish, f))
+        elif proc is None:
+            self._complete(future, self._run_failed_to_start)
+        else:
+            # The waiter thread blocks until the process exits, so no CPU is
+            # used while the run is in progress.
+            waiter = threading.Thread(target=self._wait_for_proc,
+                                      args=(proc, future),
+                                      name='nemesis-runner-wait')
+            waiter.daemon = True
+            waiter.start()
+        return future
         
     def run_and_wait(self):
         """ Run the model synchronously.
@@ -88,17 +184,45 @@ class Runner(HasTraits):
         Returns the run results.
         """
         self.run()
-        while self.running: pass
+        self.wait()
         return self.results
 
+    def wait(self, timeout=None):
+        """ Block until the current run finishes, or until the timeout (in
+        seconds) expires.
+
+        Returns whether the run has finished.
+        """
+        future = self._future
+        if future is None:
+            return True
+        futures.wait([future], timeout)
+        return future.done()
+
     def output(self):
-        if os.path.exists(self._log_path):
-            return open(self._log_path, 'r').read()
-        return ''
+        """ The recent output of the current run, or of the last run if it
+        has finished.
+
+        Only the last lines of the output are kept (see `LogTailer`).
+        """
+        tailer = self._log_tailer
+        if tailer is None:
+            return ''
+        self._poll_output(tailer)
+        return tailer.text()
 
     def cancel(self):
-        if self._proc is not None:
-            self._proc.cancelled = True
+        engine = self._python_engine
+        if engine is not None:
+            engine.cancel()
+
+        proc = self._proc
+        if isinstance(proc, RWorkerJob):
+            # Interrupt the run, but keep the worker alive.
+            proc.cancel()
+
+        elif proc is not None:
+            proc.cancelled = True
 
             if os.name == 'nt':
                 # On Windows, calling terminate() does not kill the grandchild
@@ -106,11 +230,11 @@ class Runner(HasTraits):
                 startupinfo = subprocess.STARTUPINFO()
                 startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
                 subprocess.call([
-                    'taskkill', '/pid', str(self._proc.pid), '/T', '/F'
+                    'taskkill', '/pid', str(proc.pid), '/T', '/F'
                 ], shell=False, startupinfo=startupinfo)
 
             else:
-                self._proc.terminate()
+                proc.terminate()
 
     def write_program(self, out):
         """ Write the complete R program to a file-like object.
@@ -120,21 +244,17 @@ class Runner(HasTraits):
     # Private interface
 
     def _get_running(self):
-        if self._proc is None:
-            return False
-
-        if self._proc.poll() is None:
-            return True
-
-        self._run_finish(self._proc)
-        self._proc = None
-        return False
+        return self._future is not None and not self._future.done()
 
     def _ast_impl(self):
         self.model.store_input = True
         nodes = [ self.model.ast() ]
         if self.input_source:
-            run_args = self.input_source.ast()
+            # The input of a run may be read from prepared data, which a
+            # saved program must not refer to.
+            run_args = self._input_ast
+            if run_args is None:
+                run_args = self.input_source.ast()
             if isinstance(run_args, ast.Node):
                 run_args = [ (ast.Name('input'), run_args) ]
             if self.output_source:
@@ -145,6 +265,13 @@ class Runner(HasTraits):
                     (ast.Name('store_input'),
                      ast.Constant(self.model.store_input)),
                 ]
+                if self._input_fingerprint is not None:
+                    run_args += [ (ast.Name('input_fingerprint'),
+                                   ast.Constant(self._input_fingerprint)) ]
+                fingerprints = self._fingerprints()
+                if fingerprints is not None:
+                    run_args += [ (ast.Name('fingerprints'),
+                                   self._ast_fingerprints(fingerprints)) ]
             run_nodes = [
                 ast.Call(ast.Name('run_model'), run_args, print_hint='long'),
             ]
@@ -154,6 +281,33 @@ class Runner(HasTraits):
             ]
         return ast.Block(nodes, print_hint='long')
     
+    def _ast_fingerprints(self, fingerprints):
+        columns = zip(*fingerprints) if fingerprints else ([], [], [])
+        args = [ (ast.Name(name), ast_macros.seq_to_vector(list(column)))
+                 for name, column in zip(FINGERPRINT_COLUMNS, columns) ]
+        args += [ (ast.Name('stringsAsFactors'), ast.Constant(False)) ]
+        return ast.Call(ast.Name('data.frame'), args, print_hint='long')
+
+    def _compute_input_fingerprint(self):
+        # The input is fingerprinted only when it is run, so that a saved
+        # program never carries the fingerprint of data that may change.
+        if not self.output_source:
+            return None
+        try:
+            return self.input_source.fingerprint(full=self.full_fingerprint)
+        except Exception:
+            # The fingerprint only serves to reuse previous results.
+            logger.warning('Cannot fingerprint the input data',
+                           exc_info=True)
+            return None
+
+    def _fingerprints(self):
+        # The fingerprints of the entity-level values and scores, if the run
+        # is incremental and the input data can be identified.
+        if not (self.incremental and self._input_fingerprint):
+            return None
+        return model_fingerprints(self.model, self._input_fingerprint)
+
     def _handle_error(self, msg, detail):
         handled = False
         if self.error_handler:
@@ -171,13 +325,18 @@ class Runner(HasTraits):
         self._output_dir = tempfile.mkdtemp(prefix='nemesis_')
         
         # Write the R script to disk.
+        self._input_ast = self.input_source.run_ast()
         prog_path = os.path.join(self._output_dir, 'model.R')
         with open(prog_path, 'w') as f:
             self.write_program(f)
     
         # Run the R script. 
-        r_path = os.path.join(R_HOME, 'bin', 'R')
         self._log_path = os.path.join(self._output_dir, 'run.Rout')
+        self._log_tailer = LogTailer(self._log_path)
+        if self.worker_pool is not None:
+            return self.worker_pool.submit(prog_path, self._log_path)
+
+        r_path = os.path.join(R_HOME, 'bin', 'R')
         cmd = [r_path, 'CMD', 'BATCH', '--vanilla', prog_path, self._log_path]
         
         startupinfo = None
@@ -193,39 +352,147 @@ class Runner(HasTraits):
             detail = ''.join(format_exception_only(type(exc), exc))
             self._handle_error(msg, detail)
 
+    def _wait_for_proc(self, proc, future):
+        proc.wait()
+        self._complete(future, self._run_finish, proc)
+
     def _run_finish(self, proc):
+        self.returncode = proc.returncode
+        if getattr(proc, 'cancelled', False):
+            logger.info('Model run cancelled')
+            raise RunCancelled('Model run cancelled')
+
+        elif proc.returncode != 0:
+            msg = 'Exit code %i from model run.' % proc.returncode
+            try:
+                output = self.output()
+            except:
+                detail = 'Cannot recover any output from R.'
+            else:
+                detail = 'Captured R output:\n' + '-' * 70 + '\n' + output
+            self._handle_error(msg, detail)
+            raise RunError(msg, detail)
+
+        # No errors so far. Try to retrieve the results.
+        return self._load_results()
+
+    def _run_failed_to_start(self):
+        raise RunError('Model run failed to start.')
+
+    def _complete(self, future, finish, *args):
+        """ Finish a run and resolve its future.
+        """
         try:
-            results = None
+            try:
+                results = finish(*args)
+            finally:
+                self._cleanup()
+        except Exception as exc:
+            if self.returncode is None:
+                self.returncode = 1
+            self.results = None
+            future.set_exception(exc)
+        else:
+            self.results = results
+            future.set_result(results)
 
-            if getattr(proc, 'cancelled', False):
-                logger.info('Model run cancelled')
+    def _cleanup(self):
+        self._proc = None
+        self._input_fingerprint = None
+        self._input_ast = None
+        self._python_engine = None
+        if self._log_tailer is not None:
+            # Read the rest of the output before the log is deleted.
+            self._poll_output(self._log_tailer)
+        if self._output_dir and os.path.isdir(self._output_dir):
+            shutil.rmtree(self._output_dir)
 
-            elif proc.returncode != 0:
-                msg = 'Exit code %i from model run.' % proc.returncode
+    def _poll_output(self, tailer):
+        # Reading and notifying under a lock keeps the notifications in order
+        # when both the output thread and another thread read.
+        with self._output_lock:
+            text = tailer.read()
+            if text and self.output_handler is not None:
                 try:
-                    output = self.output()
+                    self.output_handler(text)
                 except:
-                    detail = 'Cannot recover any output from R.'
-                else:
-                    detail = 'Captured R output:\n' + '-' * 70 + '\n' + output
-                self._handle_error(msg, detail)
-
-            # No errors so far. Try to retrieve the results.
-            else:
-                if self.model.store_input:
-                    input_source = None
-                else:
-                    input_source = self.input_source
-                try:
-                    results = RunResults(input_source=input_source,
-                                         output_source = self.output_source)
-                except Exception as exc:
-                    msg = 'Exception raised while reading run results.'
-                    detail = ''.join(format_exception_only(type(exc), exc))
-                    self._handle_error(msg, detail)
+                    logger.exception('Error in output handler!')
 
-            self.results = results
-        
+    def _tail_output(self, tailer, future):
+        try:
+            while not future.done():
+                if tailer.wait(OUTPUT_WAIT_TIMEOUT):
+                    self._poll_output(tailer)
+                    # Let output accumulate, rather than notify on every
+                    # write.
+                    time.sleep(OUTPUT_MIN_INTERVAL)
         finally:
-            if os.path.isdir(self._output_dir):
-                shutil.rmtree(self._output_dir)
+            tailer.close()
+
+    def __output_lock_default(self):
+        return threading.Lock()
+
+    def _run_python_start(self):
+        # The output directory only holds the run log.
+        self._output_dir = tempfile.mkdtemp(prefix='nemesis_')
+        self._log_path = os.path.join(self._output_dir, 'run.log')
+        self._log_tailer = LogTailer(self._log_path)
+        log_path = self._log_path
+
+        def log(msg):
+            with io.open(log_path, 'a', encoding='utf-8') as f:
+                f.write(u'%s\n' % msg)
+
+        # As for the R engine, the input is always stored in the output DB.
+        self.model.store_input = True
+        self._python_engine = PythonEngine(model=self.model, log=log)
+        if self._executor is None:
+            self._executor = futures.ThreadPoolExecutor(max_workers=1)
+        return self._executor.submit(
+            self._python_engine.run, self.input_source, self.output_source,
+            store_input=self.model.store_input,
+            input_fingerprint=self._input_fingerprint,
+            fingerprints=self._fingerprints())
+
+    def _run_python_finish(self, future):
+        try:
+            future.result()
+        except EngineCancelled:
+            logger.info('Model run cancelled')
+            raise RunCancelled('Model run cancelled')
+        except Exception as exc:
+            msg = 'Exception raised during model run.'
+            detail = ''.join(format_exception_only(type(exc), exc))
+            output = self.output()
+            if output:
+                detail += '\nCaptured output:\n' + '-' * 70 + '\n' + output
+            self._handle_error(msg, detail)
+            raise RunError(msg, detail)
+        self.returncode = 0
+        if self.output_source:
+            return self._load_results()
+        return None
+
+    def _load_results(self):
+        if self.model.store_input:
+            input_source = None
+        else:
+            input_source = self.input_source
+        try:
+            return RunResults(input_source=input_source,
+                              output_source = self.output_source)
+        except Exception as exc:
+            msg = 'Exception raised while reading run results.'
+            detail = ''.join(format_exception_only(type(exc), exc))
+            self._handle_error(msg, detail)
+            raise RunError(msg, detail)
+
+
+# Globals and constants
+
+# The maximum time, in seconds, that the output thread waits for new output
+# before checking whether the run has finished.
+OUTPUT_WAIT_TIMEOUT = 0.5
+
+# The minimum time, in seconds, between output notifications.
+OUTPUT_MIN_INTERVAL = 0.1
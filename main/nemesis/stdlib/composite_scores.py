@@ -1,7 +1,9 @@
 from __future__ import absolute_import
 
+import numpy as np
+import pandas as pd
 from traits.api import Bool, Float, Instance, Int, List, on_trait_change
-from nemesis.model import CompositeScore, Metric
+from nemesis.model import CompositeScore, Metric, ModelError
 from nemesis.r import ast, ast_macros
 from nemesis.r.traits import RExpressionTrait
 from nemesis.serialize import DirtyMixin
@@ -53,3 +55,39 @@ class PrincipalComponentScore(CompositeScore):
             (ast.Name('percent'), ast.Constant(self.is_percent))
         ]
 
+    def compute(self, scores):
+        # Port of `composite.pca` from the NemesisOutliers R package.
+        columns = []
+        for name in scores:
+            x = np.asarray(scores[name])
+            if x.dtype.kind not in 'biuf':
+                continue
+            # Discard constant columns.
+            x = x.astype(float)
+            if len(pd.unique(x)) > 1:
+                columns.append(x)
+        if not columns:
+            raise ModelError('PCA score: no non-constant metric scores')
+        data = np.column_stack(columns)
+        if not np.all(np.isfinite(data)):
+            raise ModelError('PCA score: infinite or missing metric scores')
+
+        data = (data - data.mean(axis=0)) / data.std(axis=0, ddof=1)
+        u, d, vt = np.linalg.svd(data, full_matrices=False)
+        prop = d ** 2 / np.sum(d ** 2)
+
+        if self.is_percent:
+            top = self.top_percent
+            if not 0 <= top <= 1:
+                raise ModelError('PCA score: invalid percentage')
+            comps = list(np.flatnonzero(np.cumsum(prop) <= top))
+            if np.sum(prop[comps]) < top:
+                # Same choice of extra component as the R implementation.
+                comps.append(max(comps) if comps else 0)
+        else:
+            top = self.top_count
+            if not 1 <= top <= len(prop):
+                raise ModelError('PCA score: invalid number of components')
+            comps = list(range(top))
+
+        return np.dot(data, vt.T)[:, comps].sum(axis=1)
@@ -1,7 +1,8 @@
 from __future__ import absolute_import
 
 from traits.api import Bool, Enum, Float
-from nemesis.model import Metric
+from nemesis.engine import group_metrics
+from nemesis.model import GroupMetric, Metric
 from nemesis.r import ast
 from nemesis.r.traits import RExpressionTrait, RNameTrait
 
@@ -13,18 +14,20 @@ class ValueMetric(Metric):
     def _ast_impl(self):
         return ast.Raw(self.expression)
 
-class EntropyMetric(Metric):
+class EntropyMetric(GroupMetric):
 
     expression = RExpressionTrait()
     method = Enum('frequent', 'normal')
 
-    def ast(self):
-        return ast.Call(ast.Name('def_group_metric'),
-                        ast.Constant(self.name),
-                        ast.Raw(self.expression),
-                        ast.Name('entropy_disc'),
-                        (ast.Name('type'), ast.Constant(self.method)),
-                        print_hint = 'long')
+    def _ast_impl(self):
+        return ast.Raw(self.expression)
+
+    def compute_group(self, values, group_codes):
+        return group_metrics.entropy_disc(values, group_codes, self.method)
+
+    def _ast_group_impl(self):
+        return [ ast.Name('entropy_disc'),
+                 (ast.Name('type'), ast.Constant(self.method)) ]
 
 
 class RatioMetric(Metric):
@@ -87,57 +90,67 @@ class RatioMetric(Metric):
         self.cap_below_with = self.cap_below_at
 
 
-class DistributionMetric(Metric):
+class DistributionMetric(GroupMetric):
     
     expression = RExpressionTrait()
     
     kind = Enum('chi_square', 'ks', 'custom')
     custom_function = RNameTrait()
-    
-    def ast(self):
+
+    def _ast_impl(self):
+        return ast.Raw(self.expression)
+
+    def compute_group(self, values, group_codes):
+        if self.kind == 'chi_square':
+            return group_metrics.chisq_test(values, group_codes)
+        raise NotImplementedError
+
+    def _ast_group_impl(self):
         R_funcs = { 'chi_square': 'chisq_test',
                     'ks' : 'ks.stat',
                     'custom': self.custom_function, }
-        return ast.Call(ast.Name('def_group_metric'),
-                        ast.Constant(self.name),
-                        ast.Raw(self.expression),
-                        ast.Name(R_funcs[self.kind]),
-                        print_hint = 'long')
+        return [ ast.Name(R_funcs[self.kind]) ]
 
 
-class UniqueDiscreteMetric(Metric):
+class UniqueDiscreteMetric(GroupMetric):
 
     expression = RExpressionTrait()
     method = Enum('distinct', 'frequent')
 
-    def ast(self):
-        return ast.Call(ast.Name('def_group_metric'),
-                        ast.Constant(self.name),
-                        ast.Raw(self.expression),
-                        ast.Name('uniq_disc'),
-                        (ast.Name('type'), ast.Constant(self.method)),
-                        print_hint = 'long')
+    def _ast_impl(self):
+        return ast.Raw(self.expression)
+
+    def compute_group(self, values, group_codes):
+        return group_metrics.uniq_disc(values, group_codes, self.method)
+
+    def _ast_group_impl(self):
+        return [ ast.Name('uniq_disc'),
+                 (ast.Name('type'), ast.Constant(self.method)) ]
 
 
-class UniqueContinuousMetric(Metric):
+class UniqueContinuousMetric(GroupMetric):
 
     expression = RExpressionTrait()
 
-    def ast(self):
-        return ast.Call(ast.Name('def_group_metric'),
-                        ast.Constant(self.name),
-                        ast.Raw(self.expression),
-                        ast.Name('uniq_cont'),
-                        print_hint = 'long')
+    def _ast_impl(self):
+        return ast.Raw(self.expression)
+
+    def compute_group(self, values, group_codes):
+        return group_metrics.uniq_cont(values, group_codes)
 
+    def _ast_group_impl(self):
+        return [ ast.Name('uniq_cont') ]
 
-class GraphDensityMetric(Metric):
+
+class GraphDensityMetric(GroupMetric):
 
     expression = RExpressionTrait()
 
-    def ast(self):
-        return ast.Call(ast.Name('def_group_metric'),
-                        ast.Constant(self.name),
-                        ast.Raw(self.expression),
-                        ast.Name('graph_density'),
-                        print_hint = 'long')
\ No newline at end of file
+    def _ast_impl(self):
+        return ast.Raw(self.expression)
+
+    def compute_group(self, values, group_codes):
+        return group_metrics.graph_density(values, group_codes)
+
+    def _ast_group_impl(self):
+        return [ ast.Name('graph_density') ]
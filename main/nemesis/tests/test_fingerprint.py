@@ -0,0 +1,89 @@
+from __future__ import absolute_import
+
+import unittest
+
+import pandas as pd
+
+from nemesis.fingerprint import frame_fingerprint, model_fingerprints
+from nemesis.model import Model
+from nemesis.stdlib.controls import FactorControl
+from nemesis.stdlib.metrics import ValueMetric
+
+
+class TestFingerprint(unittest.TestCase):
+
+    def setUp(self):
+        control = FactorControl(name='Half', expression='Id %% 2')
+        self.model = Model(
+            entity_name = 'Id',
+            group_name = 'Letter',
+            controls = [ control ],
+            metrics = [
+                ValueMetric(name='Value', expression='Number'),
+                ValueMetric(name='Double', expression='2 * Number',
+                            control_for=[ control ]),
+            ],
+        )
+
+    def fingerprints(self, input_fingerprint='input'):
+        rows = model_fingerprints(self.model, input_fingerprint)
+        return dict(((name, kind), fp) for name, kind, fp in rows)
+
+    def changed(self, old, new):
+        return set(key for key in old if old[key] != new[key])
+
+    def test_keys(self):
+        """ Are there fingerprints for all entity values and metric scores?
+        """
+        rows = model_fingerprints(self.model, 'input')
+        self.assertEqual([ (name, kind) for name, kind, _ in rows ], [
+            ('Half', 'value'), ('Value', 'value'), ('Double', 'value'),
+            ('Value', 'score'), ('Double', 'score') ])
+        self.assertEqual(rows, model_fingerprints(self.model, 'input'))
+
+    def test_edit_metric(self):
+        """ Does editing a metric change only its own fingerprints?
+        """
+        old = self.fingerprints()
+        self.model.metrics[0].expression = 'Number + 1'
+        self.assertEqual(self.changed(old, self.fingerprints()),
+                         set([ ('Value', 'value'), ('Value', 'score') ]))
+
+    def test_edit_control(self):
+        """ Does editing a control change the scores controlled for it?
+        """
+        old = self.fingerprints()
+        self.model.controls[0].expression = 'Id %% 3'
+        self.assertEqual(self.changed(old, self.fingerprints()),
+                         set([ ('Half', 'value'), ('Double', 'score') ]))
+
+    def test_edit_cap(self):
+        """ Does changing the score cap change only the scores?
+        """
+        old = self.fingerprints()
+        self.model.max_entity_score = 2.0
+        self.assertEqual(self.changed(old, self.fingerprints()),
+                         set([ ('Value', 'score'), ('Double', 'score') ]))
+
+    def test_change_input(self):
+        """ Does changing the input data change all the fingerprints?
+        """
+        old = self.fingerprints()
+        self.assertEqual(self.changed(old, self.fingerprints('other')),
+                         set(old))
+
+    def test_frame_fingerprint(self):
+        """ Does the fingerprint of a data frame depend on its values and
+        schema, but not on its index?
+        """
+        df = pd.DataFrame({ 'Id': [1, 2, 3], 'Letter': list('abc') })
+        fp = frame_fingerprint(df)
+        self.assertEqual(frame_fingerprint(df.set_index(df.index + 10)), fp)
+        self.assertNotEqual(frame_fingerprint(df[::-1]), fp)
+        self.assertNotEqual(frame_fingerprint(df.astype({ 'Id': float })), fp)
+        self.assertNotEqual(
+            frame_fingerprint(df.rename(columns={ 'Id': 'Key' })), fp)
+
+
+if __name__ == '__main__':
+    unittest.main()
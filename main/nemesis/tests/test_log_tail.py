@@ -0,0 +1,96 @@
+from __future__ import absolute_import
+
+import os.path
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from nemesis import log_tail
+from nemesis.log_tail import LogTailer
+
+
+class TestLogTailer(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='nemesis_test_')
+        self.path = os.path.join(self.dir, 'run.Rout')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def append(self, data):
+        with open(self.path, 'ab') as f:
+            f.write(data)
+
+    def test_read_new_output(self):
+        """ Does each read return only the new output?
+        """
+        tailer = LogTailer(self.path)
+        self.assertEqual(tailer.read(), u'')
+        self.append(b'line 1\nline')
+        self.assertEqual(tailer.read(), u'line 1\nline')
+        self.assertEqual(tailer.read(), u'')
+        self.append(b' 2\n')
+        self.assertEqual(tailer.read(), u' 2\n')
+        self.assertEqual(tailer.lines, [u'line 1\n', u'line 2\n'])
+        self.assertEqual(tailer.line_count, 2)
+        self.assertEqual(tailer.byte_count, 14)
+
+    def test_ring_buffer(self):
+        """ Are only the most recent lines kept?
+        """
+        tailer = LogTailer(self.path, max_lines=3)
+        self.append(b''.join(b'%i\n' % i for i in range(10)) + b'part')
+        tailer.read()
+        self.assertEqual(tailer.text(), u'7\n8\n9\npart')
+        self.assertEqual(tailer.line_count, 10)
+
+    def test_split_character(self):
+        """ Is a multibyte character split across reads decoded correctly?
+        """
+        tailer = LogTailer(self.path)
+        data = u'caf\xe9\n'.encode('utf-8')
+        self.append(data[:-2])
+        tailer.read()
+        self.append(data[-2:])
+        tailer.read()
+        self.assertEqual(tailer.lines, [u'caf\xe9\n'])
+
+    def test_truncation(self):
+        """ Is a truncated file read from the start?
+        """
+        tailer = LogTailer(self.path)
+        self.append(b'old output\n')
+        tailer.read()
+        with open(self.path, 'wb') as f:
+            f.write(b'new\n')
+        self.assertEqual(tailer.read(), u'new\n')
+
+    def test_wait(self):
+        """ Does waiting detect new output, with or without inotify?
+        """
+        # Create the file first, since its creation is itself a change that
+        # may be detected before the new output is written.
+        self.append(b'')
+        for libc in (log_tail._libc, None):
+            original, log_tail._libc = log_tail._libc, libc
+            try:
+                tailer = LogTailer(self.path, poll_interval=0.01)
+                tailer.read()
+                self.assertFalse(tailer.wait(0.05))
+                timer = threading.Timer(0.05, self.append, [b'more\n'])
+                timer.start()
+                start = time.time()
+                self.assertTrue(tailer.wait(5))
+                self.assertLess(time.time() - start, 5)
+                self.assertEqual(tailer.read(), u'more\n')
+                tailer.close()
+                timer.join()
+            finally:
+                log_tail._libc = original
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+from __future__ import absolute_import
+
+import os.path
+import threading
+import unittest
+
+from nemesis.data.file_data_source import FileDataSource
+from nemesis.model import Model
+from nemesis.runner import Runner, RunError
+from nemesis.stdlib.metrics import ValueMetric
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestRunner(unittest.TestCase):
+
+    def setUp(self):
+        model = Model(
+            entity_name = 'Id',
+            group_name = 'Letter',
+            metrics = [ ValueMetric(name='Value', expression='Number') ],
+        )
+        path = os.path.join(TEST_DIR, 'test_letters_numbers_1.csv')
+        self.errors = []
+        self.runner = Runner(
+            model = model,
+            engine = 'python',
+            input_source = FileDataSource(path=path),
+            error_handler = lambda msg, detail: self.errors.append(msg),
+        )
+
+    def test_future(self):
+        """ Does a run return a future that notifies on completion?
+        """
+        done = threading.Event()
+        future = self.runner.run()
+        future.add_done_callback(lambda f: done.set())
+        self.assertTrue(self.runner.wait(30))
+        self.assertTrue(done.wait(30))
+        self.assertIsNone(future.result())
+        self.assertFalse(self.runner.running)
+        self.assertEqual(self.runner.returncode, 0)
+        self.assertIn('Model run complete', self.runner.output())
+        self.assertEqual(self.errors, [])
+
+    def test_future_error(self):
+        """ Does the future of a failed run raise a RunError?
+        """
+        self.runner.model.metrics[0].expression = 'undefined_function(Number)'
+        future = self.runner.run()
+        self.assertRaises(RunError, future.result, 30)
+        self.assertEqual(self.runner.returncode, 1)
+        self.assertEqual(len(self.errors), 1)
+
+    def test_output_handler(self):
+        """ Is all the output of a run passed to the output handler?
+        """
+        chunks = []
+        self.runner.output_handler = chunks.append
+        self.runner.run_and_wait()
+        output = ''.join(chunks)
+        self.assertIn('Model run complete', output)
+        self.assertEqual(output, self.runner.output())
+
+    def test_run_and_wait(self):
+        """ Can the runner be reused for consecutive runs?
+        """
+        self.runner.run_and_wait()
+        self.assertEqual(self.runner.returncode, 0)
+        self.runner.run_and_wait()
+        self.assertEqual(self.runner.returncode, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,12 +16,14 @@ requirements = [
     # 'jsonpickle',
     # 'ibm_db_sa',
     # 'matplotlib==2.2.5',
+    # 'openpyxl',
     # 'pandas==0.24.2',
     # 'pyface==6.1.2',
     # 'pygments',
     # 'PySide',
     # 'pyzmq',
     # 'pyodbc',
+    # 'pyarrow',
     # 'PyQt4-windows-whl',
     # 'seaborn',
     # 'sqlalchemy',
@@ -46,6 +48,7 @@ setup(
         'nemesis.app.inspector': ['*.enaml'],
         'nemesis.app.inspector.plots': ['*.enaml'],
         'nemesis.data.ui': ['*.enaml'],
+        'nemesis.r': ['*.R'],
         'nemesis.r.ui': ['*.enaml'],
         'nemesis.stdlib.ui': ['*.enaml'],
         'nemesis.ui': ['*.enaml'],
@@ -53,6 +56,7 @@ setup(
     entry_points={
         'console_scripts': [
             'nemesis-builder=nemesis.app.builder.main:main',
+            'nemesis-run=nemesis.app.batch.main:main',
             'nemesis-inspector=nemesis.app.inspector.main:main',
         ],
     },